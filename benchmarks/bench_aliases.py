@@ -0,0 +1,128 @@
+"""Benchmark alias table extraction in process_aliases.
+
+Writes N synthetic table files (in the markup crawler.py saves), builds combined.csv
+with the original BeautifulSoup extraction and with the streaming parser (serially
+and over a process pool), checks the CSVs are byte-identical and reports files/sec.
+
+    python benchmarks/bench_aliases.py --sizes 300 3000 30000
+"""
+import argparse
+import filecmp
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import pandas as pd  # noqa: E402
+from bs4 import BeautifulSoup  # noqa: E402
+
+import process_aliases  # noqa: E402
+from alias_tables import COLUMNS, table_rows  # noqa: E402
+
+logging.getLogger().setLevel(logging.ERROR)
+
+SECTIONS = ["about-us", "news", "events", "careers", "café-corner", "practice-resources"]
+
+
+def alias_cell(rng, number):
+    section = rng.choice(SECTIONS)
+    # Mix in entities, nested markup and stray whitespace the real pages have
+    return rng.choice([
+        f'<a href="/{section}/page-{number}">{section}/page-{number}</a>',
+        f'\n  <a href="/{section}/q-{number}">{section}/q&amp;a-{number}</a>  ',
+        f'<a href="/{section}/{number}"><em>{section}</em>/{number}</a>',
+    ])
+
+
+def alias_table(rng, page, rows):
+    """One alias overview table as crawler.save_table_html writes it."""
+    body = []
+    for i in range(rows):
+        number = page * rows + i
+        body.append(
+            f"<tr><td>{alias_cell(rng, number)}</td>"
+            f'<td><a href="/node/{number}">node/{number}</a></td>'
+            f'<td><a href="/admin/config/search/path/edit/{number}">edit</a></td></tr>'
+        )
+    return (
+        '<table class="sticky-enabled tableheader-processed sticky-table">'
+        "<thead><tr><th>Alias</th><th>System</th><th>Operations</th></tr></thead>"
+        f"<tbody>{''.join(body)}</tbody></table>"
+    )
+
+
+def write_tables(directory, count, rows=50, seed=0):
+    rng = random.Random(seed)
+    for page in range(count):
+        if page % 997 == 996:
+            html = "No table found"
+        else:
+            html = alias_table(rng, page, rows)
+        (directory / f"table{page}.html").write_text(html)
+
+
+def baseline_csv(directory, csv_path):
+    """combined.csv built the original way, with a BeautifulSoup tree per file."""
+    all_data = []
+    for filename in os.listdir(directory):
+        if filename.endswith(".html"):
+            soup = BeautifulSoup((directory / filename).read_text(), "html.parser")
+            table = soup.find("table", class_="tableheader-processed")
+            if table:
+                all_data.extend(table_rows(table))
+    pd.DataFrame(all_data, columns=COLUMNS).to_csv(csv_path, index=False)
+
+
+def timed(label, count, func):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<22} {elapsed:8.2f}s  {count / elapsed:10.0f} files/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[300, 3000, 30000])
+    parser.add_argument("--rows", type=int, default=50, help="Aliases per table.")
+    parser.add_argument(
+        "--baseline-max",
+        type=int,
+        default=3000,
+        help="Largest size to also run the (slow) BeautifulSoup baseline on.",
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            tables = tmp / "tables"
+            tables.mkdir()
+            write_tables(tables, size, args.rows)
+            print(f"{size} files x {args.rows} rows")
+
+            outputs = {
+                "serial": tmp / "serial.csv",
+                "pool": tmp / "pool.csv",
+            }
+            timed("streaming, 1 process", size,
+                  lambda: process_aliases.load_or_create_csv(str(tables), str(outputs["serial"]), workers=1))
+            timed(f"streaming, {os.cpu_count()} processes", size,
+                  lambda: process_aliases.load_or_create_csv(str(tables), str(outputs["pool"])))
+            if size <= args.baseline_max:
+                outputs["baseline"] = tmp / "baseline.csv"
+                timed("BeautifulSoup baseline", size, lambda: baseline_csv(tables, outputs["baseline"]))
+
+            reference = outputs.get("baseline", outputs["serial"])
+            for name, path in outputs.items():
+                if not filecmp.cmp(reference, path, shallow=False):
+                    sys.exit(f"{name} output differs from {reference.name}")
+            print(f"  outputs identical ({', '.join(outputs)})")
+
+
+if __name__ == "__main__":
+    main()
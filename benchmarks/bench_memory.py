@@ -0,0 +1,94 @@
+"""Benchmark peak memory of the processing scripts with and without lean string columns.
+
+Writes a synthetic redirect export and alias table, runs process_redirects.py,
+combine.py and process_all.py on them with CRAWLER_LEAN_STRINGS=0 (plain Python
+string objects) and =1 (categoricals / Arrow strings), checks both runs write the
+same CSVs and reports each script's peak RSS and run time.
+
+    python benchmarks/bench_memory.py --rows 500000
+"""
+import argparse
+import filecmp
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+SCRIPTS = ["process_redirects.py", "combine.py", "process_all.py"]
+OUTPUTS = [
+    "data/redirects/redirects_sorted_by_From URL.csv",
+    "data/redirects/duplicate_redirects_To_URL.csv",
+    "data/all_sorted.csv",
+    "data/duplicate_redirects_Alias.csv",
+]
+SECTIONS = ["about", "news", "events", "careers", "learning", "members", "policy"]
+
+
+def write_data(directory, rows, seed=0):
+    """A redirect export (about 10 redirects per target) and the aliases of the targets."""
+    rng = random.Random(seed)
+    nodes = max(1, rows // 10)
+    redirects = directory / "data" / "redirects"
+    aliases = directory / "data" / "aliases"
+    redirects.mkdir(parents=True)
+    aliases.mkdir(parents=True)
+    with open(redirects / "redirects.csv", "w") as file:
+        for i in range(rows):
+            section = rng.choice(SECTIONS)
+            language = "und" if rng.random() < 0.9 else "en"
+            file.write(f"{section}/old-{i},node/{rng.randrange(nodes)},301,{language}\n")
+    with open(aliases / "combined.csv", "w") as file:
+        file.write("Alias,System\n")
+        for node in range(nodes):
+            file.write(f"{rng.choice(SECTIONS)}/page-{node},node/{node}\n")
+    (directory / "data" / "exclude.csv").write_text("From URL\nabout/old-1\n")
+
+
+def run_scripts(directory, lean):
+    """Run the scripts in `directory`; return {script: (peak MB, seconds)}."""
+    env = dict(os.environ, CRAWLER_LEAN_STRINGS="1" if lean else "0")
+    results = {}
+    for script in SCRIPTS:
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, str(SRC / script)], cwd=directory, env=env, capture_output=True, text=True
+        )
+        if completed.returncode:
+            sys.exit(f"{script} failed:\n{completed.stderr}")
+        peak = re.findall(r"Peak memory: (\d+) MB", completed.stdout + completed.stderr)
+        results[script] = (int(peak[-1]) if peak else None, time.perf_counter() - started)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[500000])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        print(f"{rows} redirects")
+        with tempfile.TemporaryDirectory() as tmp:
+            runs = {}
+            for lean in (False, True):
+                directory = Path(tmp) / ("lean" if lean else "object")
+                write_data(directory, rows)
+                runs[lean] = run_scripts(directory, lean)
+            for script in SCRIPTS:
+                (before, before_s), (after, after_s) = runs[False][script], runs[True][script]
+                print(
+                    f"  {script:<22} peak {before:6} MB -> {after:6} MB   "
+                    f"time {before_s:6.2f}s -> {after_s:6.2f}s"
+                )
+            for output in OUTPUTS:
+                if not filecmp.cmp(Path(tmp) / "object" / output, Path(tmp) / "lean" / output, shallow=False):
+                    sys.exit(f"{output} differs between the two runs")
+            print(f"  outputs identical ({len(OUTPUTS)} files checked)")
+
+
+if __name__ == "__main__":
+    main()
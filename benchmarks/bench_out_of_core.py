@@ -0,0 +1,73 @@
+"""Check the chunked (--memory-budget) mode of process_redirects.py and process_all.py.
+
+Writes a synthetic redirect export several times larger than the memory budget, runs
+the scripts in memory and in chunked mode, checks every CSV they write is
+byte-identical and reports peak RSS and run time of each. Snapshots are only taken in
+memory (see snapshots.py), so data/snapshots is left out of the comparison.
+
+    python benchmarks/bench_out_of_core.py --rows 2000000 --memory-budget 32
+"""
+import argparse
+import filecmp
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_memory import SRC, write_data
+
+STEPS = [("process_redirects.py", True), ("combine.py", False), ("process_all.py", True)]
+SKIPPED_OUTPUTS = Path("data") / "snapshots"
+
+
+def run(directory, budget):
+    """Run the scripts in `directory`, chunked with `budget` MB if given; return {script: (MB, s)}."""
+    results = {}
+    for script, chunked in STEPS:
+        command = [sys.executable, str(SRC / script)]
+        if budget and chunked:
+            command += ["--memory-budget", str(budget)]
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=directory, capture_output=True, text=True)
+        if completed.returncode:
+            sys.exit(f"{' '.join(command[1:])} failed:\n{completed.stderr}")
+        peak = re.findall(r"Peak memory: (\d+) MB", completed.stdout + completed.stderr)
+        results[script] = (int(peak[-1]) if peak else 0, time.perf_counter() - started)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--memory-budget", type=int, default=32, help="Budget in MB for the chunked run.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        memory, chunked = Path(tmp) / "memory", Path(tmp) / "chunked"
+        write_data(memory, args.rows)
+        write_data(chunked, args.rows)
+        size_mb = (memory / "data" / "redirects" / "redirects.csv").stat().st_size / (1 << 20)
+        print(f"{args.rows} redirects, {size_mb:.0f} MB export, {args.memory_budget} MB budget")
+
+        results = {"in memory": run(memory, None), "chunked": run(chunked, args.memory_budget)}
+        for script, _ in STEPS:
+            line = "   ".join(
+                f"{mode} {results[mode][script][0]:5} MB {results[mode][script][1]:7.2f}s" for mode in results
+            )
+            print(f"  {script:<22} {line}")
+
+        outputs = sorted(
+            output
+            for output in (path.relative_to(memory) for path in memory.rglob("*.csv"))
+            if SKIPPED_OUTPUTS not in output.parents
+        )
+        for output in outputs:
+            if not filecmp.cmp(memory / output, chunked / output, shallow=False):
+                sys.exit(f"{output} differs between the two runs")
+        print(f"  outputs identical ({len(outputs)} files checked)")
+
+
+if __name__ == "__main__":
+    main()
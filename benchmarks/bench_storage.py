@@ -0,0 +1,86 @@
+"""Benchmark the intermediate table formats in storage.py.
+
+Builds a synthetic redirect table (mostly URL strings, with targets repeated the way
+aliased nodes are), saves and loads it as CSV, Parquet and Feather, checks every
+format reads back the same values and reports seconds, file size and memory used.
+
+    python benchmarks/bench_storage.py --rows 2000000 5000000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import storage  # noqa: E402
+
+logging.getLogger().setLevel(logging.ERROR)
+
+SECTIONS = ["about-us", "news", "events", "careers", "practice-resources", "members"]
+FORMATS = ["csv", "parquet", "feather"]
+
+
+def redirect_table(rows, seed=0):
+    """A redirect table shaped like redirects_headers.csv, with ~10 redirects per target."""
+    rng = np.random.default_rng(seed)
+    sections = np.array(SECTIONS)[rng.integers(0, len(SECTIONS), rows)]
+    numbers = np.arange(rows).astype(str)
+    targets = rng.integers(0, max(1, rows // 10), rows).astype(str)
+    from_urls = pd.Series(sections, dtype=object) + "/legacy-page-" + numbers
+    df = pd.DataFrame({
+        "From URL": from_urls,
+        "To URL": "node/" + pd.Series(targets, dtype=object),
+        "Redirect Status": rng.choice([301, 302], rows, p=[0.95, 0.05]),
+        "Redirect Language": rng.choice(["und", "en"], rows, p=[0.9, 0.1]).astype(object),
+    })
+    return df.sort_values(by="To URL").reset_index(drop=True)
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def as_strings(df):
+    return df.astype(str).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[2000000])
+    args = parser.parse_args()
+
+    formats = FORMATS if storage.columnar_available() else ["csv"]
+    if formats == ["csv"]:
+        print("pyarrow is not installed; only CSV can be measured.")
+
+    for rows in args.rows:
+        df = redirect_table(rows)
+        reference = as_strings(df)
+        print(f"{rows} redirects")
+        with tempfile.TemporaryDirectory() as tmp:
+            for fmt in formats:
+                csv_path = os.path.join(tmp, f"{fmt}", "redirects_headers.csv")
+                os.makedirs(os.path.dirname(csv_path))
+                storage.FORMAT = fmt
+                path, save_seconds = timed(lambda: storage.save_intermediate(df, csv_path))
+                loaded, load_seconds = timed(lambda: storage.load_intermediate(csv_path))
+                if not as_strings(loaded).equals(reference):
+                    sys.exit(f"{fmt} does not read back the table that was saved")
+                print(
+                    f"  {fmt:<8} save {save_seconds:7.2f}s  load {load_seconds:7.2f}s  "
+                    f"file {os.path.getsize(path) / 1e6:8.1f} MB  "
+                    f"in memory {loaded.memory_usage(deep=True).sum() / 1e6:8.1f} MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Seeded synthetic Drupal data for the benchmarks: alias tables, redirect export, exclude list.
+
+The shapes follow the real site: about ten redirects per node, most pointing at
+internal:/node/N and the rest at aliases, other redirects (chains, the odd loop) or
+external sites, some repeated sources, query strings and the prefixes the filter rules
+drop. The same seed always gives the same files.
+
+    python benchmarks/fixtures.py --rows 100000 -o /tmp/fixture
+"""
+import argparse
+import csv
+import random
+from pathlib import Path
+
+SECTIONS = [
+    "about-us", "news", "events", "careers", "practice-resources", "members",
+    "specialist-sections", "jobs", "publications", "café-corner",
+]
+WORDS = ["occupational-therapy", "annual-conference", "guidance", "report", "policy", "webinar", "award"]
+ALIASES_PER_PAGE = 50
+REDIRECTS_PER_NODE = 10
+
+
+def node_count(rows):
+    return max(1, rows // REDIRECTS_PER_NODE)
+
+
+def alias_path(node):
+    return f"{SECTIONS[node * 7 % len(SECTIONS)]}/{WORDS[node % len(WORDS)]}-{node}"
+
+
+def from_url(index):
+    """Source path of redirect `index`; a pure function so later rows can point back to it."""
+    path = f"{SECTIONS[index * 3 % len(SECTIONS)]}/{WORDS[index * 5 % len(WORDS)]}-old-{index}"
+    if index % 41 == 0:
+        path += "?page=1"
+    elif index % 53 == 0:
+        path += "-0"
+    elif index % 67 == 0:
+        path = f"node/{index}"
+    return path
+
+
+def redirect_rows(rows, seed=0):
+    """(From URL, To URL, status, language) rows of a redirect export, as a generator."""
+    rng = random.Random(seed)
+    nodes = node_count(rows)
+    for index in range(rows):
+        source = from_url(rng.randrange(index)) if index and rng.random() < 0.03 else from_url(index)
+        kind = rng.random()
+        node = rng.randrange(nodes)
+        if kind < 0.70:
+            target = f"internal:/node/{node}"
+        elif kind < 0.85:
+            target = f"/{alias_path(node)}"
+        elif kind < 0.90 and index:
+            # Points at an earlier redirect's source, making a chain
+            target = f"/{from_url(rng.randrange(index))}"
+        elif kind < 0.901:
+            target = f"/{source}"
+        elif kind < 0.95:
+            target = f"https://www.example.org/{WORDS[node % len(WORDS)]}"
+        else:
+            target = f"node/{node}"
+        status = 301 if rng.random() < 0.95 else 302
+        language = "und" if rng.random() < 0.9 else "en"
+        yield source, target, status, language
+
+
+def alias_table(page, nodes, rows=ALIASES_PER_PAGE):
+    """One alias overview table of nodes page*rows onwards, as crawler.save_table_html writes it."""
+    body = []
+    for node in range(page * rows, min(nodes, (page + 1) * rows)):
+        alias = alias_path(node)
+        body.append(
+            f'<tr><td><a href="/{alias}">{alias.replace("&", "&amp;")}</a></td>'
+            f'<td><a href="/node/{node}">node/{node}</a></td>'
+            f'<td><a href="/admin/config/search/path/edit/{node}">edit</a></td></tr>'
+        )
+    return (
+        '<table class="sticky-enabled tableheader-processed sticky-table">'
+        "<thead><tr><th>Alias</th><th>System</th><th>Operations</th></tr></thead>"
+        f"<tbody>{''.join(body)}</tbody></table>"
+    )
+
+
+def write_redirects(path, rows, seed=0):
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        csv.writer(file, lineterminator="\n").writerows(redirect_rows(rows, seed))
+
+
+def write_fixtures(directory, rows, seed=0):
+    """Write the inputs of every processing script under `directory`/data; return their counts."""
+    data = Path(directory) / "data"
+    tables = data / "aliases" / "tables"
+    (data / "redirects").mkdir(parents=True, exist_ok=True)
+    tables.mkdir(parents=True, exist_ok=True)
+
+    write_redirects(data / "redirects" / "redirects.csv", rows, seed)
+
+    nodes = node_count(rows)
+    pages = -(-nodes // ALIASES_PER_PAGE)
+    for page in range(pages):
+        (tables / f"table{page}.html").write_text(alias_table(page, nodes), encoding="utf-8")
+
+    excluded = [from_url(index) for index in range(0, rows, 100)]
+    with open(data / "exclude.csv", "w", newline="", encoding="utf-8") as file:
+        csv.writer(file, lineterminator="\n").writerows([["From URL"]] + [[url] for url in excluded])
+    return {"redirects": rows, "aliases": nodes, "tables": pages, "excluded": len(excluded)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="Redirects to generate.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", type=Path, default=Path("."), help="Directory to write data/ into.")
+    args = parser.parse_args()
+    print(write_fixtures(args.output, args.rows, args.seed))
+
+
+if __name__ == "__main__":
+    main()
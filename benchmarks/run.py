@@ -0,0 +1,198 @@
+"""Time and memory-profile every pipeline stage on seeded synthetic data.
+
+For each size, fixtures.py writes alias tables, a redirect export and an exclude list.
+Each processing script then runs in its own process, in pipeline order, and its wall
+time and peak RSS are measured. The alias crawl, the redirect export and the target
+health check run over HTTP against stub_server.py to measure crawl throughput offline. Every run is appended as
+one JSON line to the results file and compared with the last run of the same size.
+
+    python benchmarks/run.py --rows 10000 100000 1000000 10000000
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import fixtures
+import stub_server
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+RESULTS = Path(__file__).resolve().parent / "results.jsonl"
+STAGES = [
+    "process_aliases",
+    "process_redirects",
+    "redirect_chains",
+    "combine",
+    "process_all",
+    "process_all_r",
+]
+CRAWL_STAGES = ["crawl_aliases", "export_redirects", "check_targets"]
+
+
+def run_stage(command, cwd, log_path):
+    """Run a command in `cwd`, logging to `log_path`; return its seconds, peak RSS and status."""
+    with open(log_path, "w") as log:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 gives the resource usage of this child alone
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    peak_mb = usage.ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+    return {"seconds": round(seconds, 3), "peak_mb": round(peak_mb, 1), "ok": process.returncode == 0}
+
+
+def script(name, *args):
+    return [sys.executable, str(SRC / f"{name}.py"), *args]
+
+
+def run_processing(directory, stages):
+    results = {}
+    for stage in stages:
+        results[stage] = run_stage(script(stage), directory, directory / f"{stage}.log")
+        report(stage, results[stage], directory / f"{stage}.log")
+    return results
+
+
+def run_crawls(directory, counts, stages, max_pages):
+    """Crawl the stub server's alias pager, download its redirect export and check targets."""
+    pages = min(counts["tables"], max_pages)
+    server = stub_server.make_server(pages=pages, rows=fixtures.ALIASES_PER_PAGE, redirects=counts["redirects"])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    directory.mkdir()
+    results = {}
+    try:
+        if "crawl_aliases" in stages:
+            command = script(
+                "crawler", "--http", "--stream", "--max-rps", "0", "-c", "bench", "--base-url", base_url
+            )
+            result = run_stage(command, directory, directory / "crawl_aliases.log")
+            result["pages_per_sec"] = round(pages / result["seconds"], 1)
+            results["crawl_aliases"] = result
+            report("crawl_aliases", result, directory / "crawl_aliases.log", f"{pages} pages")
+        if "export_redirects" in stages:
+            output = directory / "redirects.csv"
+            command = script("crawler_redirects", "--http", "-c", "bench", "--base-url", base_url, "-o", str(output))
+            result = run_stage(command, directory, directory / "export_redirects.log")
+            result["rows_per_sec"] = round(counts["redirects"] / result["seconds"], 1)
+            results["export_redirects"] = result
+            report("export_redirects", result, directory / "export_redirects.log")
+        if "check_targets" in stages:
+            # Checks targets of the merged table written by the processing stages
+            targets = max_pages * fixtures.ALIASES_PER_PAGE
+            command = script(
+                "health_check", "--base-url", base_url, "--internal-only", "--max-rps", "0", "--limit", str(targets),
+                "--cache", str(directory / "health.json"), "-o", str(directory / "health.csv"),
+            )
+            result = run_stage(command, directory.parent, directory / "check_targets.log")
+            results["check_targets"] = result
+            report("check_targets", result, directory / "check_targets.log", f"at most {targets} targets")
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def report(stage, result, log_path, note=""):
+    status = "" if result["ok"] else "  FAILED, see below"
+    print(f"  {stage:<18} {result['seconds']:9.2f}s {result['peak_mb']:9.1f} MB  {note}{status}")
+    if not result["ok"]:
+        print("    " + "\n    ".join(log_path.read_text().splitlines()[-10:]))
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SRC, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_run(results_path, rows):
+    """The last recorded run at `rows`, or None."""
+    if not results_path.exists():
+        return None
+    previous = None
+    with open(results_path) as file:
+        for line in file:
+            record = json.loads(line)
+            if record["rows"] == rows:
+                previous = record
+    return previous
+
+
+def compare(record, previous):
+    print(f"  compared with {previous['commit']} at {previous['timestamp']}:")
+    for stage, result in record["stages"].items():
+        before = previous["stages"].get(stage)
+        if not before or not before["ok"] or not result["ok"]:
+            continue
+        seconds = (result["seconds"] / before["seconds"] - 1) * 100 if before["seconds"] else 0
+        memory = (result["peak_mb"] / before["peak_mb"] - 1) * 100 if before["peak_mb"] else 0
+        print(f"    {stage:<18} time {seconds:+6.1f}%  peak {memory:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--stages", nargs="+", choices=STAGES + CRAWL_STAGES, default=STAGES + CRAWL_STAGES,
+        help="Stages to run (default: all).",
+    )
+    parser.add_argument(
+        "--crawl-pages", type=int, default=1000, help="Most alias pages to crawl from the stub server."
+    )
+    parser.add_argument("--results", type=Path, default=RESULTS, help="JSON lines file to append results to.")
+    parser.add_argument("--work-dir", type=Path, help="Where to write the fixtures (default: a temporary directory).")
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory(dir=args.work_dir) as tmp:
+            directory = Path(tmp)
+            started = time.perf_counter()
+            counts = fixtures.write_fixtures(directory, rows, args.seed)
+            fixture_seconds = time.perf_counter() - started
+            print(f"{rows} redirects, {counts['aliases']} aliases in {counts['tables']} tables "
+                  f"(generated in {fixture_seconds:.1f}s)")
+
+            stages = run_processing(directory, [stage for stage in STAGES if stage in args.stages])
+            crawls = [stage for stage in CRAWL_STAGES if stage in args.stages]
+            if crawls:
+                stages.update(run_crawls(directory / "crawl", counts, crawls, args.crawl_pages))
+
+        record = {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "format": os.getenv("CRAWLER_INTERMEDIATE_FORMAT", "csv"),
+            "seed": args.seed,
+            "rows": rows,
+            "fixtures": dict(counts, seconds=round(fixture_seconds, 3)),
+            "stages": stages,
+        }
+        previous = previous_run(args.results, rows)
+        if previous:
+            compare(record, previous)
+        with open(args.results, "a") as file:
+            file.write(json.dumps(record) + "\n")
+    print(f"Results appended to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
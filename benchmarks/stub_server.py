@@ -0,0 +1,239 @@
+"""Local stand-in for the Drupal admin pages, for exercising the crawlers offline.
+
+Run it and point the crawlers at it:
+
+    python benchmarks/stub_server.py --pages 303 --redirects 100000 --port 8000
+    python src/crawler.py --http -c anything --base-url http://127.0.0.1:8000
+    python src/crawler_redirects.py --http -c anything --base-url http://127.0.0.1:8000
+
+The redirect export form answers a POST with a fixtures.py redirect export of
+--redirects rows, streamed in chunks.
+
+Pages outside /admin need no cookie and answer GET and HEAD like the public site,
+for checking redirect targets with health_check.py: fixtures.py aliases answer 200,
+/node/N redirects to its alias (every 25th node is gone and answers 404) and old
+redirect sources (".../word-old-N") redirect to /node/N.
+
+--latency, --error-rate and --capacity make it slow, answer some requests with
+429 Too Many Requests, and answer 503 when too many requests are in flight, to
+exercise the crawler's adaptive throttling.
+"""
+import argparse
+import csv
+import io
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+from fixtures import alias_path, redirect_rows
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+ALIASES_PATH = "/admin/config/search/path"
+EXPORT_PATH = "/admin/config/search/redirect/export"
+FORM_TOKEN = "stub-form-token"
+EXPORT_CHUNK_ROWS = 5000
+
+
+def alias_row(page, index):
+    number = page * 1000 + index
+    return (
+        "<tr>"
+        f'<td><a href="/section-{number % 17}/page-{number}">section-{number % 17}/page-{number}</a></td>'
+        f'<td><a href="/node/{number}">node/{number}</a></td>'
+        f'<td><a href="/admin/config/search/path/edit/{number}">edit</a></td>'
+        f'<td><a href="/admin/config/search/path/delete/{number}">delete</a></td>'
+        "</tr>"
+    )
+
+
+def alias_page(page, pages, rows):
+    """Render one page of the alias overview in the Drupal 7 markup the crawler expects."""
+    body = "".join(alias_row(page, i) for i in range(rows))
+    pager = (
+        '<ul class="pager">'
+        f'<li class="pager-current">{page + 1}</li>'
+        f'<li class="pager-next"><a href="{ALIASES_PATH}?page={min(page + 1, pages - 1)}">next</a></li>'
+        f'<li class="pager-last last"><a href="{ALIASES_PATH}?page={pages - 1}">last »</a></li>'
+        "</ul>"
+    )
+    return (
+        "<html><body>"
+        '<table class="sticky-enabled tableheader-processed sticky-table">'
+        "<thead><tr><th>Alias</th><th>System</th><th>Operations</th></tr></thead>"
+        f"<tbody>{body}</tbody></table>{pager}"
+        "</body></html>"
+    )
+
+
+def export_form():
+    """The redirect export form, with the hidden fields Drupal expects back."""
+    return (
+        "<html><body>"
+        f'<form id="path-redirect-import-export-form" action="{EXPORT_PATH}" method="post">'
+        '<input type="hidden" name="form_build_id" value="form-stub">'
+        f'<input type="hidden" name="form_token" value="{FORM_TOKEN}">'
+        '<input type="hidden" name="form_id" value="path_redirect_import_export_form">'
+        '<input type="submit" id="edit-submit" name="op" value="Export" class="form-submit">'
+        "</form></body></html>"
+    )
+
+
+def site_page(path):
+    """(status, body, headers) of a public page, shaped like fixtures.py's redirect targets."""
+    path = unquote(path).strip("/")
+    node = re.fullmatch(r"node/(\d+)", path)
+    if node:
+        number = int(node.group(1))
+        if number % 25 == 0:
+            return 404, "Page not found", {}
+        return 301, "Moved", {"Location": "/" + quote(alias_path(number))}
+    old = re.fullmatch(r"[^/]+/[^/]+-old-(\d+)", path)
+    if old:
+        return 301, "Moved", {"Location": f"/node/{old.group(1)}"}
+    number = re.search(r"-(\d+)$", path)
+    if number and alias_path(int(number.group(1))) == path:
+        return 200, f"<html><body><h1>{path}</h1></body></html>", {}
+    return 404, "Page not found", {}
+
+
+def empty_page():
+    return '<html><body><table class="sticky-enabled tableheader-processed"><thead><tr><th>Alias</th></tr></thead><tbody><tr><td class="empty message">No URL aliases available.</td></tr></tbody></table></body></html>'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.startswith("/admin/"):
+            return self.respond_loaded(lambda: site_page(url.path))
+        if "SSESS" not in self.headers.get("Cookie", ""):
+            return self.respond(403, "Access denied")
+        if url.path == EXPORT_PATH:
+            return self.respond(200, export_form())
+        if url.path != ALIASES_PATH:
+            return self.respond(404, "Not found")
+
+        def aliases():
+            page = int(parse_qs(url.query).get("page", ["0"])[0])
+            html = alias_page(page, self.server.pages, self.server.rows) if page < self.server.pages else empty_page()
+            return 200, html, {}
+
+        self.respond_loaded(aliases)
+
+    do_HEAD = do_GET
+
+    def respond_loaded(self, render):
+        """Answer with render()'s (status, body, headers), slowed and refused as the server gets busy."""
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            in_flight = server.in_flight
+            throttled = server.random.random() < server.error_rate
+        try:
+            if server.capacity and in_flight > server.capacity:
+                return self.respond(503, "Service unavailable")
+            if throttled:
+                return self.respond(429, "Too many requests", {"Retry-After": "1"})
+
+            # Responses slow down as the server gets busier
+            load = in_flight / server.capacity if server.capacity else 0
+            time.sleep(server.latency * (1 + load))
+
+            self.respond(*render())
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8"))
+        if "SSESS" not in self.headers.get("Cookie", ""):
+            return self.respond(403, "Access denied")
+        if urlparse(self.path).path != EXPORT_PATH:
+            return self.respond(404, "Not found")
+        if form.get("form_token") != [FORM_TOKEN] or form.get("op") != ["Export"]:
+            # Drupal shows the form again when the token is missing or stale
+            return self.respond(200, export_form())
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv; charset=utf-8")
+        self.send_header("Content-Disposition", 'attachment; filename="redirects.csv"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        rows = redirect_rows(self.server.redirects, self.server.seed)
+        while True:
+            buffer = io.StringIO()
+            chunk = [row for _, row in zip(range(EXPORT_CHUNK_ROWS), rows)]
+            if not chunk:
+                break
+            csv.writer(buffer, lineterminator="\n").writerows(chunk)
+            payload = buffer.getvalue().encode("utf-8")
+            self.wfile.write(f"{len(payload):X}\r\n".encode("ascii") + payload + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def respond(self, status, body, headers=None):
+        payload = body.encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+def make_server(
+    port=0, pages=303, rows=50, latency=0.0, error_rate=0.0, capacity=0, seed=0, redirects=10000
+):
+    """Create (but do not start) a stub server; port 0 picks a free port."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.pages = pages
+    server.rows = rows
+    server.redirects = redirects
+    server.seed = seed
+    server.latency = latency
+    server.error_rate = error_rate
+    server.capacity = capacity
+    server.random = random.Random(seed)
+    server.in_flight = 0
+    server.lock = threading.Lock()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fake Drupal admin pages.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pages", type=int, default=303, help="Number of alias pager pages.")
+    parser.add_argument("--rows", type=int, default=50, help="Aliases per page.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Base response time in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered 429.")
+    parser.add_argument("--capacity", type=int, default=0, help="Concurrent requests before answering 503.")
+    parser.add_argument("--redirects", type=int, default=10000, help="Rows in the redirect export.")
+    args = parser.parse_args()
+
+    server = make_server(
+        args.port, args.pages, args.rows, args.latency, args.error_rate, args.capacity,
+        redirects=args.redirects,
+    )
+    logging.info(f"Serving {args.pages} alias pages on http://127.0.0.1:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopping stub server.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
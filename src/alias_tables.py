@@ -0,0 +1,182 @@
+import csv
+import html
+import os
+import re
+import threading
+from html.parser import HTMLParser
+
+COLUMNS = ["Alias", "System"]
+TABLE_CLASS = "tableheader-processed"
+
+TABLE_START = re.compile(
+    r"""<table\b[^>]*\bclass=(["'])(?:[^"']*\s)?tableheader-processed(?:\s[^"']*)?\1[^>]*>""",
+    re.IGNORECASE,
+)
+# Markup the regular-expression path does not handle; such tables go through AliasTableParser
+COMPLEX_MARKUP = re.compile(r"<(?:table|script|style|!)", re.IGNORECASE)
+ROW = re.compile(r"<tr[\s>](.*?)</tr>", re.IGNORECASE | re.DOTALL)
+CELL = re.compile(r"<td\b[^>]*>(.*?)</td>", re.IGNORECASE | re.DOTALL)
+TAG = re.compile(r"<[^>]*>")
+ROW_START = re.compile(r"<tr[\s>]", re.IGNORECASE)
+CELL_START = re.compile(r"<td\b", re.IGNORECASE)
+# A ">" inside a quoted attribute value, which would end a tag early for TAG and CELL
+QUOTED_GT = re.compile(r"""=\s*(?:"[^"]*>|'[^']*>)""")
+
+
+def extract_data(row):
+    """Extract data from a table row."""
+    cols = row.find_all("td")
+    return [cols[0].text.strip(), cols[1].text.strip()]
+
+
+def table_rows(table):
+    """Extract the [Alias, System] rows of an alias overview table."""
+    rows = table.find_all("tr")
+    return [extract_data(row) for row in rows[1:] if len(row.find_all("td")) > 1]
+
+
+class AliasTableParser(HTMLParser):
+    """Streaming tokenizer that collects the [Alias, System] rows of the alias table.
+
+    Gives the same rows as table_rows() on a BeautifulSoup tree of the same file,
+    without building the tree: only text inside the first two cells of each row
+    of the first `tableheader-processed` table is kept. Tables nested inside a
+    cell are not flattened into the outer rows the way BeautifulSoup does.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.found = False
+        self.depth = 0  # <table> nesting inside the alias table, 0 when outside it
+        self.skip = 0  # inside <script>/<style>, whose text is not part of a cell's text
+        self.rows = []
+        self.row_index = -1
+        self.cells = None  # text chunks of each cell in the current row
+        self.cell = None  # text chunks of the open cell
+
+    def handle_starttag(self, tag, attrs):
+        if not self.depth:
+            if tag == "table" and not self.found:
+                classes = (dict(attrs).get("class") or "").split()
+                if TABLE_CLASS in classes:
+                    self.found = True
+                    self.depth = 1
+            return
+
+        if tag == "table":
+            self.depth += 1
+        elif tag == "tr":
+            self.end_row()
+            self.row_index += 1
+            self.cells = []
+        elif tag == "td" and self.cells is not None:
+            self.cell = []
+            self.cells.append(self.cell)
+        elif tag in ("script", "style"):
+            self.skip += 1
+
+    def handle_endtag(self, tag):
+        if not self.depth:
+            return
+
+        if tag == "td":
+            self.cell = None
+        elif tag == "tr":
+            self.end_row()
+        elif tag in ("script", "style"):
+            self.skip = max(0, self.skip - 1)
+        elif tag == "table":
+            self.depth -= 1
+            if not self.depth:
+                self.end_row()
+
+    def handle_data(self, data):
+        if self.cell is not None and not self.skip:
+            self.cell.append(data)
+
+    def end_row(self):
+        # Like table_rows(): skip the first row and rows without at least two cells
+        if self.cells is not None and self.row_index > 0 and len(self.cells) > 1:
+            self.rows.append(
+                ["".join(self.cells[0]).strip(), "".join(self.cells[1]).strip()]
+            )
+        self.cells = None
+        self.cell = None
+
+
+def cell_text(cell):
+    return html.unescape(TAG.sub("", cell)).strip()
+
+
+def regex_rows(table):
+    """Cut the rows out of the inside of a table, or return None if the markup is not regular enough.
+
+    Every <tr> and <td> must be matched by its end tag, so a row or cell the
+    expressions would skip or run together sends the table to AliasTableParser.
+    """
+    if QUOTED_GT.search(table):
+        return None
+    rows = ROW.findall(table)
+    lowered = table.lower()
+    if not len(rows) == len(ROW_START.findall(table)) == lowered.count("</tr>"):
+        return None
+    cells = [CELL.findall(row) for row in rows]
+    if not len(CELL_START.findall(table)) == lowered.count("</td>") == sum(map(len, cells)):
+        return None
+    return [[cell_text(row[0]), cell_text(row[1])] for row in cells[1:] if len(row) > 1]
+
+
+def parse_alias_rows(content):
+    """Return the [Alias, System] rows of the alias table in content, or None if there is no table.
+
+    Well-formed tables, such as the ones crawler.py saves, are cut up with regular
+    expressions; anything with nested tables, scripts or comments goes through the
+    slower AliasTableParser, as does any table whose rows the regular expressions
+    do not account for (omitted end tags, ">" in attribute values). Both give the
+    same rows as table_rows() for the alias overview markup.
+    """
+    if TABLE_CLASS not in content:
+        return None
+
+    start = TABLE_START.search(content)
+    end = content.find("</table>", start.end()) if start else -1
+    if end != -1 and not COMPLEX_MARKUP.search(content, start.end(), end):
+        rows = regex_rows(content[start.end():end])
+        if rows is not None:
+            return rows
+
+    parser = AliasTableParser()
+    parser.feed(content)
+    parser.close()
+    return parser.rows if parser.found else None
+
+
+class AliasStream:
+    """Appends alias rows to the combined CSV as pages are crawled.
+
+    Writes are serialised, so pages may arrive from several threads.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_header = not (append and os.path.exists(path))
+        # Match the line endings pandas writes, so the file reads back the same way
+        self.file = open(path, "a" if append else "w", newline="")
+        self.writer = csv.writer(self.file, lineterminator="\n")
+        self.lock = threading.Lock()
+        self.rows = 0
+        if write_header:
+            self.writer.writerow(COLUMNS)
+
+    def write(self, rows):
+        with self.lock:
+            self.writer.writerows(rows)
+            self.file.flush()
+            self.rows += len(rows)
+
+    def close(self):
+        self.file.close()
+        # Mark the CSV as the newest copy, even if no rows were added, so storage.intermediate_source
+        # picks it over a columnar copy left by an earlier run
+        os.utime(self.path)
@@ -0,0 +1,167 @@
+import functools
+import logging
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+
+from selenium import webdriver
+from selenium.common.exceptions import SessionNotCreatedException
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+# One profile for the alias and redirect crawlers, so its HTTP cache and cookies carry over
+PROFILE_DIR = Path(__file__).resolve().parent.parent / "data" / ".chrome-profile"
+# Files Chrome holds while a profile is in use (Linux/macOS, Windows)
+PROFILE_LOCKS = ("SingletonLock", "lockfile")
+
+# Where webdriver-manager and Selenium Manager keep the drivers they have downloaded
+DRIVER_CACHES = [
+    Path(os.getenv("WDM_CACHE_DIR", Path.home() / ".wdm")) / "drivers" / "chromedriver",
+    Path.home() / ".cache" / "selenium" / "chromedriver",
+]
+DRIVER_NAMES = ("chromedriver", "chromedriver.exe")
+
+# The admin pages are only scraped, so images, styles, fonts and media are never fetched.
+# Drupal adds a cache-busting query string to its assets (styles.css?t=abc123), so each
+# extension is blocked with and without one.
+BLOCKED_URLS = [
+    pattern
+    for extension in (
+        "png", "jpg", "jpeg", "gif", "webp", "svg", "ico", "bmp",
+        "css", "woff", "woff2", "ttf", "otf", "eot", "mp4", "webm", "mp3",
+    )
+    for pattern in (f"*.{extension}", f"*.{extension}?*")
+]
+BLOCKED_CONTENT = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.managed_default_content_settings.media_stream": 2,
+    "profile.managed_default_content_settings.notifications": 2,
+}
+
+
+def version_key(path):
+    """Sort key of a cached driver by the version in its path (e.g. .../124.0.6367.91/...)."""
+    versions = re.findall(r"\d+(?:\.\d+)+", str(path))
+    return tuple(int(part) for part in versions[-1].split(".")) if versions else ()
+
+
+def cached_driver():
+    """The newest chromedriver already on disk, or None, without any network access."""
+    if os.getenv("CHROMEDRIVER_PATH"):
+        return os.environ["CHROMEDRIVER_PATH"]
+    found = [
+        path
+        for cache in DRIVER_CACHES
+        if cache.is_dir()
+        for name in DRIVER_NAMES
+        for path in cache.rglob(name)
+        if path.is_file() and os.access(path, os.X_OK)
+    ]
+    if found:
+        return str(max(found, key=version_key))
+    return shutil.which("chromedriver")
+
+
+@functools.lru_cache(maxsize=None)
+def driver_path(online=False):
+    """Path of chromedriver, from the local cache unless `online` or nothing is cached.
+
+    Resolved once per process, so every browser of a pool shares one lookup.
+    """
+    path = None if online else cached_driver()
+    if path:
+        logging.info(f"Using cached chromedriver {path}")
+        return path
+    logging.info("No cached chromedriver, resolving one with webdriver-manager.")
+    return ChromeDriverManager().install()
+
+
+def profile_in_use(profile_dir):
+    """Whether a running Chrome holds the profile; a lock left by a crashed one is ignored."""
+    for lock in PROFILE_LOCKS:
+        path = Path(profile_dir) / lock
+        if not os.path.lexists(path):
+            continue
+        if not path.is_symlink():
+            return True
+        # On Linux and macOS the lock is a symlink to "<hostname>-<pid>"
+        pid = os.readlink(path).rpartition("-")[2]
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except (ValueError, PermissionError):
+            return True
+        return True
+    return False
+
+
+def chrome_options(headless=True, download_dir=None, profile_dir=None, block_resources=True):
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+        options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--no-first-run")
+    options.add_argument("--no-default-browser-check")
+    if profile_dir:
+        options.add_argument(f"--user-data-dir={profile_dir}")
+
+    prefs = dict(BLOCKED_CONTENT) if block_resources else {}
+    if download_dir:
+        prefs.update({
+            "download.default_directory": str(download_dir),
+            "download.prompt_for_download": False,
+            "download.directory_upgrade": True,
+            "safebrowsing.enabled": True,
+        })
+    options.add_experimental_option("prefs", prefs)
+    return options
+
+
+def setup_driver(headless=True, download_dir=None, shared_profile=False, block_resources=True):
+    """Start Chrome with a cached driver, blocking everything but documents and scripts.
+
+    With `shared_profile`, the browser uses PROFILE_DIR unless another browser already
+    has it open (Chrome allows one at a time), in which case it starts with a fresh one.
+    """
+    started = time.perf_counter()
+    profile_dir = None
+    if shared_profile:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        if profile_in_use(PROFILE_DIR):
+            logging.info(f"Browser profile {PROFILE_DIR} is in use, starting with a fresh one.")
+        else:
+            profile_dir = PROFILE_DIR
+    options = chrome_options(headless, download_dir, profile_dir, block_resources)
+
+    try:
+        driver = webdriver.Chrome(service=Service(driver_path()), options=options)
+    except SessionNotCreatedException as e:
+        # Usually a cached driver too old for the installed Chrome
+        logging.warning(f"Cached chromedriver failed to start Chrome ({e.msg}), fetching a matching one.")
+        driver = webdriver.Chrome(service=Service(driver_path(online=True)), options=options)
+
+    if block_resources:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    if download_dir:
+        # Headless Chrome ignores the download prefs unless downloads are allowed explicitly
+        driver.execute_cdp_cmd(
+            "Browser.setDownloadBehavior", {"behavior": "allow", "downloadPath": str(download_dir)}
+        )
+    if not headless:
+        driver.maximize_window()
+    driver.started = started
+    return driver
+
+
+def open_site(driver, base_url, cookies):
+    """Load the site, add the session cookie and log the time since the driver was set up."""
+    driver.get(base_url)
+    driver.add_cookie(cookies)
+    logging.info(
+        f"Browser ready on {base_url} {time.perf_counter() - driver.started:.2f}s after startup."
+    )
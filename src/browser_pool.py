@@ -0,0 +1,121 @@
+import logging
+import queue
+import threading
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+REPORT_EVERY = 25
+
+
+def quit_driver(driver):
+    """Quit a driver, ignoring errors from one that has already died."""
+    if driver is None:
+        return
+    try:
+        driver.quit()
+    except Exception as e:
+        logging.debug(f"Ignoring error while quitting driver: {str(e)}")
+
+
+def worker(worker_id, make_driver, work, process_page, progress, max_attempts):
+    """Take pages off the work queue until it is empty, respawning the driver if it dies."""
+    driver = None
+    while True:
+        try:
+            page, attempt = work.get_nowait()
+        except queue.Empty:
+            break
+
+        try:
+            if driver is None:
+                driver = make_driver()
+            process_page(driver, page)
+            progress.page_done(page)
+        except TimeoutException as e:
+            # The page loaded but the table never appeared; the browser itself is fine
+            logging.error(f"Failed to process page {page}: {str(e)}")
+            progress.page_failed(page, str(e))
+        except WebDriverException as e:
+            logging.warning(
+                f"Worker {worker_id}: driver failed on page {page} ({e.msg}), respawning."
+            )
+            quit_driver(driver)
+            driver = None
+            if attempt < max_attempts:
+                work.put((page, attempt + 1))
+            else:
+                progress.page_failed(page, e.msg)
+        except Exception as e:
+            logging.error(f"Failed to process page {page}: {str(e)}")
+            progress.page_failed(page, str(e))
+
+    quit_driver(driver)
+
+
+class Progress:
+    """Thread-safe tally of finished pages with a running pages/sec rate."""
+
+    def __init__(self, total):
+        self.total = total
+        self.done = []
+        self.failed = {}
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return len(self.done) / elapsed if elapsed else 0.0
+
+    def page_done(self, page):
+        with self.lock:
+            self.done.append(page)
+            if len(self.done) % REPORT_EVERY == 0:
+                logging.info(
+                    f"{len(self.done)}/{self.total} pages done ({self.rate():.2f} pages/sec)"
+                )
+
+    def page_failed(self, page, error=None):
+        with self.lock:
+            self.failed[page] = error
+
+
+def crawl_with_pool(make_driver, pages, process_page, size, max_attempts=3):
+    """Crawl pages with `size` browsers pulling from a shared work queue.
+
+    `make_driver()` must return a ready (authenticated) driver and
+    `process_page(driver, page)` must raise on failure. Returns a dict of the pages
+    that failed and their errors.
+    """
+    work = queue.Queue()
+    for page in pages:
+        work.put((page, 1))
+    progress = Progress(work.qsize())
+
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(i, make_driver, work, process_page, progress, max_attempts),
+            name=f"browser-{i}",
+            daemon=True,
+        )
+        for i in range(size)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        # Empty the queue so each worker quits its browser after the current page
+        while not work.empty():
+            work.get_nowait()
+        for thread in threads:
+            thread.join()
+        raise
+
+    logging.info(
+        f"Browser pool of {size} finished {len(progress.done)}/{progress.total} pages "
+        f"at {progress.rate():.2f} pages/sec."
+    )
+    return progress.failed
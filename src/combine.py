@@ -1,20 +1,54 @@
+import argparse
+import logging
+
 import pandas as pd
 
+import metrics
+import storage
+import url_keys
+
+
+@metrics.timed("combine.merge_redirects_aliases")
+def merge_redirects_aliases(df_redirect, df_combined):
+    """Join redirects to the aliases of their target paths.
+
+    Paths are matched on their canonical URL keys (see url_keys.py), so `/node/12`,
+    `internal:/node/12` and `node/12` join, and the join itself runs on integer codes.
+    """
+    (to_keys, system_keys), _ = url_keys.url_key_codes(df_redirect['To URL'], df_combined['System'])
+    df_redirect = df_redirect[['From URL', 'To URL']].assign(**{'URL key': to_keys})
+    df_combined = df_combined[['Alias', 'System']].assign(**{'URL key': system_keys})
+    df_combined = df_combined[df_combined['URL key'] >= 0]
+
+    # Merge the DataFrames based on the keys of 'To URL' and 'System'
+    merged_df = pd.merge(df_redirect, df_combined, on='URL key', how='inner')
+
+    exact = (merged_df['To URL'].to_numpy(dtype=object) == merged_df['System'].to_numpy(dtype=object)).sum()
+    logging.info(
+        f"Joined {len(merged_df)} redirects to aliases, {len(merged_df) - exact} of them "
+        f"only after normalising the URLs."
+    )
+
+    # Create a new DataFrame with desired columns
+    return merged_df[['From URL', 'To URL', 'Alias']]
+
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Join the redirects to the aliases of their targets.")
+    metrics.add_arguments(parser)
+    metrics.configure(parser.parse_args())
+
     # Read the CSV files
-    df_combined = pd.read_csv('./data/aliases/combined.csv')
+    df_combined = storage.load_intermediate('./data/aliases/combined.csv')
     #df_redirect = pd.read_csv('./data/redirects/duplicate_redirects_From_URL.csv')
-    df_redirect = pd.read_csv('./data/redirects/redirects_headers.csv')
-
-    # Merge the DataFrames based on 'To URL' and 'System'
-    merged_df = pd.merge(df_redirect, df_combined, left_on='To URL', right_on='System', how='inner')
+    df_redirect = storage.load_intermediate('./data/redirects/redirects_headers.csv')
 
-    # Create a new DataFrame with desired columns
-    new_df = merged_df[['From URL', 'To URL', 'Alias']]
+    new_df = merge_redirects_aliases(df_redirect, df_combined)
 
-    # Write the new DataFrame to a CSV file
-    new_df.to_csv('./data/merged_data_all.csv', index=False)
+    # Write the new DataFrame for process_all.py
+    storage.save_intermediate(new_df, './data/merged_data_all.csv')
+    storage.log_peak_memory()
 
 
 if __name__ == '__main__':
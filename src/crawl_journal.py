@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+import threading
+import time
+
+JOURNAL_NAME = "journal.jsonl"
+
+
+class CrawlJournal:
+    """Append-only record of completed and failed pages, so an interrupted crawl can resume.
+
+    Every outcome is flushed to disk as one JSON line as soon as it is known.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.completed = set()
+        self.failed = {}
+        self.lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            with open(path, "r") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line cut short by a crash
+                    self.apply(entry)
+            logging.info(
+                f"Resuming: {len(self.completed)} pages already done, "
+                f"{len(self.failed)} failed last time."
+            )
+        self.file = open(path, "a" if resume else "w")
+
+    def apply(self, entry):
+        page = entry["page"]
+        if entry["status"] == "done":
+            self.completed.add(page)
+            self.failed.pop(page, None)
+        else:
+            self.failed[page] = entry.get("error")
+
+    def write(self, entry):
+        with self.lock:
+            self.apply(entry)
+            self.file.write(json.dumps(entry) + "\n")
+            self.file.flush()
+
+    def done(self, page):
+        self.write({"page": page, "status": "done", "time": time.time()})
+
+    def fail(self, page, error=None):
+        self.write({"page": page, "status": "failed", "error": error, "time": time.time()})
+
+    def is_done(self, page):
+        return page in self.completed
+
+    def pending(self, pages):
+        """The pages not yet completed, in order."""
+        return [page for page in pages if page not in self.completed]
+
+    def close(self):
+        """Close the journal and report any pages that never succeeded."""
+        self.file.close()
+        if self.failed:
+            logging.error(f"{len(self.failed)} pages never succeeded:")
+            for page, error in sorted(self.failed.items()):
+                logging.error(f"  page {page}: {error}")
+        else:
+            logging.info(f"All {len(self.completed)} pages completed.")
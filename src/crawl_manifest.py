@@ -0,0 +1,103 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+MANIFEST_NAME = "manifest.json"
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_manifest(path):
+    """Load a crawl manifest, or return an empty one if it does not exist yet."""
+    if not os.path.exists(path):
+        return {"pages": {}, "changed": [], "removed": {}, "updated": None}
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+class CrawlManifest:
+    """Per-page record of what a crawl fetched, used to skip pages that have not changed.
+
+    Each page entry holds the URL, fetch time, time the content last changed,
+    content hash, row count, first and last alias, and any ETag/Last-Modified
+    the server sent.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        manifest = load_manifest(path)
+        self.previous = manifest["pages"]
+        self.pages = dict(self.previous)
+        self.removed = manifest.get("removed", {})
+        self.changed = set()
+        self.lock = threading.Lock()
+
+    def conditional_headers(self, page):
+        """Headers for a conditional GET of a page, if the server gave us validators last time."""
+        entry = self.previous.get(str(page), {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def record(self, page, url, table_html, rows, first_alias=None, last_alias=None,
+               etag=None, last_modified=None):
+        """Record a fetched page and return whether it differs from the previous crawl."""
+        fetched = now()
+        entry = {
+            "url": url,
+            "fetched": fetched,
+            "changed": fetched,
+            "hash": content_hash(table_html),
+            "rows": rows,
+            "first_alias": first_alias,
+            "last_alias": last_alias,
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        with self.lock:
+            previous = self.previous.get(str(page))
+            changed = previous is None or previous["hash"] != entry["hash"]
+            self.removed.pop(str(page), None)
+            if changed:
+                self.changed.add(page)
+            else:
+                entry["changed"] = previous["changed"]
+            self.pages[str(page)] = entry
+        return changed
+
+    def mark_unchanged(self, page):
+        """Refresh the fetch time of a page the server reported as not modified."""
+        with self.lock:
+            self.pages[str(page)] = dict(self.previous[str(page)], fetched=now())
+
+    def forget_from(self, total):
+        """Drop pages at or beyond `total` after the pager has shrunk."""
+        with self.lock:
+            for page in [p for p in self.pages if int(p) >= total]:
+                del self.pages[page]
+                self.removed[page] = now()
+
+    def save(self):
+        manifest = {
+            "updated": now(),
+            "changed": sorted(self.changed),
+            "removed": self.removed,
+            "pages": dict(sorted(self.pages.items(), key=lambda item: int(item[0]))),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file, indent=1)
+        os.replace(tmp_path, self.path)
+        logging.info(f"Manifest saved: {len(self.changed)} of {len(self.pages)} pages changed.")
@@ -3,16 +3,24 @@ import logging
 import os
 import re
 import sys
+import time
 from pathlib import Path
 from bs4 import BeautifulSoup
 from keyring.errors import KeyringLocked
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC, ui as ui
-from webdriver_manager.chrome import ChromeDriverManager
 import browsercookie
 
+import browser
+import browser_pool
+import metrics
+from alias_tables import AliasStream, table_rows
+import http_fetch
+from throttle import AdaptiveLimiter
+from crawl_journal import JOURNAL_NAME, CrawlJournal
+from crawl_manifest import MANIFEST_NAME, CrawlManifest
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -21,6 +29,91 @@ logging.basicConfig(
 # Directory setup
 new_directory_path = Path.cwd() / "data" / "tables"
 new_directory_path.mkdir(parents=True, exist_ok=True)
+combined_csv_path = Path.cwd() / "data" / "aliases" / "combined.csv"
+
+BASE_URL = "https://www.rcot.co.uk"
+PAGE_PARAM = re.compile(r"[?&]page=(\d+)")
+ROWS_PER_PAGE = metrics.histogram("rows_per_page", "Alias rows found on each pager page.", metrics.ROW_BUCKETS)
+
+
+def page_url(count, base_url=BASE_URL):
+    return f"{base_url}/admin/config/search/path?page={count}"
+
+
+def extract_table(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return soup.find("table", class_="tableheader-processed")
+
+
+def page_count(html):
+    """Read the number of pager pages from the "last page" link (1 if there is no pager)."""
+    soup = BeautifulSoup(html, "html.parser")
+    pager = soup.find("ul", class_=["pager", "pager__items"])
+    if not pager:
+        return 1
+
+    last = 0
+    for link in pager.find_all("a", href=True):
+        match = PAGE_PARAM.search(link["href"])
+        if match:
+            last = max(last, int(match.group(1)))
+    return last + 1
+
+
+class CrawlContext:
+    """Where a crawl records its pages, and what it writes for each of them.
+
+    With an alias `stream`, rows go straight into the combined CSV and the table
+    HTML is only saved if `keep_html` is set.
+    """
+
+    def __init__(self, manifest, journal, incremental=False, stream=None, keep_html=True):
+        self.manifest = manifest
+        self.journal = journal
+        self.incremental = incremental
+        self.stream = stream
+        self.keep_html = keep_html
+
+
+def remove_stale_tables(total, manifest):
+    """Delete tables left over from an earlier crawl of a longer pager."""
+    manifest.forget_from(total)
+    for file_path in new_directory_path.glob("table*.html"):
+        index = file_path.stem[len("table"):]
+        if index.isdigit() and int(index) >= total:
+            file_path.unlink()
+            logging.info(f"Removed stale {file_path.name}")
+
+
+def process_page(html, count, context, url=None, headers=None):
+    """Save the alias table of a page and return how many alias rows it had.
+
+    In incremental mode a table identical to the one from the previous crawl is not rewritten.
+    """
+    table = extract_table(html)
+    rows = table_rows(table) if table else []
+    ROWS_PER_PAGE.observe(len(rows))
+    headers = headers or {}
+    changed = context.manifest.record(
+        count,
+        url or page_url(count),
+        str(table) if table else "",
+        len(rows),
+        rows[0][0] if rows else None,
+        rows[-1][0] if rows else None,
+        headers.get("ETag"),
+        headers.get("Last-Modified"),
+    )
+    if context.stream:
+        context.stream.write(rows)
+
+    file_path = new_directory_path / f"table{count}.html"
+    if context.incremental and not changed and file_path.exists():
+        logging.debug(f"Page {count} unchanged, skipping.")
+    elif context.keep_html:
+        save_table_html(table, count)
+    context.journal.done(count)
+    return len(rows)
 
 
 def get_cookies():
@@ -52,43 +145,226 @@ def save_table_html(table, count):
         file.write(str(table) if table else "No table found")
 
 
-def get_table(driver, count):
-    try:
-        # Navigate to the page
-        driver.get(f"https://www.rcot.co.uk/admin/config/search/path?page={count}")
+def load_table(driver, count):
+    """Open a pager page in the browser and return its HTML once the table is there."""
+    # Navigate to the page
+    started = time.monotonic()
+    driver.get(page_url(count))
+    loaded = time.monotonic()
+    http_fetch.FETCH_SECONDS.observe(loaded - started, mode="browser")
+
+    # Wait for the table to be loaded
+    ui.WebDriverWait(driver, 5).until(
+        EC.presence_of_element_located((By.CLASS_NAME, "tableheader-processed"))
+    )
+    http_fetch.WAIT_SECONDS.observe(time.monotonic() - loaded, mode="browser")
+
+    html = driver.page_source
+    http_fetch.BYTES_FETCHED.inc(len(html.encode("utf-8")), mode="browser")
+    return html
 
-        # Wait for the table to be loaded
-        ui.WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "tableheader-processed"))
-        )
 
-        # Extract the table using BeautifulSoup
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-        table = soup.find("table", class_="tableheader-processed")
+def fetch_table(driver, count, context):
+    return process_page(load_table(driver, count), count, context)
 
-        # Save the table to an HTML file
-        file_path = new_directory_path / f"table{count}.html"
-        with open(file_path, "w") as file:
-            file.write(str(table) if table else "No table found")
 
+def get_table(driver, count, context):
+    try:
+        return http_fetch.retry_with_backoff(lambda: fetch_table(driver, count, context))
     except Exception as e:
         logging.error(f"Failed to process page {count}: {str(e)}")
+        context.journal.fail(count, str(e))
 
 
-def setup_driver():
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service)
-    driver.maximize_window()
-    return driver
+def crawl_browser(cookies, context, pages=None, headless=True):
+    """Crawl the pager pages one at a time in a single browser."""
+    driver = browser.setup_driver(headless=headless, shared_profile=True)
+    browser.open_site(driver, BASE_URL, cookies)
+    logging.info("Cookies provided, proceeding with the program.")
 
+    try:
+        if pages is None:
+            html = http_fetch.retry_with_backoff(lambda: load_table(driver, 0))
+            if not context.journal.is_done(0):
+                process_page(html, 0, context)
+            total = page_count(html)
+            logging.info(f"Pager has {total} pages.")
+            remove_stale_tables(total, context.manifest)
+            pages = range(1, total)
 
-def main():
+        for i in context.journal.pending(pages):
+            if get_table(driver, i, context) == 0:
+                logging.info(f"Page {i} has no aliases, stopping.")
+                break
+    finally:
+        driver.quit()
+        logging.info("Driver closed.")
+
+
+def crawl_browser_pool(cookies, size, context, pages=None):
+    """Crawl pages with `size` headless browsers sharing the authenticated cookie."""
+    if pages is None:
+        # Reading the pager is a single plain GET, no need to start a browser for it
+        session = http_fetch.make_session(cookies, pool_size=1)
+        try:
+            pages = crawl_first_page(session, context)
+        finally:
+            session.close()
+
+    def make_driver():
+        # Chrome opens a profile in one browser at a time, so pool browsers get fresh ones
+        driver = browser.setup_driver(headless=True)
+        browser.open_site(driver, BASE_URL, cookies)
+        return driver
+
+    def process(driver, count):
+        # A dead browser is left to the pool to respawn; anything else is retried here
+        http_fetch.retry_with_backoff(
+            lambda: fetch_table(driver, count, context),
+            should_retry=lambda e: isinstance(e, TimeoutException),
+        )
+
+    failed = browser_pool.crawl_with_pool(
+        make_driver, context.journal.pending(pages), process, size
+    )
+    for count, error in failed.items():
+        context.journal.fail(count, error)
+
+
+def crawl_first_page(session, context, base_url=BASE_URL, limiter=None):
+    """Save the first pager page and return the remaining pages to crawl.
+
+    When resuming a crawl that already saved page 0, the page is only read for its pager.
+    """
+    response = http_fetch.fetch_with_retries(session, page_url(0, base_url), limiter=limiter)
+    if not context.journal.is_done(0):
+        process_page(response.text, 0, context, response.url, response.headers)
+    total = page_count(response.text)
+    logging.info(f"Pager has {total} pages.")
+    remove_stale_tables(total, context.manifest)
+    return range(1, total)
+
+
+def crawl_http(cookies, limiter, context, pages=None, base_url=BASE_URL):
+    """Fetch the pager pages over plain HTTP, reusing the session cookie.
+
+    Concurrency adapts to the latency and errors the site shows, within the limiter's
+    ceiling and rate cap. In incremental mode pages are requested conditionally when
+    the previous crawl recorded an ETag or Last-Modified for them.
+    """
+
+    def handle_response(count, response):
+        if response.status_code == 304:
+            context.manifest.mark_unchanged(count)
+            context.journal.done(count)
+            return
+        process_page(response.text, count, context, response.url, response.headers)
+
+    session = http_fetch.make_session(cookies, pool_size=limiter.ceiling)
+    try:
+        if pages is None:
+            pages = crawl_first_page(session, context, base_url, limiter)
+        urls = {count: page_url(count, base_url) for count in context.journal.pending(pages)}
+        failed = http_fetch.fetch_pages(
+            session,
+            urls,
+            handle_response,
+            limiter,
+            headers_for=context.manifest.conditional_headers if context.incremental else None,
+        )
+    finally:
+        session.close()
+    for count, error in failed.items():
+        context.journal.fail(count, error)
+    logging.info(f"Fetched {len(urls) - len(failed)} of {len(urls)} pages over HTTP.")
+
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Process cookies for site.")
     parser.add_argument(
         "-c", "--cookies", type=str, help="Cookies value to use in the request."
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--http",
+        action="store_true",
+        help="Fetch pages over plain HTTP instead of driving a browser.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=8,
+        help="Most concurrent requests in HTTP mode; the crawler adapts below this.",
+    )
+    parser.add_argument(
+        "--max-rps",
+        type=float,
+        default=10.0,
+        help="Most requests per second in HTTP mode (0 for no cap).",
+    )
+    parser.add_argument(
+        "--target-latency",
+        type=float,
+        default=2.0,
+        help="Response time in seconds above which HTTP mode backs off.",
+    )
+    parser.add_argument(
+        "-b",
+        "--browsers",
+        type=int,
+        default=1,
+        help="Number of headless browsers to crawl with in parallel.",
+    )
+    parser.add_argument(
+        "--headless",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Run a single browser without a window (--no-headless to watch it).",
+    )
+    parser.add_argument(
+        "-p",
+        "--pages",
+        type=int,
+        help="Number of pager pages to crawl (default: read from the pager).",
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="Only rewrite tables whose content changed since the last crawl.",
+    )
+    parser.add_argument(
+        "-r",
+        "--resume",
+        action="store_true",
+        help="Skip pages the journal of the previous run marks as done.",
+    )
+    parser.add_argument(
+        "-s",
+        "--stream",
+        action="store_true",
+        help="Write alias rows straight to the combined CSV as pages arrive.",
+    )
+    parser.add_argument(
+        "--combined-csv",
+        type=Path,
+        default=combined_csv_path,
+        help="Combined alias CSV written by --stream (default: data/aliases/combined.csv).",
+    )
+    parser.add_argument(
+        "--keep-html",
+        action="store_true",
+        help="With --stream, also save each page's table HTML for debugging.",
+    )
+    parser.add_argument(
+        "--base-url", type=str, default=BASE_URL, help="Site to crawl in HTTP mode."
+    )
+    metrics.add_arguments(parser)
+    return parser
+
 
+def run(args):
+    """Crawl the alias pager with options parsed by build_parser()."""
     cookie_value = args.cookies or os.getenv("RCOT_COOKIE_VALUE")
     if not cookie_value:
         logging.info("No cookies found, trying to retrieve from browser...")
@@ -107,19 +383,43 @@ def main():
             "sameSite": "Strict",
         }
 
-    driver = setup_driver()
-    driver.get("https://www.rcot.co.uk")
-    driver.add_cookie(cookies)
-    logging.info("Cookies provided, proceeding with the program.")
+    pages = range(args.pages) if args.pages else None
+    context = CrawlContext(
+        CrawlManifest(new_directory_path / MANIFEST_NAME),
+        CrawlJournal(new_directory_path / JOURNAL_NAME, resume=args.resume),
+        args.incremental,
+        AliasStream(str(args.combined_csv), append=args.resume) if args.stream else None,
+        keep_html=args.keep_html or not args.stream,
+    )
 
     try:
-        for i in range(303):
-            get_table(driver, i)
+        if args.http:
+            limiter = AdaptiveLimiter(
+                args.workers, max_rps=args.max_rps, target_latency=args.target_latency
+            )
+            crawl_http(cookies, limiter, context, pages, args.base_url)
+        elif args.browsers > 1:
+            crawl_browser_pool(cookies, args.browsers, context, pages)
+        else:
+            crawl_browser(cookies, context, pages, args.headless)
     except KeyboardInterrupt:
-        logging.info("User interruption detected, closing the driver.")
+        logging.info("User interruption detected, stopping the crawl. Rerun with --resume to continue.")
     finally:
-        driver.quit()
-        logging.info("Driver closed.")
+        context.manifest.save()
+        context.journal.close()
+        if context.stream:
+            context.stream.close()
+            logging.info(f"Streamed {context.stream.rows} aliases to {args.combined_csv}")
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.stream and args.incremental:
+        # Unchanged pages are not re-read, so their rows would be missing from the stream
+        parser.error("--stream cannot be combined with --incremental.")
+    metrics.configure(args)
+    run(args)
 
 
 if __name__ == "__main__":
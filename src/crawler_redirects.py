@@ -2,17 +2,19 @@ import os
 import re
 import logging
 import sys
-import time
 from pathlib import Path
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC, ui as ui
-from webdriver_manager.chrome import ChromeDriverManager
 import browsercookie
 from keyring.errors import KeyringLocked
 import argparse
 
+import browser
+import downloads
+import http_fetch
+import metrics
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -27,9 +29,10 @@ redirects_directory_path = base_path / "data" / "redirects"
 redirects_directory_path.mkdir(parents=True, exist_ok=True)
 
 redirects_csv_path = redirects_directory_path / 'redirects.csv'
-if os.path.exists(redirects_csv_path):
-    os.remove(redirects_csv_path)
-    logging.info("Existing redirects.csv file deleted.")
+
+BASE_URL = "https://www.rcot.co.uk"
+EXPORT_PATH = "/admin/config/search/redirect/export"
+EXPORT_FORM_ID = "path-redirect-import-export-form"
 
 
 # Retrieve cookies using browsercookie or manually
@@ -56,54 +59,115 @@ def get_cookies():
         sys.exit(1)
 
 
-# Configure WebDriver to download the file to the specified directory
-def setup_driver(download_dir):
-    options = webdriver.ChromeOptions()
-    prefs = {
-        "download.default_directory": str(download_dir),
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    }
-    options.add_experimental_option("prefs", prefs)
-
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
-    driver.maximize_window()
-    return driver
-
-
-# Add cookies to the driver to bypass restricted access
-def add_cookies_to_driver(driver, cookies):
-    driver.get("https://www.rcot.co.uk")
-    driver.add_cookie(cookies)
-    logging.info("Cookies provided, proceeding with the program.")
-
-
 # Download the redirects.csv file by submitting the form
-def download_redirects(driver):
-    try:
-        driver.get("https://www.rcot.co.uk/admin/config/search/redirect/export")
-        ui.WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.ID, "path-redirect-import-export-form"))
-        )
-
-        submit_button = driver.find_element(By.ID, "edit-submit")
-        submit_button.click()
+def download_redirects(driver, base_url=BASE_URL):
+    driver.get(base_url + EXPORT_PATH)
+    ui.WebDriverWait(driver, 5).until(
+        EC.presence_of_element_located((By.ID, EXPORT_FORM_ID))
+    )
 
-        logging.info("Export form submitted, downloading redirects.csv.")
-    except Exception as e:
-        logging.error(f"Failed to download redirects.csv: {str(e)}")
+    submit_button = driver.find_element(By.ID, "edit-submit")
+    submit_button.click()
+
+    logging.info("Export form submitted, downloading redirects.csv.")
+
+
+def export_form_fields(html):
+    """The fields the export form would submit, including its token and build id."""
+    form = BeautifulSoup(html, "html.parser").find("form", id=EXPORT_FORM_ID)
+    if form is None:
+        raise ValueError("Export form not found; is the session cookie still valid?")
+
+    fields = {}
+    for field in form.find_all(["input", "select", "textarea"]):
+        name = field.get("name")
+        kind = field.get("type", "").lower()
+        if not name or kind in ("submit", "button", "image", "reset", "file"):
+            continue
+        if kind in ("checkbox", "radio") and not field.has_attr("checked"):
+            continue
+        if field.name == "select":
+            option = field.find("option", selected=True) or field.find("option")
+            fields[name] = option.get("value", option.text) if option else ""
+        elif field.name == "textarea":
+            fields[name] = field.text
+        else:
+            fields[name] = field.get("value", "on" if kind in ("checkbox", "radio") else "")
+
+    submit = form.find("input", id="edit-submit")
+    if submit is not None and submit.get("name"):
+        fields[submit["name"]] = submit.get("value", "")
+    return fields
+
+
+def export_http(cookies, base_url=BASE_URL, output=redirects_csv_path):
+    """Submit the export form without a browser and stream the CSV into `output`."""
+    session = http_fetch.make_session(cookies, pool_size=1)
+    url = base_url + EXPORT_PATH
+    fields = export_form_fields(http_fetch.fetch_page(session, url))
+
+    response = session.post(url, data=fields, stream=True, timeout=http_fetch.DEFAULT_TIMEOUT)
+    response.raise_for_status()
+    if "text/html" in response.headers.get("Content-Type", ""):
+        # Drupal shows the form again, with an error, instead of sending the file
+        raise ValueError("The export returned a page instead of a CSV file.")
+    logging.info("Export form submitted, streaming redirects.csv.")
+    downloads.stream_download(response, output)
+
+
+def export_browser(cookies, headless=True, base_url=BASE_URL, timeout=300, output=redirects_csv_path):
+    """Download the export with a browser, then move it into `output` once it has finished."""
+    # The browser downloads next to the output, so the only file in there is the export
+    download_directory = Path(output).parent / ".download"
+    downloads.clear_directory(download_directory)
+    driver = browser.setup_driver(headless, download_directory, shared_profile=True)
+    try:
+        browser.open_site(driver, base_url, cookies)
+        logging.info("Cookies provided, proceeding with the program.")
+        download_redirects(driver, base_url)
+        # Chrome sometimes leaves finished downloads under a .com.google.Chrome.* name,
+        # so completion is judged by size, not by name
+        downloaded = downloads.wait_for_download(download_directory, timeout=timeout)
+        downloads.move_into_place(downloaded, output)
+    finally:
+        driver.quit()
+        logging.info("Driver closed.")
 
 
-# Main function to initialize the driver and handle cookies
-def main():
+def build_parser():
     parser = argparse.ArgumentParser(description="Process cookies for site.")
     parser.add_argument(
         "-c", "--cookies", type=str, help="Cookies value to use in the request."
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--headless",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Run the browser without a window (--no-headless to watch it).",
+    )
+    parser.add_argument(
+        "--http",
+        action="store_true",
+        help="Submit the export form over plain HTTP instead of with a browser.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=300,
+        help="Seconds to wait for the browser download to finish.",
+    )
+    parser.add_argument(
+        "--base-url", type=str, default=BASE_URL, help="Site to export the redirects from."
+    )
+    parser.add_argument(
+        "-o", "--output", type=Path, default=redirects_csv_path, help="Where to save the export."
+    )
+    metrics.add_arguments(parser)
+    return parser
+
 
+# Initialize the driver, handle cookies and download the export
+def run(args):
     # Get cookies manually or retrieve from the browser
     cookie_value = args.cookies or os.getenv("RCOT_COOKIE_VALUE")
     if not cookie_value:
@@ -123,29 +187,23 @@ def main():
             "sameSite": "Strict",
         }
 
-    # Initialize the driver with a specified download directory
-    driver = setup_driver(redirects_directory_path)
-    add_cookies_to_driver(driver, cookies)
-
+    # The previous export stays in place until a complete new one replaces it
     try:
-        download_redirects(driver)
-        # Wait for the download to complete
-        time.sleep(5)  # Adjust the timing as necessary for your download speed
-
-        # Check for downloaded file and rename it
-        latest_file = max(redirects_directory_path.glob('*'), key=os.path.getctime)
-        if latest_file.name.startswith('.com.google.Chrome'):
-            new_filename = redirects_directory_path / 'redirects.csv'
-            latest_file.rename(new_filename)
-            logging.info(f"File renamed to {new_filename}")
+        if args.http:
+            export_http(cookies, args.base_url, args.output)
         else:
-            logging.error(f"No expected file to rename was found. Latest file: {latest_file}")
-
+            export_browser(cookies, args.headless, args.base_url, args.timeout, args.output)
     except KeyboardInterrupt:
-        logging.info("User interruption detected, closing the driver.")
-    finally:
-        driver.quit()
-        logging.info("Driver closed.")
+        logging.info("User interruption detected, export cancelled.")
+    except Exception as e:
+        logging.error(f"Failed to download redirects.csv: {str(e)}")
+        raise
+
+
+def main():
+    args = build_parser().parse_args()
+    metrics.configure(args)
+    run(args)
 
 
 if __name__ == "__main__":
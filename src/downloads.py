@@ -0,0 +1,63 @@
+import logging
+import os
+import time
+from pathlib import Path
+
+# Chrome (and other browsers) write to these while a download is in progress
+PARTIAL_SUFFIXES = (".crdownload", ".part", ".tmp", ".download")
+
+
+def clear_directory(directory):
+    """Create `directory`, or remove any files left in it by an earlier run."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in directory.iterdir():
+        if path.is_file():
+            path.unlink()
+
+
+def wait_for_download(directory, timeout=300.0, settle=1.0, poll=0.2):
+    """Wait for a browser download into an otherwise empty `directory` to finish.
+
+    The download is done once no partial file is left and the downloaded file has kept
+    the same size for `settle` seconds; an empty export is a finished download too.
+    Returns its path, or raises TimeoutError.
+    """
+    directory = Path(directory)
+    deadline = time.monotonic() + timeout
+    last_state = None
+    stable_since = None
+    while time.monotonic() < deadline:
+        files = [path for path in directory.iterdir() if path.is_file()]
+        partial = [path for path in files if path.name.endswith(PARTIAL_SUFFIXES)]
+        if files and not partial:
+            path = max(files, key=os.path.getmtime)
+            state = (path, path.stat().st_size)
+            if state != last_state:
+                last_state, stable_since = state, time.monotonic()
+            elif time.monotonic() - stable_since >= settle:
+                return path
+        else:
+            last_state = None
+        time.sleep(poll)
+    raise TimeoutError(f"No finished download in {directory} after {timeout:g}s")
+
+
+def move_into_place(path, destination):
+    """Atomically replace `destination` with `path` (both on the same filesystem)."""
+    os.replace(path, destination)
+    logging.info(f"Saved {destination} ({Path(destination).stat().st_size} bytes)")
+
+
+def stream_download(response, destination, chunk_size=1 << 16):
+    """Stream an HTTP response body to `destination` in chunks, replacing it only once complete."""
+    destination = Path(destination)
+    partial = destination.with_name(destination.name + ".part")
+    try:
+        with open(partial, "wb") as file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                file.write(chunk)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    move_into_place(partial, destination)
@@ -0,0 +1,167 @@
+import itertools
+import logging
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import external_sort
+import url_keys
+
+SUMMARY_COLUMNS = ["Key", "Group size", "Groups", "Rows"]
+
+
+def group_codes(column, canonical=False):
+    """Group id of every row (one hash pass) and the distinct values, NaN included as a value.
+
+    With `canonical`, URLs are grouped (and later sorted) by their url_keys canonical key.
+    """
+    if not canonical:
+        return pd.factorize(column, use_na_sentinel=False)
+    (codes,), keys = url_keys.url_key_codes(column)
+    # Missing values form a group of their own, sorted last
+    return np.where(codes >= 0, codes, len(keys)), np.append(keys, np.nan)
+
+
+def lexical_ranks(codes, uniques):
+    """Rank of each row's value in sort_values order (NaN last), for sorting by integer."""
+    order = pd.Series(uniques).sort_values(na_position="last", kind="stable").index.to_numpy()
+    ranks = np.empty(len(uniques), dtype=np.int64)
+    ranks[order] = np.arange(len(uniques))
+    return ranks[codes]
+
+
+def summarize(key, sizes):
+    """Rows of the summary table for one key: how many groups of each size share a value."""
+    sizes = sizes[sizes > 1]
+    group_sizes, groups = np.unique(sizes, return_counts=True)
+    return [[key, int(size), int(count), int(size * count)] for size, count in zip(group_sizes, groups)]
+
+
+def find_duplicates(df, keys, drop_identical=True, url_columns=()):
+    """Rows that share their value in any of `keys` with another row, in their original order.
+
+    Each key column is hashed once, and `url_columns` are compared by canonical URL key.
+    With `drop_identical`, rows identical to an earlier duplicate in every column are
+    reported once. Returns (duplicates, {key: group ids of the duplicate rows, distinct
+    values}, summary rows).
+    """
+    is_duplicate = np.zeros(len(df), dtype=bool)
+    groups = {}
+    summary = []
+    for key in keys:
+        codes, uniques = group_codes(df[key], key in url_columns)
+        sizes = np.bincount(codes, minlength=len(uniques))
+        is_duplicate |= sizes[codes] > 1
+        groups[key] = (codes, uniques)
+        summary += summarize(key, sizes)
+
+    duplicates = df[is_duplicate]
+    groups = {key: (codes[is_duplicate], uniques) for key, (codes, uniques) in groups.items()}
+    if drop_identical:
+        unique_rows = ~duplicates.duplicated().to_numpy()
+        duplicates = duplicates[unique_rows]
+        groups = {key: (codes[unique_rows], uniques) for key, (codes, uniques) in groups.items()}
+    return duplicates, groups, summary
+
+
+def save_duplicates(
+    df, keys, path_template, sort_keys=None, summary_path=None, drop_identical=True, url_columns=()
+):
+    """Find rows duplicated on any of `keys` and save them sorted by each of `sort_keys`.
+
+    `path_template` is formatted with the sort key (spaces as underscores). Each output
+    is one stable argsort of integer ranks over the duplicate rows, reusing the group ids
+    from detection where the sort key is also a duplicate key. Columns in `url_columns`
+    are grouped and sorted by canonical URL key. Returns the duplicates sorted by the
+    last sort key.
+    """
+    duplicates, groups, summary = find_duplicates(df, keys, drop_identical, url_columns)
+    sorted_duplicates = duplicates
+    for sort_key in sort_keys or keys:
+        codes, uniques = groups.get(sort_key) or group_codes(duplicates[sort_key], sort_key in url_columns)
+        order = np.argsort(lexical_ranks(codes, uniques), kind="stable")
+        sorted_duplicates = duplicates.iloc[order]
+        sorted_duplicates.to_csv(path_template.format(key=sort_key.replace(" ", "_")), index=False)
+
+    save_summary(summary, keys, summary_path, len(duplicates), len(df))
+    return sorted_duplicates
+
+
+def save_summary(summary, keys, summary_path, duplicate_rows, total_rows):
+    summary_df = pd.DataFrame(summary, columns=SUMMARY_COLUMNS)
+    if summary_path:
+        summary_df.to_csv(summary_path, index=False)
+    for key in keys:
+        key_summary = summary_df[summary_df["Key"] == key]
+        largest = key_summary["Group size"].max() if len(key_summary) else 0
+        logging.info(
+            f"Duplicate {key}: {key_summary['Groups'].sum()} values shared by "
+            f"{key_summary['Rows'].sum()} rows (largest group {largest})"
+        )
+    logging.info(f"{duplicate_rows} duplicate rows of {total_rows}.")
+
+
+def save_duplicates_external(
+    table_path, columns, keys, path_template, run_rows, directory, sort_keys=None, summary_path=None,
+    url_columns=(),
+):
+    """save_duplicates for a table too big for memory, with the same output files.
+
+    `table_path` is a spilled run (external_sort.write_run) of (row number, *fields)
+    rows in input order with `columns` as fields. Groups are found by streaming the rows
+    in key order out of an external sort, keeping one flag byte per row in memory.
+    """
+    def table_rows():
+        return external_sort.read_run(table_path)
+
+    row_count = 0
+    last_row = -1
+    for row in table_rows():
+        row_count += 1
+        last_row = row[0]
+    # One flag per input row number: set while the row is a duplicate
+    flags = bytearray(last_row + 1)
+
+    summary = []
+    for key in keys:
+        position = columns.index(key) + 1
+        field_key = external_sort.canonical_last if key in url_columns else external_sort.missing_last
+        rows = external_sort.external_sort(table_rows(), external_sort.row_key([position], field_key), run_rows, directory)
+        sizes = Counter()
+        for _, group in itertools.groupby(rows, key=lambda row: field_key(row[position])):
+            first = next(group)[0]
+            size = 1
+            for row in group:
+                if size == 1:
+                    flags[first] = 1
+                flags[row[0]] = 1
+                size += 1
+            sizes[size] += 1
+        summary += [[key, size, count, size * count] for size, count in sorted(sizes.items()) if size > 1]
+
+    # Rows identical to an earlier duplicate row are reported once, as drop_duplicates does
+    every_field = external_sort.row_key(range(1, len(columns) + 1), lambda value: value)
+    previous = None
+    for row in external_sort.external_sort(
+        (row for row in table_rows() if flags[row[0]]), every_field, run_rows, directory
+    ):
+        if previous is not None and row[1:] == previous:
+            flags[row[0]] = 0
+        previous = row[1:]
+
+    duplicate_rows = 0
+    for sort_key in sort_keys or keys:
+        position = columns.index(sort_key) + 1
+        field_key = external_sort.canonical_last if sort_key in url_columns else external_sort.missing_last
+        rows = external_sort.external_sort(
+            (row for row in table_rows() if flags[row[0]]),
+            external_sort.row_key([position], field_key),
+            run_rows,
+            directory,
+        )
+        duplicate_rows = external_sort.write_rows(
+            rows, path_template.format(key=sort_key.replace(" ", "_")), columns
+        )
+
+    save_summary(summary, keys, summary_path, duplicate_rows, row_count)
@@ -0,0 +1,382 @@
+import argparse
+import dbm
+import logging
+import os
+import re
+import struct
+import sys
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import storage
+from url_keys import canonical_url
+
+# The final table of the latest process_all run; all_sorted.csv accumulates every run
+INPUT_CSV = "data/filtered_exclusions_applied.csv"
+COLUMNS = ["From URL", "To URL", "Alias"]
+OUTPUT_DIR = os.path.join("data", "redirect_maps")
+FORMATS = ["nginx", "apache", "dbm", "cdb"]
+# Characters left as they are in targets; "$" is escaped as nginx would read it as a variable
+SAFE_CHARS = "/:?=&%#~+,;@!*'()[]"
+# Keys checked before all of them when trying a hash size: if these overflow a bucket, all do
+NGINX_SAMPLE = 4096
+CDB_MAX_SIZE = 0xFFFFFFFF
+
+
+def redirect_key(from_url):
+    """The lookup key of a redirect source: its canonical path (and query string) with a leading slash."""
+    return "/" + canonical_url(from_url)
+
+
+def redirect_target(to_url, alias):
+    """Where a redirect should send visitors: the alias of its target when it has one, URL-escaped."""
+    target = alias if pd.notna(alias) and alias else to_url
+    if not re.match(r"[a-z][a-z0-9+.-]*://", target, re.IGNORECASE):
+        target = "/" + re.sub(r"^(?:internal:|entity:|base:)", "", target).lstrip("/")
+    return quote(target, safe=SAFE_CHARS)
+
+
+def build_entries(df):
+    """(key, target) pairs for every redirect, and the rows whose keys have more than one target.
+
+    Rows repeating a key with the same target collapse to one. Rows redirecting to
+    themselves would loop at the edge and are dropped.
+    """
+    df = df[COLUMNS].astype(object).fillna("")
+    table = pd.DataFrame({
+        "Key": [redirect_key(url) for url in df["From URL"]],
+        "Target": [redirect_target(to_url, alias) for to_url, alias in zip(df["To URL"], df["Alias"])],
+        "From URL": df["From URL"],
+    })
+    loops = table["Target"].map(lambda target: "/" + canonical_url(target)) == table["Key"]
+    if loops.any():
+        logging.warning(f"Dropping {int(loops.sum())} redirects to themselves.")
+    table = table[~loops].drop_duplicates(["Key", "Target"])
+    repeated = table["Key"].duplicated(keep=False)
+    conflicts = table[repeated].sort_values(["Key", "Target"], kind="stable")
+    entries = table.drop_duplicates("Key").sort_values("Key", kind="stable")
+    return list(zip(entries["Key"], entries["Target"])), conflicts
+
+
+def load_redirects(path=INPUT_CSV):
+    """The final redirect table, saved by process_all without a header (or with one, like all_sorted.csv)."""
+    df = storage.load_intermediate(path, header=None, names=COLUMNS, dtype=str, keep_default_na=False)
+    if len(df) and [str(value) for value in df.iloc[0]] == COLUMNS:
+        df = df.iloc[1:]
+    return df
+
+
+def write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def nginx_hashes(keys, chunk_size=100000):
+    """nginx's ngx_hash_key_lc of every key (64-bit), computed a column of characters at a time."""
+    hashes = []
+    for start in range(0, len(keys), chunk_size):
+        encoded = [key.encode("utf-8").lower() for key in keys[start:start + chunk_size]]
+        width = max(len(key) for key in encoded)
+        chars = np.frombuffer(b"".join(key.ljust(width, b"\0") for key in encoded), dtype=np.uint8)
+        chars = chars.reshape(len(encoded), width).astype(np.uint64)
+        lengths = np.array([len(key) for key in encoded])
+        chunk = np.zeros(len(encoded), dtype=np.uint64)
+        for column in range(width):
+            # uint64 arithmetic wraps around like nginx's ngx_uint_t
+            chunk = np.where(column < lengths, chunk * np.uint64(31) + chars[:, column], chunk)
+        hashes.append(chunk)
+    return np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+
+
+def nginx_element_sizes(keys):
+    """Bytes each key takes in an nginx hash bucket (NGX_HASH_ELT_SIZE on 64-bit)."""
+    lengths = np.array([len(key.encode("utf-8")) for key in keys], dtype=np.int64)
+    return 8 + (lengths + 2 + 7) // 8 * 8
+
+
+def nginx_fits(hashes, sizes, bucket_size, size):
+    """Whether every bucket of an nginx hash with `size` buckets fits in `bucket_size` bytes."""
+    for part in (slice(0, NGINX_SAMPLE), slice(None)):
+        buckets = (hashes[part] % np.uint64(size)).astype(np.int64)
+        if np.bincount(buckets, weights=sizes[part]).max() > bucket_size - 8:
+            return False
+    return True
+
+
+def nginx_start(count, bucket_size, max_size):
+    """The first number of buckets ngx_hash_init tries."""
+    start = max(count // ((bucket_size - 8) // 16), 1)
+    if max_size > 10000 and count and max_size // count < 100:
+        start = max_size - 1000
+    return start
+
+
+def nginx_finds(hashes, sizes, bucket_size, max_size):
+    """Whether nginx's search for a number of buckets succeeds with these settings."""
+    start = nginx_start(len(hashes), bucket_size, max_size)
+    return any(nginx_fits(hashes, sizes, bucket_size, size) for size in range(start, max_size + 1))
+
+
+def nginx_hash_settings(key_sets):
+    """The smallest map_hash_bucket_size, and the map_hash_max_size for it, that fit every map.
+
+    Replays ngx_hash_init: bucket sizes are multiples of the 64-byte cache line, and
+    for each, growing values of map_hash_max_size (up to four buckets per key) are
+    tried until the numbers of buckets nginx would try include one where no bucket
+    overflows for every map.
+    """
+    maps = [(nginx_hashes(keys), nginx_element_sizes(keys)) for keys in key_sets if keys]
+    if not maps:
+        return 64, 512
+    largest = max(int(sizes.max()) for _, sizes in maps)
+    most_keys = max(len(hashes) for hashes, _ in maps)
+    bucket_size = max((largest + 8 + 63) // 64 * 64, 64)
+    while bucket_size <= 65536 - 64:
+        max_size = max(nginx_start(most_keys, bucket_size, 0), 512)
+        while max_size <= max(4 * most_keys, 2048):
+            if all(nginx_finds(hashes, sizes, bucket_size, max_size) for hashes, sizes in maps):
+                return bucket_size, max_size
+            max_size = max_size * 3 // 2
+        bucket_size += 64
+    raise ValueError("No nginx hash settings fit these keys.")
+
+
+def nginx_string(value):
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+@metrics.timed("export_maps.write_nginx")
+def write_nginx(entries, path):
+    """Write an nginx include of the redirect maps and the hash sizes they need.
+
+    $redirect_target is looked up by path, and $redirect_query_target by path and query
+    string for the redirects whose source has one.
+    """
+    paths = [(key, target) for key, target in entries if "?" not in key]
+    queries = [(key, target) for key, target in entries if "?" in key]
+    bucket_size, max_size = nginx_hash_settings([[key for key, _ in paths], [key for key, _ in queries]])
+    lines = [
+        f"# Generated by export_maps.py: {len(entries)} redirects. Include in the http block.",
+        f"map_hash_bucket_size {bucket_size};",
+        f"map_hash_max_size {max_size};",
+        "",
+    ]
+    maps = [("$uri", "$redirect_target", paths), ('"$uri?$args"', "$redirect_query_target", queries)]
+    for source, variable, rows in maps:
+        if not rows:
+            continue
+        lines.append(f"map {source} {variable} {{")
+        lines += [f"    {nginx_string(key)} {nginx_string(target)};" for key, target in rows]
+        lines += ["}", ""]
+    write_atomic(path, "\n".join(lines).encode("utf-8"))
+    logging.info(f"nginx map saved to {path} (map_hash_bucket_size {bucket_size}, map_hash_max_size {max_size})")
+
+
+def rewrite_map_entries(entries):
+    """The entries a RewriteMap can hold; keys and targets are separated by spaces, so keys can have none."""
+    usable = [(key, target) for key, target in entries if not re.search(r"\s", key)]
+    if len(usable) < len(entries):
+        logging.warning(f"Leaving {len(entries) - len(usable)} keys containing spaces out of the RewriteMap.")
+    return usable
+
+
+@metrics.timed("export_maps.write_apache")
+def write_apache(entries, path):
+    lines = [
+        f"# Generated by export_maps.py: {len(entries)} redirects.",
+        "# Keys are lowercase and RewriteMap lookups are case-sensitive: look them up through",
+        "# ${lc:...}, as redirects.conf does.",
+    ]
+    lines += [f"{key} {target}" for key, target in entries]
+    write_atomic(path, ("\n".join(lines) + "\n").encode("utf-8"))
+    logging.info(f"Apache RewriteMap (txt) saved to {path}")
+
+
+@metrics.timed("export_maps.write_dbm")
+def write_dbm(entries, path):
+    """Write a RewriteMap dbm with the best dbm library Python has; return Apache's name for it.
+
+    Apache cannot read Python's fallback dbm.dumb, so without gdbm or ndbm nothing is
+    written and None is returned; convert the txt map with httxt2dbm instead.
+    """
+    for module, apache_type in (("dbm.gnu", "gdbm"), ("dbm.ndbm", "ndbm")):
+        try:
+            library = __import__(module, fromlist=["open"])
+        except ImportError:
+            continue
+        # Write to a new file and swap it in, so Apache never reads a half-written map
+        tmp_path = f"{path}.tmp"
+        with library.open(tmp_path, "n") as db:
+            for key, target in entries:
+                db[key.encode("utf-8")] = target.encode("utf-8")
+        for suffix in ("", ".db", ".dir", ".pag"):
+            if os.path.exists(tmp_path + suffix):
+                os.replace(tmp_path + suffix, path + suffix)
+        logging.info(f"Apache RewriteMap ({apache_type}) saved to {path} with {dbm.whichdb(path)}")
+        return apache_type
+    logging.warning(
+        f"Neither dbm.gnu nor dbm.ndbm is available, so no dbm map was written; "
+        f"run: httxt2dbm -i {os.path.splitext(path)[0]}.txt -o {path}"
+    )
+    return None
+
+
+def write_apache_rules(path, map_type, map_path):
+    """Write an Apache include that redirects with the map, looking requests up by their key.
+
+    Keys are lowercase with no trailing slash, so the request path is stripped of
+    trailing slashes and lowercased with int:tolower before the lookup.
+    """
+    lines = [
+        "# Generated by export_maps.py. Include in the server or virtual host config.",
+        "RewriteEngine On",
+        "RewriteMap lc int:tolower",
+        f'RewriteMap redirects "{map_type}:{os.path.abspath(map_path)}"',
+        "RewriteCond %{REQUEST_URI} ^(/.*?)/*$",
+        "RewriteCond ${redirects:${lc:%1}} (.+)",
+        "RewriteRule ^ %1 [R=301,L]",
+    ]
+    write_atomic(path, ("\n".join(lines) + "\n").encode("utf-8"))
+    logging.info(f"Apache rules saved to {path}")
+
+
+def cdb_hash(key):
+    """djb's cdb hash of a byte string."""
+    h = 5381
+    for byte in key:
+        h = (((h << 5) + h) & 0xFFFFFFFF) ^ byte
+    return h
+
+
+@metrics.timed("export_maps.write_cdb")
+def write_cdb(entries, path):
+    """Write a constant database (djb's cdb format): any key is found in at most two reads.
+
+    The file is 256 (position, slots) pointers, then the records, then 256 open-addressed
+    hash tables of (hash, record position) with twice as many slots as keys.
+    """
+    tables = [[] for _ in range(256)]
+    records = []
+    position = 256 * 8
+    for key, target in entries:
+        key, target = key.encode("utf-8"), target.encode("utf-8")
+        h = cdb_hash(key)
+        tables[h & 255].append((h, position))
+        records.append(struct.pack("<II", len(key), len(target)) + key + target)
+        position += 8 + len(key) + len(target)
+
+    header = []
+    slot_tables = []
+    for table in tables:
+        slots = [(0, 0)] * (2 * len(table))
+        for h, record in table:
+            slot = (h >> 8) % len(slots)
+            # Records start after the header, so position 0 marks an empty slot
+            while slots[slot][1]:
+                slot = (slot + 1) % len(slots)
+            slots[slot] = (h, record)
+        header.append(struct.pack("<II", position, len(slots)))
+        slot_tables.append(b"".join(struct.pack("<II", *entry) for entry in slots))
+        position += 8 * len(slots)
+    if position > CDB_MAX_SIZE:
+        raise ValueError(f"{len(entries)} redirects do not fit in a 4 GB cdb file.")
+    write_atomic(path, b"".join(header) + b"".join(records) + b"".join(slot_tables))
+    logging.info(f"cdb saved to {path}")
+
+
+def cdb_get(path, key):
+    """Look a key up in a cdb file written by write_cdb; return its target or None."""
+    key = key.encode("utf-8")
+    h = cdb_hash(key)
+    with open(path, "rb") as file:
+        file.seek((h & 255) * 8)
+        table, slots = struct.unpack("<II", file.read(8))
+        if not slots:
+            return None
+        slot = (h >> 8) % slots
+        for _ in range(slots):
+            file.seek(table + slot * 8)
+            slot_hash, record = struct.unpack("<II", file.read(8))
+            if not record:
+                return None
+            if slot_hash == h:
+                file.seek(record)
+                key_length, value_length = struct.unpack("<II", file.read(8))
+                if file.read(key_length) == key:
+                    return file.read(value_length).decode("utf-8")
+            slot = (slot + 1) % slots
+    return None
+
+
+def export_maps(df, output_dir=OUTPUT_DIR, formats=FORMATS, keep_first=False):
+    """Check the redirects for conflicting keys, then write each map format into `output_dir`.
+
+    Keys with more than one target are saved to conflicts.csv; nothing else is written
+    unless `keep_first`, which keeps the first target in `df` order.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    entries, conflicts = build_entries(df)
+    conflicts_path = os.path.join(output_dir, "conflicts.csv")
+    if len(conflicts):
+        conflicts.to_csv(conflicts_path, index=False)
+        message = f"{conflicts['Key'].nunique()} keys have more than one target, see {conflicts_path}"
+        if not keep_first:
+            raise ValueError(message)
+        logging.warning(f"{message}; keeping the first target of each.")
+    elif os.path.exists(conflicts_path):
+        os.remove(conflicts_path)
+
+    logging.info(f"{len(entries)} redirects to export.")
+    if "nginx" in formats:
+        write_nginx(entries, os.path.join(output_dir, "redirects.map"))
+    rewrite_entries = rewrite_map_entries(entries) if {"apache", "dbm"} & set(formats) else []
+    rewrite_map = None
+    if "apache" in formats:
+        write_apache(rewrite_entries, os.path.join(output_dir, "redirects.txt"))
+        rewrite_map = ("txt", os.path.join(output_dir, "redirects.txt"))
+    if "dbm" in formats:
+        dbm_type = write_dbm(rewrite_entries, os.path.join(output_dir, "redirects.dbm"))
+        if dbm_type:
+            rewrite_map = (f"dbm={dbm_type}", os.path.join(output_dir, "redirects.dbm"))
+    if rewrite_map:
+        write_apache_rules(os.path.join(output_dir, "redirects.conf"), *rewrite_map)
+    if "cdb" in formats:
+        write_cdb(entries, os.path.join(output_dir, "redirects.cdb"))
+    return entries
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Export the final redirects as nginx, Apache and cdb lookup maps.")
+    parser.add_argument("-i", "--input", default=INPUT_CSV, help="Final redirect table (default %(default)s).")
+    parser.add_argument("-o", "--output-dir", default=OUTPUT_DIR, help="Where to write the maps (default %(default)s).")
+    parser.add_argument(
+        "--formats", nargs="+", choices=FORMATS, default=FORMATS, help="Maps to write (default: all)."
+    )
+    parser.add_argument(
+        "--keep-first", action="store_true", help="Export despite conflicting keys, keeping the first target."
+    )
+    parser.add_argument("--lookup", metavar="PATH", help="Look a path up in the exported cdb instead.")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+
+    if args.lookup:
+        print(cdb_get(os.path.join(args.output_dir, "redirects.cdb"), redirect_key(args.lookup)))
+        return
+
+    df = load_redirects(args.input)
+    try:
+        export_maps(df, args.output_dir, args.formats, args.keep_first)
+    except ValueError as e:
+        logging.error(f"Nothing exported: {str(e)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
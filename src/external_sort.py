@@ -0,0 +1,142 @@
+import csv
+import functools
+import heapq
+import itertools
+import logging
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+import storage
+from url_keys import canonical_url
+
+# Runs merged at once; more than this are merged in several passes to bound open files
+MAX_FAN_IN = 64
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+
+def missing_last(value):
+    """Sort key for a CSV field that orders like sort_values: by value, missing (empty) last."""
+    return (value == "", value)
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def canonical_last(value):
+    """Sort key for a URL field by its canonical key, missing last, like duplicates.group_codes."""
+    return (1, "") if value == "" else (0, canonical_url(value))
+
+
+def row_key(columns, field_key=missing_last):
+    """Key for rows of (row number, *fields): the given field positions, then the row number.
+
+    Ending on the row number makes every sort stable with respect to the input order.
+    """
+    def key(row):
+        return tuple(field_key(row[column]) for column in columns) + (row[0],)
+
+    return key
+
+
+def rows_per_chunk(csv_path, names, memory_budget_mb):
+    """How many rows of `csv_path` fit in the budget as Python tuples while being sorted."""
+    sample = next(read_chunks(csv_path, names, 1000), pd.DataFrame(columns=names))
+    rows = list(sample.itertuples(index=True, name=None)) or [(0,) + ("",) * len(names)]
+    per_row = sum(sys.getsizeof(row) + sum(sys.getsizeof(field) for field in row) for row in rows) / len(rows)
+    # Room for the sort keys and the list being sorted alongside the rows
+    return max(1000, int(memory_budget_mb * (1 << 20) / (per_row * 3)))
+
+
+def columnar_chunks(path, names, chunksize):
+    """DataFrame chunks of a Parquet or Feather file, one record batch at a time."""
+    import pyarrow.dataset as ds
+
+    fmt = "parquet" if path.endswith(storage.SUFFIXES["parquet"]) else "ipc"
+    for batch in ds.dataset(path, format=fmt).to_batches(batch_size=chunksize):
+        if batch.num_rows:
+            chunk = batch.to_pandas().astype(object)
+            chunk.columns = names
+            yield chunk.where(chunk.notna(), "").astype(str)
+
+
+def read_chunks(csv_path, names, chunksize, header=None):
+    """DataFrame chunks of a table with every field read as a string ('' when missing).
+
+    Like storage.load_intermediate, this reads the most recent of the CSV and its
+    Parquet or Feather copy. `header` only applies to a CSV.
+    """
+    path = storage.intermediate_source(csv_path) or str(csv_path)
+    if path == str(csv_path):
+        chunks = pd.read_csv(path, header=header, names=names, dtype=str, chunksize=chunksize)
+    else:
+        logging.info(f"Reading {path} in chunks.")
+        chunks = columnar_chunks(path, names, chunksize)
+    first_row = 0
+    for chunk in chunks:
+        chunk = chunk.fillna("")
+        chunk.index = pd.RangeIndex(first_row, first_row + len(chunk))
+        first_row += len(chunk)
+        yield chunk
+
+
+def chunk_rows(chunk):
+    """Rows of a chunk as (row number, *fields) tuples."""
+    return chunk.itertuples(index=True, name=None)
+
+
+def write_run(rows, directory):
+    handle, path = tempfile.mkstemp(suffix=".csv", dir=directory)
+    with os.fdopen(handle, "w", newline="") as file:
+        csv.writer(file, lineterminator="\n").writerows(rows)
+    return path
+
+
+def read_run(path):
+    with open(path, newline="") as file:
+        for row in csv.reader(file):
+            yield (int(row[0]), *row[1:])
+
+
+def merge_runs(paths, key, directory):
+    """Merge sorted run files into one sorted stream, in several passes if there are many."""
+    while len(paths) > MAX_FAN_IN:
+        merged = []
+        for start in range(0, len(paths), MAX_FAN_IN):
+            group = paths[start:start + MAX_FAN_IN]
+            merged.append(write_run(heapq.merge(*(read_run(path) for path in group), key=key), directory))
+            for path in group:
+                os.remove(path)
+        paths = merged
+    return heapq.merge(*(read_run(path) for path in paths), key=key)
+
+
+def external_sort(rows, key, run_rows, directory):
+    """Sort an iterable of (row number, *fields) tuples with at most `run_rows` in memory.
+
+    Rows are sorted in runs of `run_rows`, spilled to CSV files in `directory` and merged
+    back with a k-way merge. Returns an iterator over the sorted rows.
+    """
+    rows = iter(rows)
+    paths = []
+    while True:
+        run = list(itertools.islice(rows, run_rows))
+        if not run:
+            break
+        run.sort(key=key)
+        paths.append(write_run(run, directory))
+    logging.debug(f"Sorting {len(paths)} spilled runs")
+    return merge_runs(paths, key, directory)
+
+
+def write_rows(rows, path, columns, mode="w", header=True):
+    """Write (row number, *fields) tuples as a CSV with the given header, dropping the row number."""
+    with open(path, mode, newline="") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        if header:
+            writer.writerow(columns)
+        count = 0
+        for row in rows:
+            writer.writerow(row[1:])
+            count += 1
+    return count
@@ -0,0 +1,201 @@
+import argparse
+import functools
+import logging
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# Rule profiles used by the processing scripts. Rows are dropped when a column matches
+# any of its rules:
+#   prefixes      - the value starts with one of these
+#   characters    - the value contains any of these characters
+#   patterns      - the value contains a match for one of these regexes (name: regex)
+#   short_length  - values up to this length are not subject to the two limits below
+#   max_length    - longer values are dropped from this length + 1 on
+#   max_slashes   - longer values are dropped with more than this many slashes
+REDIRECT_FROM_PREFIXES = [
+    "files/", "events", "news", "occupational-therapy-jobs/", "sites/default/",
+    "publication", "system/files/", "suppliers/", "practice-resources/", "about-us/specialistsections/",
+    "about-us/specialist-sections/", "consultation"
+]
+TO_PREFIXES = ["<front>", "events", "news", "user", "jobs", "taxonomy"]
+
+PROFILES = {
+    # process_redirects.py: the exported redirects on their own
+    "redirects": {
+        "From URL": {"prefixes": REDIRECT_FROM_PREFIXES, "characters": "?"},
+        "To URL": {"prefixes": TO_PREFIXES},
+    },
+    # process_all.py: redirects joined to aliases, filtered down to short, clean paths
+    "all": {
+        "From URL": {
+            "prefixes": REDIRECT_FROM_PREFIXES + ["jobs", "node"],
+            "characters": "?@.;",
+            "patterns": {"dash_zero": r"-0", "trailing_dash": r"-(?!.)"},
+            "short_length": 20,
+            "max_length": 29,
+            "max_slashes": 2,
+        },
+        "To URL": {"prefixes": TO_PREFIXES},
+        "Alias": {"prefixes": ["events/"]},
+    },
+    # process_all_r.py: the looser variant, which keeps about-us/specialist-sections/
+    "all_r": {
+        "From URL": {
+            "prefixes": [p for p in REDIRECT_FROM_PREFIXES if p != "about-us/specialist-sections/"] + ["jobs"],
+            "characters": "?",
+        },
+        "To URL": {"prefixes": TO_PREFIXES},
+    },
+}
+
+
+def anywhere(pattern):
+    """Lookahead for `pattern` anywhere in the value, like str.contains."""
+    return rf"(?=(?s:.)*?(?:{pattern}))"
+
+
+def column_pattern(spec):
+    """Merge one column's rules into a single regex anchored at the start of the value.
+
+    Each rule is a named alternative, so a match's `lastgroup` is the first rule that
+    drops the value and a value no rule matches is kept.
+    """
+    rules = []
+    if spec.get("prefixes"):
+        # Longest first, so the alternation behaves like a prefix trie lookup
+        prefixes = sorted(spec["prefixes"], key=len, reverse=True)
+        rules.append(("prefix", "|".join(re.escape(prefix) for prefix in prefixes)))
+    if spec.get("characters"):
+        rules.append(("characters", anywhere(f"[{re.escape(spec['characters'])}]")))
+    for name, pattern in spec.get("patterns", {}).items():
+        rules.append((name, anywhere(pattern)))
+    if "max_length" in spec:
+        rules.append(("too_long", rf"(?=(?s:.){{{spec['max_length'] + 1}}})"))
+    if "max_slashes" in spec:
+        longer = rf"(?=(?s:.){{{spec.get('short_length', 0) + 1}}})"
+        rules.append(("too_many_slashes", rf"{longer}(?=(?:[^/]*/){{{spec['max_slashes'] + 1}}})"))
+    return r"\A(?:" + "|".join(f"(?P<{name}>{pattern})" for name, pattern in rules) + ")"
+
+
+def compile_rules(rules):
+    return {column: re.compile(column_pattern(spec)) for column, spec in rules.items()}
+
+
+@functools.lru_cache(maxsize=None)
+def load_profile(name):
+    """Compiled rules of a profile in PROFILES, built once per process."""
+    if name not in PROFILES:
+        raise ValueError(f"Unknown rule profile {name!r}, expected one of {', '.join(PROFILES)}")
+    return compile_rules(PROFILES[name])
+
+
+def rule_names(pattern):
+    """The rule name of each capturing group of a column pattern, None for groups inside a rule."""
+    names = np.full(pattern.groups, None, dtype=object)
+    for name, number in pattern.groupindex.items():
+        names[number - 1] = name
+    return names
+
+
+def first_rejections(series, pattern):
+    """Name of the first rule each value breaks, or None, from one str.extract of the column.
+
+    Only the alternative that matched sets its group, and a rule's own group comes before
+    any group inside it, so the first group set names the rule. Categorical columns are
+    evaluated once per category instead of once per row.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        by_category = first_rejections(pd.Series(series.cat.categories), pattern)
+        rejected = pd.Series(by_category, dtype=object).take(series.cat.codes)
+        return rejected.where(series.cat.codes.to_numpy() >= 0, None).tolist()
+
+    if series.dtype == object:
+        series = series.fillna("").astype(str)
+    matched = series.str.extract(pattern.pattern, flags=pattern.flags).notna().to_numpy()
+    first = rule_names(pattern)[matched.argmax(axis=1)]
+    return np.where(matched.any(axis=1), first, None).tolist()
+
+
+def apply_rules(df, compiled):
+    """Drop the rows that break a rule; return (kept rows, {(column, rule): rows dropped}).
+
+    Columns are checked in order, each only on the rows still kept, so every dropped
+    row is counted once, against the first rule it broke.
+    """
+    hits = {}
+    kept = df
+    for column, pattern in compiled.items():
+        rejections = pd.Series(first_rejections(kept[column], pattern), index=kept.index, dtype=object)
+        for rule, count in rejections.value_counts().items():
+            hits[(column, rule)] = int(count)
+        kept = kept[rejections.isna().to_numpy()]
+    return kept, hits
+
+
+def filter_rows(df, profile):
+    """Keep the rows of `df` that pass every rule of the named profile, logging what each rule dropped."""
+    kept, hits = apply_rules(df, load_profile(profile))
+    log_rule_hits(hits, len(df), profile)
+    return kept
+
+
+def log_rule_hits(hits, total, profile=None):
+    if profile:
+        metrics.record_filter(profile, list(load_profile(profile)), hits, total)
+    label = f" ({profile})" if profile else ""
+    logging.info(f"Filter rules{label} dropped {sum(hits.values())} of {total} rows:")
+    for (column, rule), count in sorted(hits.items(), key=lambda item: -item[1]):
+        logging.info(f"  {column:<10} {rule:<18} {count:>9}")
+
+
+def dry_run(df, profiles, output_dir=None):
+    """Report how many rows each profile keeps and where the profiles disagree."""
+    kept = {}
+    for profile in profiles:
+        kept[profile] = filter_rows(df, profile)
+        logging.info(f"Profile {profile} keeps {len(kept[profile])} of {len(df)} rows.")
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            kept[profile].to_csv(os.path.join(output_dir, f"kept_{profile}.csv"), index=False)
+
+    for profile in profiles:
+        for other in profiles:
+            if other != profile:
+                only = kept[profile].index.difference(kept[other].index)
+                logging.info(f"Kept by {profile} but not {other}: {len(only)} rows")
+    return kept
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Dry run: report which rows each filter rule profile keeps, without processing anything."
+    )
+    parser.add_argument(
+        "csv_path", nargs="?", default="data/merged_data_all.csv", help="Table to filter."
+    )
+    parser.add_argument(
+        "-p", "--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES), help="Profiles to compare."
+    )
+    parser.add_argument(
+        "-o", "--output-dir", type=str, help="Also write the rows each profile keeps here."
+    )
+    args = parser.parse_args()
+
+    import storage
+
+    df = storage.load_intermediate(args.csv_path)
+    # The redirect export has no Alias column, so only profiles that fit the table are run
+    profiles = [p for p in args.profiles if set(PROFILES[p]) <= set(df.columns)]
+    for profile in sorted(set(args.profiles) - set(profiles)):
+        logging.warning(f"Skipping profile {profile}: {args.csv_path} lacks its columns.")
+    dry_run(df, profiles, args.output_dir)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import zip_longest
+from urllib.parse import urlsplit
+
+import pandas as pd
+import requests
+
+import http_fetch
+import metrics
+import storage
+from throttle import AdaptiveLimiter, parse_retry_after
+
+BASE_URL = "https://www.rcot.co.uk"
+COOKIE_NAME = "SSESS700bfdb6c4e8be7624120b9c476eb82b"
+TARGET_COLUMNS = ["To URL", "Alias"]
+OUTPUT_CSV = "data/merged_data_health.csv"
+CACHE_PATH = os.path.join("data", "health", "cache.json")
+CACHE_VERSION = 1
+DEFAULT_TTL_HOURS = 7 * 24
+# Answers that say nothing lasting about the target, so they are checked again next run
+TRANSIENT_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+RESULT_COLUMNS = ["status", "final URL", "latency"]
+
+CHECK_SECONDS = metrics.histogram("target_check_seconds", "Time to check a redirect target, by host.")
+CHECKS = metrics.counter("target_checks_total", "Redirect targets checked, by status class.")
+
+
+def target_url(value, base_url=BASE_URL):
+    """The absolute URL a To URL or Alias value points at, or None if it is not a web page."""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    if re.match(r"https?://", value, re.IGNORECASE):
+        return value
+    if re.match(r"(internal|entity|base):", value):
+        value = value.split(":", 1)[1]
+    elif re.match(r"[a-z][a-z0-9+.-]*:", value, re.IGNORECASE):
+        # route:, mailto:, tel: and the like
+        return None
+    return base_url.rstrip("/") + "/" + value.lstrip("/")
+
+
+def session_cookies(value):
+    """The Drupal session cookie for `value`, or None to check pages as an anonymous visitor."""
+    return {"name": COOKIE_NAME, "value": value} if value else None
+
+
+def load_cache(path):
+    """Load the cached results, or return an empty cache if it is missing or unreadable."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as file:
+            cache = json.load(file)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable cache {path}: {str(e)}")
+        return {}
+    return cache.get("results", {}) if cache.get("version") == CACHE_VERSION else {}
+
+
+def save_cache(results, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump({"version": CACHE_VERSION, "results": results}, file, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_fresh(result, ttl_seconds, now):
+    return result.get("status") not in TRANSIENT_STATUSES | {None} and now - result["checked_at"] < ttl_seconds
+
+
+def check_url(session, url, limiter, timeout, method="head"):
+    """Request a URL, following redirects; return its final status, final URL and latency.
+
+    HEAD is tried first unless `method` is "get"; servers that refuse HEAD get a GET
+    whose body is not downloaded.
+    """
+    limiter.acquire()
+    started = time.monotonic()
+    try:
+        response = None
+        if method == "head":
+            response = session.head(url, allow_redirects=True, timeout=timeout)
+        if response is None or response.status_code in (405, 501):
+            response = session.get(url, allow_redirects=True, timeout=timeout, stream=True)
+            response.close()
+    except requests.RequestException as e:
+        latency = time.monotonic() - started
+        limiter.release(latency, http_fetch.is_overload(e))
+        return {"status": None, "final_url": None, "latency": round(latency, 3), "error": str(e),
+                "checked_at": time.time()}
+
+    latency = time.monotonic() - started
+    limiter.release(
+        latency,
+        response.status_code in (429, 503),
+        parse_retry_after(response.headers.get("Retry-After")),
+    )
+    return {"status": response.status_code, "final_url": response.url, "latency": round(latency, 3),
+            "error": None, "checked_at": time.time()}
+
+
+def by_host_round_robin(urls):
+    """Interleave URLs host by host, so workers are not all queued behind one host's limit."""
+    hosts = defaultdict(list)
+    for url in urls:
+        hosts[urlsplit(url).netloc].append(url)
+    return [url for batch in zip_longest(*hosts.values()) for url in batch if url is not None], hosts
+
+
+def check_urls(
+    urls, cookies=None, base_url=BASE_URL, results=None, workers=16, per_host=4, max_rps=5.0, timeout=10.0,
+    method="head",
+):
+    """Check URLs concurrently, with at most `per_host` requests and `max_rps` per second per host.
+
+    Returns {url: result}, adding to `results` as each check finishes so that an
+    interrupted run keeps what it checked. Each host gets its own adaptive limiter (see
+    throttle.py), so a slow or overloaded host backs off without holding up the others.
+    The session cookie is only sent to the host of `base_url`, including on redirects
+    between its pages.
+    """
+    ordered, hosts = by_host_round_robin(urls)
+    limiters = {host: AdaptiveLimiter(per_host, max_rps=max_rps) for host in hosts}
+    session = http_fetch.make_session(None, pool_size=per_host, hosts=max(len(hosts), 1))
+    if cookies:
+        # A cookie in the jar, unlike a Cookie header, is sent again when a redirect is followed
+        session.cookies.set(cookies["name"], cookies["value"], domain=urlsplit(base_url).hostname)
+    results = {} if results is None else results
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {
+            executor.submit(check_url, session, url, limiters[urlsplit(url).netloc], timeout, method): url
+            for url in ordered
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            url = futures[future]
+            result = results[url] = future.result()
+            host = urlsplit(url).netloc
+            CHECK_SECONDS.observe(result["latency"], host=host)
+            CHECKS.inc(status=f"{result['status'] // 100}xx" if result["status"] else "error")
+            if done % 500 == 0:
+                logging.info(f"Checked {done}/{len(ordered)} targets.")
+    except KeyboardInterrupt:
+        # Keep what was checked so far; queued requests are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        session.close()
+    for host, limiter in limiters.items():
+        logging.info(f"{host}: {limiter.summary()}")
+    return results
+
+
+def join_results(df, columns, results, base_url=BASE_URL):
+    """Add "<column> status", "<column> final URL" and "<column> latency" after each column."""
+    df = df.copy()
+    for column in columns:
+        codes, uniques = pd.factorize(df[column])
+        found = [results.get(target_url(value, base_url)) or {} for value in uniques]
+        values = {
+            "status": pd.array([result.get("status") for result in found] + [None], dtype="Int64"),
+            "final URL": pd.array([result.get("final_url") for result in found] + [None], dtype=object),
+            "latency": pd.array([result.get("latency") for result in found] + [None], dtype="Float64"),
+        }
+        position = df.columns.get_loc(column) + 1
+        for offset, name in enumerate(RESULT_COLUMNS):
+            # Code -1 (a missing value) picks the None appended at the end
+            df.insert(position + offset, f"{column} {name}", values[name][codes])
+    return df
+
+
+@metrics.timed("health_check.check_targets")
+def check_targets(
+    df, columns=TARGET_COLUMNS, base_url=BASE_URL, cache_path=CACHE_PATH, ttl_hours=DEFAULT_TTL_HOURS,
+    cookies=None, limit=None, internal_only=False, **check_options,
+):
+    """Check every distinct target in `columns` of `df` not checked within the TTL; join the results.
+
+    Results are cached in `cache_path`, including when the run is interrupted.
+    `internal_only` skips targets on other hosts than `base_url`.
+    """
+    urls = []
+    for column in columns:
+        urls += [target_url(value, base_url) for value in pd.unique(df[column].dropna())]
+    urls = list(dict.fromkeys(url for url in urls if url))
+    if internal_only:
+        host = urlsplit(base_url).netloc
+        urls = [url for url in urls if urlsplit(url).netloc == host]
+
+    cache = load_cache(cache_path)
+    now = time.time()
+    stale = [url for url in urls if not (url in cache and is_fresh(cache[url], ttl_hours * 3600, now))]
+    logging.info(f"{len(urls)} distinct targets, {len(urls) - len(stale)} cached, {len(stale)} to check.")
+    if limit is not None:
+        stale = stale[:limit]
+
+    try:
+        check_urls(stale, cookies, base_url, cache, **check_options)
+    finally:
+        save_cache(cache, cache_path)
+
+    checked = df if not urls else join_results(df, columns, cache, base_url)
+    for column in columns:
+        statuses = checked[f"{column} status"] if urls else pd.Series(dtype="Int64")
+        broken = int((statuses >= 400).sum())
+        logging.info(f"{column}: {broken} targets answer 4xx/5xx, {int(statuses.isna().sum())} unchecked or failed.")
+    return checked
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Check that redirect targets answer, and where they end up.")
+    parser.add_argument("-i", "--input", default="data/merged_data_all.csv", help="Redirect table to check.")
+    parser.add_argument("-o", "--output", default=OUTPUT_CSV, help="Where to save it with results.")
+    parser.add_argument(
+        "--columns", nargs="+", default=TARGET_COLUMNS, help="Columns holding targets (default: %(default)s)."
+    )
+    parser.add_argument("--base-url", default=BASE_URL, help="Site that relative paths belong to.")
+    parser.add_argument("--internal-only", action="store_true", help="Skip targets on other sites.")
+    parser.add_argument("-c", "--cookies", type=str, help="Session cookie value, to check unpublished pages.")
+    parser.add_argument("-w", "--workers", type=int, default=16, help="Most requests in flight overall.")
+    parser.add_argument("--per-host", type=int, default=4, help="Most requests in flight per host.")
+    parser.add_argument("--max-rps", type=float, default=5.0, help="Most requests per second per host (0 for no cap).")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds before a request is given up.")
+    parser.add_argument("--method", choices=["head", "get"], default="head", help="Request method to try first.")
+    parser.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL_HOURS, help="Re-check results older than this.")
+    parser.add_argument("--cache", default=CACHE_PATH, help="Result cache file.")
+    parser.add_argument("--limit", type=int, help="Check at most this many stale targets this run.")
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+
+    cookies = session_cookies(args.cookies or os.getenv("RCOT_COOKIE_VALUE"))
+    df = storage.load_intermediate(args.input)
+    checked = check_targets(
+        df, args.columns, args.base_url, args.cache, args.ttl_hours, cookies, args.limit, args.internal_only,
+        workers=args.workers, per_host=args.per_host, max_rps=args.max_rps, timeout=args.timeout,
+        method=args.method,
+    )
+    checked.to_csv(args.output, index=False)
+    logging.info(f"Saved {args.output}")
+    storage.log_peak_memory()
+
+
+if __name__ == "__main__":
+    main()
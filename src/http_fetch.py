@@ -0,0 +1,144 @@
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from throttle import parse_retry_after
+
+DEFAULT_TIMEOUT = 30
+
+FETCH_SECONDS = metrics.histogram("page_fetch_seconds", "Time to fetch a page, by crawl mode.")
+WAIT_SECONDS = metrics.histogram(
+    "page_wait_seconds",
+    "Time a page waited for a request slot (http) or for its table to appear (browser).",
+)
+BYTES_FETCHED = metrics.counter("bytes_fetched_total", "Bytes of pages fetched, by crawl mode.")
+
+
+def make_session(cookies, pool_size=8, hosts=1):
+    """Create a keep-alive HTTP session carrying the Drupal session cookie, if any."""
+    session = requests.Session()
+    # One pool per host, each sized to the number of concurrent workers on that host
+    adapter = HTTPAdapter(pool_connections=hosts, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    if cookies:
+        # Send the cookie as a header so it applies to any host (including a local stub server)
+        session.headers["Cookie"] = f"{cookies['name']}={cookies['value']}"
+    return session
+
+
+def fetch_response(session, url, headers=None, timeout=DEFAULT_TIMEOUT):
+    """Fetch a single page, raising on HTTP errors (304 Not Modified is not one)."""
+    started = time.monotonic()
+    response = session.get(url, headers=headers, timeout=timeout)
+    FETCH_SECONDS.observe(time.monotonic() - started, mode="http")
+    BYTES_FETCHED.inc(len(response.content), mode="http")
+    response.raise_for_status()
+    return response
+
+
+def fetch_page(session, url, timeout=DEFAULT_TIMEOUT):
+    """Fetch a single page and return its body, raising on HTTP errors."""
+    return fetch_response(session, url, timeout=timeout).text
+
+
+def is_retryable(error):
+    """Retry connection problems, timeouts, 429s and server errors, but not other client errors."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, requests.RequestException)
+
+
+def is_overload(error):
+    """Whether an error means the server is struggling (429/503, timeouts, refused connections)."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code in (429, 503)
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def retry_with_backoff(func, attempts=4, base_delay=1.0, max_delay=30.0, should_retry=None):
+    """Call func() until it succeeds, sleeping with exponential backoff and full jitter between tries.
+
+    Errors for which `should_retry(error)` is false are raised straight away; otherwise
+    the last error is re-raised once `attempts` calls have failed.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == attempts or (should_retry and not should_retry(e)):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            logging.warning(f"Attempt {attempt} failed ({str(e)}), retrying in {delay:.1f}s.")
+            time.sleep(delay)
+
+
+def fetch_limited(session, url, headers, limiter):
+    """Fetch a page once a limiter slot is free, reporting its latency and outcome back."""
+    waited = time.monotonic()
+    limiter.acquire()
+    started = time.monotonic()
+    WAIT_SECONDS.observe(started - waited, mode="http")
+    try:
+        response = fetch_response(session, url, headers)
+    except requests.RequestException as e:
+        retry_after = None
+        if e.response is not None:
+            retry_after = parse_retry_after(e.response.headers.get("Retry-After"))
+        limiter.release(time.monotonic() - started, is_overload(e), retry_after)
+        raise
+    limiter.release(time.monotonic() - started)
+    return response
+
+
+def fetch_with_retries(session, url, headers=None, attempts=4, limiter=None):
+    """Fetch a page, retrying failed requests with exponential backoff."""
+    if limiter:
+        fetch = lambda: fetch_limited(session, url, headers, limiter)  # noqa: E731
+    else:
+        fetch = lambda: fetch_response(session, url, headers)  # noqa: E731
+    return retry_with_backoff(fetch, attempts=attempts, should_retry=is_retryable)
+
+
+def fetch_pages(session, urls, handle_page, limiter, headers_for=None, attempts=4):
+    """Fetch pages concurrently and pass each response to handle_page(key, response) as it arrives.
+
+    `urls` maps a key (e.g. the page number) to its URL and `headers_for(key)` may
+    supply extra request headers per page. How many requests are in flight is decided
+    by `limiter` (see throttle.AdaptiveLimiter). Each request is tried up to `attempts`
+    times. Returns a dict of the keys that failed and their errors.
+    """
+    failed = {}
+    executor = ThreadPoolExecutor(max_workers=limiter.ceiling)
+    try:
+        futures = {
+            executor.submit(
+                fetch_with_retries,
+                session,
+                url,
+                headers_for(key) if headers_for else None,
+                attempts,
+                limiter,
+            ): key
+            for key, url in urls.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                handle_page(key, future.result())
+            except Exception as e:
+                logging.error(f"Failed to process page {key}: {str(e)}")
+                failed[key] = str(e)
+    except KeyboardInterrupt:
+        # Drop queued requests instead of waiting for all of them to run
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown()
+    logging.info(f"Throttle: {limiter.summary()}")
+    return failed
@@ -0,0 +1,390 @@
+import atexit
+import bisect
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+PREFIX = "crawler_"
+METRICS_DIR = Path(os.getenv("CRAWLER_METRICS_DIR", "data/metrics"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 1000)
+
+# Stages to profile ("all" for every stage) and the profiler to use, set by configure()
+profile_stages = set()
+profiler_name = "cprofile"
+configured = False
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        return [(self.name, dict(key), value) for key, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    """The last value set per label set."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram:
+    """Counts of observations per cumulative bucket, with their sum, per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        for key, (counts, total) in sorted(self.values.items()):
+            labels = dict(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", dict(labels, le=format_value(bound)), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+registry = {}
+registry_lock = threading.Lock()
+
+
+def metric(kind, name, help, **kwargs):
+    """The registered metric called `name`, created on first use."""
+    name = PREFIX + name
+    with registry_lock:
+        if name not in registry:
+            registry[name] = kind(name, help, **kwargs)
+        return registry[name]
+
+
+def counter(name, help):
+    return metric(Counter, name, help)
+
+
+def gauge(name, help):
+    return metric(Gauge, name, help)
+
+
+def histogram(name, help, buckets=LATENCY_BUCKETS):
+    return metric(Histogram, name, help, buckets=buckets)
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def exposition():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with registry_lock:
+        metrics = sorted(registry.values(), key=lambda metric: metric.name)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            label_text = ",".join(f'{key}="{escape(label)}"' for key, label in labels.items())
+            lines.append(f"{name}{{{label_text}}} {format_value(value)}" if label_text else f"{name} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path=None):
+    """Write the metrics for node_exporter's textfile collector, replacing the file atomically."""
+    if not registry:
+        return None
+    path = Path(path or METRICS_DIR / f"{Path(sys.argv[0]).stem or 'python'}.prom")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".tmp")
+    partial.write_text(exposition())
+    os.replace(partial, path)
+    logging.debug(f"Metrics written to {path}")
+    return path
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per log record, with the fields of metrics events merged in."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "metrics", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def event(name, message, **fields):
+    """Log `message`, carrying `fields` as structured data for the JSON log format."""
+    logging.info(message, extra={"metrics": dict(fields, event=name)})
+
+
+def peak_rss():
+    """Peak resident set size since the last reset_peak_rss(), in bytes."""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# Highest peak RSS of the windows closed by reset_peak_rss()
+earlier_peak = 0
+
+
+def process_peak_rss():
+    """Peak resident set size of the whole process so far, in bytes."""
+    return max(earlier_peak, peak_rss())
+
+
+def reset_peak_rss():
+    """Start a new peak RSS window (Linux only; elsewhere the process peak is used)."""
+    global earlier_peak
+    earlier_peak = process_peak_rss()
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+# Peak RSS seen so far by each running stage, across threads
+active_stages = {}
+active_lock = threading.Lock()
+profiling = threading.local()
+
+
+def should_profile(name):
+    return "all" in profile_stages or any(name == stage or name.endswith("." + stage) for stage in profile_stages)
+
+
+def start_profiler():
+    if profiler_name == "pyinstrument":
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def stop_profiler(profiler, name):
+    METRICS_DIR.mkdir(parents=True, exist_ok=True)
+    if profiler_name == "pyinstrument":
+        profiler.stop()
+        path = METRICS_DIR / f"profile-{name}.html"
+        path.write_text(profiler.output_html())
+        logging.info(f"Profile of {name} saved to {path}")
+        return
+    profiler.disable()
+    path = METRICS_DIR / f"profile-{name}.prof"
+    profiler.dump_stats(path)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(15)
+    logging.info(f"Profile of {name} saved to {path}:\n{report.getvalue()}")
+
+
+class Stage:
+    """Times a block, records its rows in/out and peak RSS, and profiles it when asked to.
+
+    Peak RSS is that of the whole process while the stage ran, so stages running in
+    other threads at the same time are included.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.rows_in = None
+        self.rows_out = None
+
+    def __enter__(self):
+        with active_lock:
+            # Fold the peak so far into the running stages before starting a new window
+            peak = peak_rss()
+            for stage in active_stages:
+                active_stages[stage] = max(active_stages[stage], peak)
+            reset_peak_rss()
+            active_stages[self] = 0
+        self.profiler = None
+        if should_profile(self.name) and not getattr(profiling, "active", False):
+            profiling.active = True
+            self.profiler = start_profiler()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.started
+        if self.profiler is not None:
+            stop_profiler(self.profiler, self.name)
+            profiling.active = False
+        with active_lock:
+            peak = max(active_stages.pop(self), peak_rss())
+            for stage in active_stages:
+                active_stages[stage] = max(active_stages[stage], peak)
+
+        status = "error" if exc_type else "ok"
+        gauge("stage_duration_seconds", "Wall time of the last run of each stage.").set(seconds, stage=self.name)
+        gauge("stage_peak_rss_bytes", "Peak RSS of the process during the last run of each stage.").set(
+            peak, stage=self.name
+        )
+        counter("stage_runs_total", "Runs of each stage by outcome.").inc(stage=self.name, status=status)
+        fields = {"stage": self.name, "status": status, "seconds": round(seconds, 3)}
+        fields["peak_rss_mb"] = round(peak / (1 << 20), 1)
+        message = f"Stage {self.name} {status} in {seconds:.2f}s, peak {fields['peak_rss_mb']:.0f} MB"
+        for direction, rows in (("in", self.rows_in), ("out", self.rows_out)):
+            if rows is not None:
+                counter(f"stage_rows_{direction}_total", f"Rows going {direction} of each stage.").inc(
+                    rows, stage=self.name
+                )
+                fields[f"rows_{direction}"] = rows
+                message += f", {rows} rows {direction}"
+        event("stage", message, **fields)
+        return False
+
+
+def stage(name):
+    return Stage(name)
+
+
+def timed(name):
+    """Decorator running a function as a stage, counting rows of DataFrames going in and out."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Stage(name) as current:
+                frames = [arg for arg in args if isinstance(arg, pd.DataFrame)]
+                if frames:
+                    current.rows_in = len(frames[0])
+                result = func(*args, **kwargs)
+                if isinstance(result, pd.DataFrame):
+                    current.rows_out = len(result)
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def record_filter(profile, columns, hits, total):
+    """Count the rows going into and out of each filter rule of a profile.
+
+    Columns are checked in order, so the rows into a column are those the earlier
+    columns kept; each rule's count is the rows it was the first to reject.
+    """
+    rows_in = total
+    for column in columns:
+        dropped = 0
+        for (hit_column, rule), count in hits.items():
+            if hit_column == column:
+                counter("filter_rule_rows_dropped_total", "Rows dropped by each filter rule.").inc(
+                    count, profile=profile, column=column, rule=rule
+                )
+                dropped += count
+        counter("filter_rows_in_total", "Rows reaching each column's filter rules.").inc(
+            rows_in, profile=profile, column=column
+        )
+        counter("filter_rows_out_total", "Rows passing each column's filter rules.").inc(
+            rows_in - dropped, profile=profile, column=column
+        )
+        rows_in -= dropped
+
+
+def add_arguments(parser):
+    """Add the metrics and profiling options to a script's argument parser."""
+    parser.add_argument(
+        "--metrics-dir",
+        type=Path,
+        default=METRICS_DIR,
+        help="Where to write the Prometheus textfile and profiles (default %(default)s).",
+    )
+    parser.add_argument("--log-json", action="store_true", help="Log one JSON object per line.")
+    parser.add_argument(
+        "--profile-stage",
+        action="append",
+        default=[],
+        metavar="STAGE",
+        help="Profile this stage (e.g. filter_data, or 'all'); may be repeated.",
+    )
+    parser.add_argument(
+        "--profiler",
+        choices=["cprofile", "pyinstrument"],
+        default="pyinstrument" if pyinstrument else "cprofile",
+        help="Profiler for --profile-stage (default: pyinstrument when installed).",
+    )
+
+
+def configure(args):
+    """Apply the options from add_arguments() and write the textfile when the script exits."""
+    global METRICS_DIR, profiler_name, configured
+    if not configured:
+        atexit.register(write_textfile)
+        configured = True
+    METRICS_DIR = args.metrics_dir
+    profile_stages.update(args.profile_stage)
+    if args.profiler == "pyinstrument" and pyinstrument is None:
+        logging.warning("pyinstrument is not installed, profiling with cProfile.")
+        args.profiler = "cprofile"
+    profiler_name = args.profiler
+    if args.log_json:
+        for handler in logging.getLogger().handlers:
+            handler.setFormatter(JsonFormatter())
@@ -0,0 +1,280 @@
+import argparse
+import hashlib
+import logging
+import os
+import pickle
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import combine
+import health_check
+import metrics
+import process_aliases
+import process_all
+import process_redirects
+import redirect_chains
+import storage
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s", force=True
+)
+
+CACHE_DIR = Path("data") / ".pipeline"
+REDIRECTS_CSV = "data/redirects/redirects.csv"
+REDIRECT_HEADERS = ["From URL", "To URL", "Redirect Status", "Redirect Language"]
+EXCLUDE_CSV = "data/exclude.csv"
+
+
+class Stage:
+    """One step of the pipeline.
+
+    `func` receives the outputs of `deps` in order. The stage's cache key combines its
+    name, the pipeline code, the intermediate format, the state of its `sources` (files
+    or directories read directly), any `params` it depends on and the keys of its
+    dependencies. Stages with `cache=False` always run.
+    """
+
+    def __init__(self, name, func, deps=(), sources=(), cache=True, params=()):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.sources = list(sources)
+        self.cache = cache
+        self.params = list(params)
+
+
+def code_version():
+    """Hash of the scripts in src, so that changing any stage invalidates cached outputs."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(__file__).resolve().parent.glob("*.py")):
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def source_state(path):
+    """Cheap fingerprint of a file or directory: names, sizes and modification times."""
+    if not os.path.exists(path):
+        return [path, None]
+    if os.path.isdir(path):
+        return [path, sorted((entry.name, *fingerprint_stat(entry.stat())) for entry in os.scandir(path))]
+    return [path, fingerprint_stat(os.stat(path))]
+
+
+def fingerprint_stat(stat):
+    return stat.st_size, stat.st_mtime_ns
+
+
+def stage_key(stage, dep_keys, version):
+    if not stage.cache:
+        return None
+    state = [
+        stage.name,
+        version,
+        storage.FORMAT,
+        [source_state(str(source)) for source in stage.sources],
+        stage.params,
+        dep_keys,
+    ]
+    return hashlib.sha256(repr(state).encode("utf-8")).hexdigest()
+
+
+def load_cached(stage, key):
+    path = CACHE_DIR / f"{stage.name}.pkl"
+    if key is None or not path.exists():
+        return False, None
+    with open(path, "rb") as file:
+        cached = pickle.load(file)
+    if cached["key"] != key:
+        return False, None
+    return True, cached["output"]
+
+
+def save_cached(stage, key, output):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = CACHE_DIR / f"{stage.name}.pkl"
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as file:
+        pickle.dump({"key": key, "output": output}, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def run_stage(stage, inputs, dep_keys, version):
+    """Run a stage, or load its output if its inputs have not changed. Returns (output, key, cached, seconds)."""
+    started = time.perf_counter()
+    key = stage_key(stage, dep_keys, version)
+    hit, output = load_cached(stage, key)
+    if not hit:
+        with metrics.stage(f"pipeline.{stage.name}"):
+            output = stage.func(*inputs)
+        if key is not None:
+            save_cached(stage, key, output)
+    return output, key, hit, time.perf_counter() - started
+
+
+def run_pipeline(stages, workers=4):
+    """Run stages as soon as their dependencies are done, independent ones concurrently.
+
+    Returns {stage name: (output, seconds, cached)}.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    version = code_version()
+    results = {}
+    keys = {}
+    running = {}
+    pending = list(stages)
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for stage in [s for s in pending if all(dep in results for dep in s.deps)]:
+                pending.remove(stage)
+                inputs = [results[dep][0] for dep in stage.deps]
+                dep_keys = [keys[dep] for dep in stage.deps]
+                logging.info(f"Stage {stage.name}: starting")
+                running[executor.submit(run_stage, stage, inputs, dep_keys, version)] = stage.name
+
+            if not running:
+                missing = {dep for stage in pending for dep in stage.deps if dep not in by_name}
+                raise ValueError(f"Stages with unknown or circular dependencies: {missing or pending}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                output, key, cached, seconds = future.result()
+                results[name] = (output, seconds, cached)
+                # Dependents of an uncached stage are keyed on the files it produced instead
+                keys[name] = key or f"{name}:uncached"
+                logging.info(f"Stage {name}: {'cached' if cached else 'done'} in {seconds:.2f}s")
+
+    logging.info(f"Pipeline finished in {time.perf_counter() - started:.2f}s")
+    for stage in stages:
+        _, seconds, cached = results[stage.name]
+        logging.info(f"  {stage.name:<18} {seconds:8.2f}s{'  (cached)' if cached else ''}")
+    return results
+
+
+def crawl_aliases(cookie_value, combined_csv):
+    import crawler
+
+    args = ["--http", "--stream", "--combined-csv", combined_csv] + (["-c", cookie_value] if cookie_value else [])
+    crawler.run(crawler.build_parser().parse_args(args))
+
+
+def export_redirects(cookie_value):
+    import crawler_redirects
+
+    args = ["--headless"] + (["-c", cookie_value] if cookie_value else [])
+    crawler_redirects.run(crawler_redirects.build_parser().parse_args(args))
+
+
+def build_stages(args):
+    crawl_deps = {"aliases": [], "redirects": []}
+    stages = []
+    if args.crawl:
+        # The alias crawl and the redirect export do not depend on each other
+        stages.append(Stage("crawl_aliases", lambda: crawl_aliases(args.cookies, args.combined_csv), cache=False))
+        stages.append(Stage("export_redirects", lambda: export_redirects(args.cookies), cache=False))
+        crawl_deps = {"aliases": ["crawl_aliases"], "redirects": ["export_redirects"]}
+
+    def aliases():
+        if args.crawl:
+            # The streamed crawl wrote every row to the combined CSV; tables left in
+            # data/tables by an earlier crawl must not be parsed over it
+            df = storage.load_intermediate(args.combined_csv)
+        else:
+            df = process_aliases.load_or_create_csv(args.tables_dir, args.combined_csv, args.workers)
+        process_aliases.export_aliases(df)
+        return df
+
+    def redirects():
+        df = process_redirects.load_csv_with_headers(REDIRECTS_CSV, REDIRECT_HEADERS)
+        return process_redirects.export_redirects(df)
+
+    def chains(redirects_df):
+        return redirect_chains.export_flattened(redirects_df, args.max_hops)
+
+    def merged(aliases_df, redirects_df):
+        merged_df = combine.merge_redirects_aliases(redirects_df, aliases_df)
+        storage.save_intermediate(merged_df, "data/merged_data_all.csv")
+        return merged_df
+
+    def health(merged_df):
+        checked = health_check.check_targets(merged_df, cookies=health_check.session_cookies(args.cookies))
+        checked.to_csv(health_check.OUTPUT_CSV, index=False)
+        return checked
+
+    def final(merged_df):
+        return process_all.process_merged(merged_df, process_all.load_exclude_urls(EXCLUDE_CSV))
+
+    # A streamed crawl leaves no tables, only the combined CSV
+    alias_sources = [args.combined_csv] if args.crawl else [args.tables_dir]
+    stages += [
+        Stage("aliases", aliases, crawl_deps["aliases"], alias_sources),
+        Stage("redirects", redirects, crawl_deps["redirects"], [REDIRECTS_CSV]),
+        Stage("chains", chains, ["redirects"], params=[args.max_hops]),
+        Stage("merged", merged, ["aliases", "redirects"]),
+        Stage("final", final, ["merged"], [EXCLUDE_CSV]),
+    ]
+    if args.check_targets:
+        # Results expire by age rather than with the inputs, so health_check.py's own cache decides
+        stages.append(Stage("health", health, ["merged"], cache=False))
+    return stages
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the alias/redirect pipeline in one process, skipping unchanged stages."
+    )
+    parser.add_argument(
+        "--crawl",
+        action="store_true",
+        help="Crawl the aliases and export the redirects first (both at once).",
+    )
+    parser.add_argument(
+        "-c", "--cookies", type=str, help="Cookies value to use for the crawls."
+    )
+    parser.add_argument(
+        "--tables-dir", type=str, default="data/aliases/tables", help="Alias table HTML files."
+    )
+    parser.add_argument(
+        "--combined-csv", type=str, default="data/aliases/combined.csv", help="Combined alias CSV."
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, help="Processes used to parse alias tables."
+    )
+    parser.add_argument(
+        "--max-hops",
+        type=int,
+        default=redirect_chains.MAX_HOPS,
+        help="Flag redirect chains taking more redirects than this.",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet", "feather"],
+        default=storage.FORMAT,
+        help="File format for intermediate tables (final exports are always CSV).",
+    )
+    parser.add_argument(
+        "--check-targets",
+        action="store_true",
+        help=f"Check every redirect target and save the results to {health_check.OUTPUT_CSV}.",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Run every stage even if its inputs are unchanged."
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+
+    storage.FORMAT = args.format
+    if args.no_cache and CACHE_DIR.exists():
+        for path in CACHE_DIR.glob("*.pkl"):
+            path.unlink()
+
+    run_pipeline(build_stages(args))
+    storage.log_peak_memory()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,99 @@
+import argparse
 import os
 import pandas as pd
 import sys
 import logging
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+
+from alias_tables import COLUMNS, parse_alias_rows
+import duplicates
+import metrics
+import snapshots
+import storage
+import table_cache
 
 # Setup basic configuration for logging
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
+# Below this many files, starting a process pool costs more than it saves
+PARALLEL_THRESHOLD = 64
+
 
 def process_html_table(file_path):
     """Process HTML tables to extract data."""
     try:
         with open(file_path, "r") as file:
             content = file.read()
-        soup = BeautifulSoup(content, "html.parser")
 
-        # Find the table
-        table = soup.find("table", class_="tableheader-processed")
-        if not table:
+        # Find the table and pull out its rows without building a full parse tree
+        rows = parse_alias_rows(content)
+        if rows is None:
             logging.warning(f"No valid table found in {file_path}")
             return []
-
-        rows = table.find_all("tr")
-        data = [extract_data(row) for row in rows[1:] if len(row.find_all("td")) > 1]
-        return data
+        return rows
     except Exception as e:
         logging.error(f"Error processing file {file_path}: {str(e)}")
         return []
 
 
-def extract_data(row):
-    """Extract data from a table row."""
-    cols = row.find_all("td")
-    return [cols[0].text.strip(), cols[1].text.strip()]
-
-
-def load_or_create_csv(directory, combined_csv_path):
-    """Load or create CSV file from HTML tables."""
-    if os.path.exists(combined_csv_path):
-        logging.info("Combined CSV already exists. Skipping HTML processing.")
-        return pd.read_csv(combined_csv_path)
-
-    all_data = []
-    for filename in os.listdir(directory):
-        if filename.endswith(".html"):
-            file_path = os.path.join(directory, filename)
-            all_data.extend(process_html_table(file_path))
+def process_html_tables(file_paths, workers=None):
+    """Process many HTML tables, fanning them out over a process pool when there are enough.
+
+    Rows come back in the order of file_paths.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(file_paths) < PARALLEL_THRESHOLD:
+        return [process_html_table(file_path) for file_path in file_paths]
+
+    chunksize = max(1, len(file_paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(process_html_table, file_paths, chunksize=chunksize))
+
+
+@metrics.timed("process_aliases.load_or_create_csv")
+def load_or_create_csv(directory, combined_csv_path, workers=None):
+    """Load or create CSV file from HTML tables.
+
+    Rows are cached per table file (keyed on path, size, mtime and content hash) next to
+    the CSV, so only new or changed tables are parsed, and when nothing changed the
+    existing output is loaded as is. The output is written in the intermediate format
+    chosen in storage (CSV unless configured otherwise).
+    """
+    file_names = []
+    if os.path.isdir(directory):
+        file_names = [name for name in os.listdir(directory) if name.endswith(".html")]
+    if not file_names and storage.intermediate_source(combined_csv_path):
+        # e.g. written directly by `crawler.py --stream`
+        logging.info("No HTML tables found, using the existing combined CSV.")
+        return storage.load_intermediate(combined_csv_path)
+
+    cache_path = f"{combined_csv_path}.cache"
+    cache = table_cache.load_cache(cache_path)
+    changed = table_cache.refresh(
+        cache, directory, file_names, lambda paths: process_html_tables(paths, workers)
+    )
 
-    df = pd.DataFrame(all_data, columns=["Alias", "System"])
-    df.to_csv(combined_csv_path, index=False)
+    output_path = storage.intermediate_path(combined_csv_path)
+    if (
+        not changed
+        and os.path.exists(output_path)
+        and cache["output"] == (output_path, *table_cache.file_state(output_path))
+    ):
+        logging.info("Combined CSV is up to date. Skipping HTML processing.")
+        return storage.load_intermediate(combined_csv_path)
+
+    logging.info(f"{len(changed)} of {len(file_names)} tables added, changed or removed.")
+    all_data = [row for name in file_names for row in cache["files"][name]["rows"]]
+
+    df = storage.lean_strings(pd.DataFrame(all_data, columns=COLUMNS))
+    output_path = storage.save_intermediate(df, combined_csv_path)
+    cache["output"] = (output_path, *table_cache.file_state(output_path))
+    table_cache.save_cache(cache, cache_path)
     logging.info("Combined CSV created.")
     return df
 
 
+@metrics.timed("process_aliases.filter_data")
 def filter_data(df):
     """Filter out rows where 'System' and 'Alias' columns start with 'file/'."""
     return df[
@@ -62,23 +103,24 @@ def filter_data(df):
 
 def save_sorted_data(df, sort_by, filename):
     """Sort DataFrame and save to CSV."""
-    df.sort_values(by=sort_by).to_csv(filename, index=False)
+    df.sort_values(by=sort_by, kind="stable").to_csv(filename, index=False)
 
 
+@metrics.timed("process_aliases.find_and_save_duplicates")
 def find_and_save_duplicates(df):
-    """Find duplicates in 'System' column and save them."""
-    duplicate_systems = df["System"].value_counts()
-    duplicates = df[df["System"].isin(duplicate_systems.index[duplicate_systems > 1])]
-    duplicates.sort_values(by="System").to_csv(
-        "data/aliases/duplicate_URL_aliases.csv", index=False
+    """Find duplicates in 'System' column and save them, sorted by 'System'."""
+    return duplicates.save_duplicates(
+        df,
+        ["System"],
+        "data/aliases/duplicate_URL_aliases.csv",
+        summary_path="data/aliases/duplicate_URL_aliases_summary.csv",
+        drop_identical=False,
+        url_columns=["System"],
     )
-    return duplicates
 
 
-def main():
-    directory = "data/aliases/tables"
-    combined_csv_path = "data/aliases/combined.csv"
-    df = load_or_create_csv(directory, combined_csv_path)
+def export_aliases(df):
+    """Save the sorted alias lists and the duplicates report; return the duplicates."""
     filtered_df = filter_data(df)
 
     sort_types = ["Alias", "System"]
@@ -86,11 +128,27 @@ def main():
         save_sorted_data(
             filtered_df, value, f"data/aliases/URL_aliases_no_files_sortedby_{value}.csv"
         )
+    snapshots.record("aliases", filtered_df, "Alias")
+
+    return find_and_save_duplicates(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Combine and sort the crawled alias tables.")
+    parser.add_argument(
+        "-w", "--workers", type=int, help="Processes used to parse tables (default: all CPUs)."
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+
+    directory = "data/aliases/tables"
+    combined_csv_path = "data/aliases/combined.csv"
+    df = load_or_create_csv(directory, combined_csv_path, args.workers)
 
-    duplicates = find_and_save_duplicates(df)
-    duplicates_sorted = duplicates.sort_values(by="System")
-    print(duplicates_sorted)
-    #print(duplicates)
+    # Already sorted by System
+    print(export_aliases(df))
+    storage.log_peak_memory()
 
 
 if __name__ == "__main__":
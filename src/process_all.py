@@ -1,79 +1,47 @@
+import argparse
+import csv
 import logging
 import os
+import tempfile
+from collections import Counter
 
 import pandas as pd
 
+import duplicates
+import external_sort
+import filter_rules
+import metrics
+import snapshots
+import storage
+
 # Setup basic configuration for logging
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 
 def load_csv_with_headers(csv_path, headers):
-    """Load a CSV file that lacks headers and assign headers."""
-    if not os.path.exists(csv_path):
+    """Load a CSV file that lacks headers and assign headers.
+
+    A Parquet/Feather copy written by combine.py is used instead when it is newer.
+    """
+    if not storage.intermediate_source(csv_path):
         logging.error(f"CSV file not found at {csv_path}")
         return pd.DataFrame()  # Return empty DataFrame if file not found
 
-    df = pd.read_csv(csv_path, header=None, names=headers)
+    df = storage.load_intermediate(csv_path, header=None, names=headers)
     logging.info("CSV loaded with headers.")
     logging.info(f"Columns: {df.columns.tolist()}")  # Log DataFrame columns
     return df
 
 
-def filter_data(df):
-    """Filter out rows where 'From URL' and 'To URL' start with any of the specified patterns."""
-    # from_url_prefixes = [
-    #     "file/", "sites/", "system/files/", "events", "news", "files/", "jobs", "user", "taxonomy",
-    #     "occupational-therapy-jobs"
-    # ]
-    # to_url_prefixes = [
-    #     "<front>", "events", "jobs", "user", "taxonomy", "news"
-    # ]
-    from_url_prefixes = [
-        "files/", "events", "news", "occupational-therapy-jobs/", "sites/default/",
-        "publication", "system/files/", "suppliers/", "practice-resources/", "about-us/specialistsections/",
-        "about-us/specialist-sections/", "consultation", "jobs", "node"
-    ]
-    to_url_prefixes = [
-        "<front>", "events", "news", "user", "jobs", "taxonomy"
-    ]
-    alias_prefixes = [
-        "events/",
-    ]
-    # Define conditions for filtering "From URL"
-    from_conditions = (
-            ~df["From URL"].str.startswith(tuple(from_url_prefixes)) &
-            ~df["From URL"].str.contains(r'\?', regex=True) &
-            ~df["From URL"].str.contains(r'\@', regex=True)
-            & ~df["From URL"].str.contains(r'-0', regex=True)
-            & ~df["From URL"].str.contains(r'-(?!.)', regex=True)
-            & ~df["From URL"].str.contains(r'\.', regex=True)
-            & ~df["From URL"].str.contains(r'\;', regex=True)
-            # & (df["From URL"].str.len() <= 15)
-            & (
-                    (df["From URL"].str.len() <= 20) |  # If URL length is <= 20
-                    (
-                            (df["From URL"].str.len() > 20) &  # If URL length is > 20
-                            (df["From URL"].str.count('/') <= 2) &  # And contains <= 2 forward slashes
-                            (df["From URL"].str.len() < 30)  # And is shorter than 30 characters
-                    )
-            )
-    )
-
-    # Define conditions for filtering "To URL"
-    to_conditions = ~df["To URL"].str.startswith(tuple(to_url_prefixes))
-
-    # Define conditions for filtering "Alias"
-    alias_conditions = ~df["Alias"].str.startswith(tuple(alias_prefixes))
-
-    # Combine both conditions with logical AND
-    conditions = from_conditions & to_conditions & alias_conditions
-
-    return df[conditions]
+@metrics.timed("process_all.filter_data")
+def filter_data(df, profile="all"):
+    """Filter out rows where 'From URL', 'To URL' or 'Alias' break the rules of a filter_rules profile."""
+    return filter_rules.filter_rows(df, profile)
 
 
 def sort_and_save(df, sort_by, filename):
     """Sort DataFrame and save to CSV."""
-    sorted_df = df.sort_values(by=sort_by)
+    sorted_df = df.sort_values(by=sort_by, kind="stable")
     # Check if the file already exists
     if not os.path.exists(filename):
         # If the file doesn't exist, save the DataFrame with headers
@@ -84,20 +52,20 @@ def sort_and_save(df, sort_by, filename):
     logging.info(f"Data sorted by {sort_by} and saved to {filename}")
 
 
+@metrics.timed("process_all.find_and_save_duplicates")
 def find_and_save_duplicates(df):
     """Find duplicates based on 'From URL' or 'To URL' columns and save them."""
-    # Concatenate duplicates from both columns
-    from_duplicates = df[df.duplicated(subset="From URL", keep=False)]
-    to_duplicates = df[df.duplicated(subset="To URL", keep=False)]
-    sort_types = ["To URL", "From URL", "Alias"]
-    for sort_type in sort_types:
-        combined_duplicates = pd.concat([from_duplicates, to_duplicates]).drop_duplicates().sort_values(
-            by=sort_type)
-        combined_duplicates.to_csv(f"data/duplicate_redirects_{sort_type.replace(' ', '_')}.csv", index=False)
-
+    duplicates_df = duplicates.save_duplicates(
+        df,
+        ["From URL", "To URL"],
+        "data/duplicate_redirects_{key}.csv",
+        sort_keys=["To URL", "From URL", "Alias"],
+        summary_path="data/duplicate_redirects_summary.csv",
+        url_columns=["From URL", "To URL", "Alias"],
+    )
     logging.info("Duplicates found and saved.")
 
-    return combined_duplicates
+    return duplicates_df
 
 
 def load_exclude_urls(exclude_csv_path):
@@ -119,26 +87,17 @@ def exclude_urls(df, exclude_urls):
     return excluded_df
 
 
-def main():
-    csv_path = "data/merged_data_all.csv"
-    exclude_csv_path = "data/exclude.csv"
-    headers = ["From URL", "To URL", "Alias"]
-
-    # Load the exclusion list
-    exclude_urls_list = load_exclude_urls(exclude_csv_path)
-
-    # Load the main CSV data
-    redirects_df = load_csv_with_headers(csv_path, headers)
-
+def process_merged(redirects_df, exclude_urls_list, profile="all"):
+    """Filter the merged redirects, apply exclusions and save the final and duplicate CSVs."""
     # Apply the filtering logic
-    filtered_redirects = filter_data(redirects_df)
-    filtered_redirects.to_csv("data/filtered.csv", index=False, header=False)
+    filtered_redirects = filter_data(redirects_df, profile)
+    storage.save_intermediate(filtered_redirects, "data/filtered.csv", header=False)
 
     # Exclude rows based on exclusion list
     final_filtered_redirects = exclude_urls(filtered_redirects, exclude_urls_list)
 
     # Save the result with excluded URLs applied
-    final_filtered_redirects.to_csv("data/filtered_exclusions_applied.csv", index=False, header=False)
+    storage.save_intermediate(final_filtered_redirects, "data/filtered_exclusions_applied.csv", header=False)
 
     # Sort by both "From URL" and "To URL" and then save the sorted DataFrame
     sort_and_save(final_filtered_redirects, ["From URL", "To URL"], "data/all_sorted.csv")
@@ -146,6 +105,113 @@ def main():
     # Find and save duplicates using the final filtered DataFrame
     find_and_save_duplicates(final_filtered_redirects)
 
+    # Only the redirects that changed since the last run go to data/snapshots/redirects/delta.csv
+    snapshots.record("redirects", final_filtered_redirects, "From URL")
+
+    return final_filtered_redirects
+
+
+@metrics.timed("process_all.process_merged_chunked")
+def process_merged_chunked(csv_path, headers, exclude_urls_list, profile="all", memory_budget_mb=None):
+    """process_merged for tables too big for memory, writing the same files as CSV.
+
+    The merged table is read in chunks that fit in `memory_budget_mb`; filters and
+    exclusions are applied per chunk, and the sorted outputs and duplicate reports are
+    built with an external merge sort over runs spilled to a temporary directory.
+    """
+    memory_budget_mb = memory_budget_mb or external_sort.DEFAULT_MEMORY_BUDGET_MB
+    run_rows = external_sort.rows_per_chunk(csv_path, headers, memory_budget_mb)
+    rules = filter_rules.load_profile(profile)
+    exclude_set = {str(url) for url in exclude_urls_list}
+    hits = Counter()
+    total = excluded = 0
+
+    with tempfile.TemporaryDirectory(dir="data") as directory:
+        table_path = os.path.join(directory, "final.csv")
+        with open(table_path, "w", newline="") as table:
+            table_writer = csv.writer(table, lineterminator="\n")
+            for number, chunk in enumerate(external_sort.read_chunks(csv_path, headers, run_rows)):
+                mode = "w" if number == 0 else "a"
+                filtered, chunk_hits = filter_rules.apply_rules(chunk, rules)
+                hits.update(chunk_hits)
+                total += len(chunk)
+                filtered.to_csv("data/filtered.csv", index=False, header=False, mode=mode)
+
+                final = filtered[~filtered["From URL"].isin(exclude_set)]
+                excluded += len(filtered) - len(final)
+                final.to_csv("data/filtered_exclusions_applied.csv", index=False, header=False, mode=mode)
+                table_writer.writerows(external_sort.chunk_rows(final))
+
+        filter_rules.log_rule_hits(dict(hits), total, profile)
+        logging.info(f"Excluded {excluded} rows based on exclusion list.")
+
+        # Like sort_and_save, append to an existing all_sorted.csv
+        sorted_path = "data/all_sorted.csv"
+        exists = os.path.exists(sorted_path)
+        key = external_sort.row_key([headers.index("From URL") + 1, headers.index("To URL") + 1])
+        rows = external_sort.external_sort(external_sort.read_run(table_path), key, run_rows, directory)
+        external_sort.write_rows(rows, sorted_path, headers, mode="a" if exists else "w", header=not exists)
+        logging.info(f"Data sorted by ['From URL', 'To URL'] and saved to {sorted_path}")
+
+        duplicates.save_duplicates_external(
+            table_path,
+            headers,
+            ["From URL", "To URL"],
+            "data/duplicate_redirects_{key}.csv",
+            run_rows,
+            directory,
+            sort_keys=["To URL", "From URL", "Alias"],
+            summary_path="data/duplicate_redirects_summary.csv",
+            url_columns=["From URL", "To URL", "Alias"],
+        )
+        logging.info("Duplicates found and saved.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filter the merged redirects and aliases.")
+    parser.add_argument(
+        "--report-rules",
+        action="store_true",
+        help="Only log how many rows each filter rule drops; write nothing.",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(filter_rules.PROFILES),
+        default="all",
+        help="Filter rule profile (see filter_rules.py).",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        metavar="MB",
+        help="Process the table in chunks that fit in about this much memory, sorting on disk.",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+
+    csv_path = "data/merged_data_all.csv"
+    exclude_csv_path = "data/exclude.csv"
+    headers = ["From URL", "To URL", "Alias"]
+
+    if args.memory_budget and not args.report_rules:
+        exclude_urls_list = load_exclude_urls(exclude_csv_path)
+        process_merged_chunked(csv_path, headers, exclude_urls_list, args.profile, args.memory_budget)
+        storage.log_peak_memory()
+        return
+
+    # Load the main CSV data
+    redirects_df = load_csv_with_headers(csv_path, headers)
+    if args.report_rules:
+        filter_data(redirects_df, args.profile)
+        return
+
+    # Load the exclusion list
+    exclude_urls_list = load_exclude_urls(exclude_csv_path)
+
+    process_merged(redirects_df, exclude_urls_list, args.profile)
+    storage.log_peak_memory()
+
 
 if __name__ == "__main__":
     main()
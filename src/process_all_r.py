@@ -1,26 +1,34 @@
+import argparse
 import logging
 import os
 import pandas as pd
 
+import duplicates
+import filter_rules
+import metrics
+import storage
+
 # Setup logging configuration
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
 
 def load_csv(filepath, headers=None):
-    """Load a CSV file, optionally assigning new headers."""
-    if not os.path.exists(filepath):
+    """Load a CSV file, optionally assigning new headers.
+
+    A Parquet/Feather copy written by combine.py is used instead when it is newer.
+    """
+    if not storage.intermediate_source(filepath):
         logging.error(f"File not found: {filepath}")
         return pd.DataFrame()
-    df = pd.read_csv(filepath, header=None if headers else 0, names=headers)
+    df = storage.load_intermediate(filepath, header=None if headers else 0, names=headers)
     logging.info(f"Loaded CSV from {filepath} with columns: {df.columns.tolist()}")
     return df
 
 
-def filter_redirects(df, from_prefixes, to_prefixes):
-    """Filter rows where 'From URL' and 'To URL' start with specified prefixes."""
-    from_condition = ~df["From URL"].str.startswith(tuple(from_prefixes)) & ~df["From URL"].str.contains(r'\?', regex=True)
-    to_condition = ~df["To URL"].str.startswith(tuple(to_prefixes))
-    return df[from_condition & to_condition]
+@metrics.timed("process_all_r.filter_redirects")
+def filter_redirects(df, profile="all_r"):
+    """Filter out rows where 'From URL' and 'To URL' break the rules of a filter_rules profile."""
+    return filter_rules.filter_rows(df, profile)
 
 
 def save_csv(df, filepath, mode='w', include_header=True):
@@ -33,20 +41,30 @@ def save_csv(df, filepath, mode='w', include_header=True):
     logging.info(f"Data saved to {filepath} (mode={mode}, header={header})")
 
 
+def save_intermediate(df, filepath):
+    """Save a table the next scripts read, as CSV with headers or in the configured storage format."""
+    path = storage.save_intermediate(df, filepath)
+    logging.info(f"Data saved to {path}")
+
 
 def sort_and_save(df, sort_by, filename):
     """Sort a DataFrame by specified columns and save to a CSV file."""
-    sorted_df = df.sort_values(by=sort_by)
+    sorted_df = df.sort_values(by=sort_by, kind="stable")
     save_csv(sorted_df, filename)
 
 
+@metrics.timed("process_all_r.find_and_save_duplicates")
 def find_and_save_duplicates(df, output_dir, keys):
-    """Find duplicates based on specified keys and save them to CSV."""
+    """Find duplicates based on specified keys and save them to CSV, sorted by each key."""
     os.makedirs(output_dir, exist_ok=True)
-    duplicates = pd.concat([df[df.duplicated(key, keep=False)] for key in keys]).drop_duplicates()
-    for key in keys:
-        sorted_duplicates = duplicates.sort_values(by=key)
-        save_csv(sorted_duplicates, os.path.join(output_dir, f"duplicate_redirects_{key.replace(' ', '_')}.csv"))
+    duplicates.save_duplicates(
+        df,
+        keys,
+        os.path.join(output_dir, "duplicate_redirects_{key}.csv"),
+        summary_path=os.path.join(output_dir, "duplicate_redirects_summary.csv"),
+        url_columns=keys,
+    )
+    logging.info(f"Duplicates saved to {output_dir}")
 
 
 def load_exclude_urls(filepath):
@@ -63,6 +81,17 @@ def apply_exclusions(df, exclude_set):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Filter the merged redirects and aliases.")
+    parser.add_argument(
+        "--profile",
+        choices=list(filter_rules.PROFILES),
+        default="all_r",
+        help="Filter rule profile (see filter_rules.py).",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+
     # Define paths and headers
     data_dir = "data"
     main_csv_path = os.path.join(data_dir, "merged_data_all.csv")
@@ -70,28 +99,21 @@ def main():
     output_dir = os.path.join(data_dir, "duplicates")
     headers = ["From URL", "To URL", "Alias"]
 
-    # Prefixes for filtering
-    from_prefixes = [
-        "files/", "events", "news", "occupational-therapy-jobs/", "sites/default/",
-        "publication", "system/files/", "suppliers/", "practice-resources/",
-        "about-us/specialistsections/", "consultation", "jobs"
-    ]
-    to_prefixes = ["<front>", "events", "news", "user", "jobs", "taxonomy"]
-
     # Load main data and exclusion list
     redirects_df = load_csv(main_csv_path, headers)
     exclude_set = load_exclude_urls(exclude_csv_path)
 
     # Apply filters and exclusions
-    filtered_redirects = filter_redirects(redirects_df, from_prefixes, to_prefixes)
-    save_csv(filtered_redirects, os.path.join(data_dir, "filtered.csv"))
+    filtered_redirects = filter_redirects(redirects_df, args.profile)
+    save_intermediate(filtered_redirects, os.path.join(data_dir, "filtered.csv"))
 
     final_filtered_redirects = apply_exclusions(filtered_redirects, exclude_set)
-    save_csv(final_filtered_redirects, os.path.join(data_dir, "filtered_exclusions_applied.csv"))
+    save_intermediate(final_filtered_redirects, os.path.join(data_dir, "filtered_exclusions_applied.csv"))
 
     # Sort, save, and identify duplicates
     sort_and_save(final_filtered_redirects, ["From URL", "To URL"], os.path.join(data_dir, "all_sorted.csv"))
     find_and_save_duplicates(final_filtered_redirects, output_dir, ["To URL", "From URL", "Alias"])
+    storage.log_peak_memory()
 
 
 if __name__ == "__main__":
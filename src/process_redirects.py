@@ -1,8 +1,18 @@
+import argparse
+import csv
 import logging
 import os
+import tempfile
+from collections import Counter
 
 import pandas as pd
 
+import duplicates
+import external_sort
+import filter_rules
+import metrics
+import storage
+
 # Setup basic configuration for logging
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
@@ -13,7 +23,7 @@ def load_csv_with_headers(csv_path, headers):
         logging.error(f"CSV file not found at {csv_path}")
         return pd.DataFrame()  # Return empty DataFrame if file not found
 
-    df = pd.read_csv(csv_path, header=None, names=headers)
+    df = storage.lean_strings(pd.read_csv(csv_path, header=None, names=headers))
     logging.info("CSV loaded with headers.")
     return df
 
@@ -21,7 +31,7 @@ def load_csv_with_headers(csv_path, headers):
 def save_csv_with_headers(df, csv_path, sort_by=None):
     """Save DataFrame to CSV with headers."""
     if sort_by:
-        df_sorted = df.sort_values(by=sort_by)
+        df_sorted = df.sort_values(by=sort_by, kind="stable")
         df_sorted.to_csv(csv_path, index=False)
         logging.info(f"CSV saved with headers at {csv_path} sorted by {sort_by}")
     else:
@@ -29,70 +39,46 @@ def save_csv_with_headers(df, csv_path, sort_by=None):
         logging.info(f"CSV saved with headers at {csv_path}")
 
 
-def filter_data(df):
-    """Filter out rows where 'From URL' and 'To URL' start with any of the specified patterns."""
-    # from_url_prefixes = [
-    #     "file/", "sites/", "system/files/", "events", "news", "files/", "jobs", "user", "taxonomy",
-    #     "occupational-therapy-jobs"
-    # ]
-    # to_url_prefixes = [
-    #     "<front>", "events", "jobs", "user", "taxonomy", "news"
-    # ]
-    from_url_prefixes = [
-        "files/", "events", "news", "occupational-therapy-jobs/", "sites/default/",
-        "publication", "system/files/", "suppliers/", "practice-resources/", "about-us/specialistsections/",
-        "about-us/specialist-sections/", "consultation"
-    ]
-    to_url_prefixes = [
-        "<front>", "events", "news", "user", "jobs", "taxonomy"
-    ]
-
-    # Define conditions for filtering "From URL"
-    from_conditions = (
-            ~df["From URL"].str.startswith(tuple(from_url_prefixes)) &
-            ~df["From URL"].str.contains(r'\?', regex=True)
-    )
-
-    # Define conditions for filtering "To URL"
-    to_conditions = ~df["To URL"].str.startswith(tuple(to_url_prefixes))
-
-    # Combine both conditions with logical AND
-    conditions = from_conditions & to_conditions
-
-    return df[conditions]
+@metrics.timed("process_redirects.filter_data")
+def filter_data(df, profile="redirects"):
+    """Filter out rows where 'From URL' and 'To URL' break the rules of a filter_rules profile."""
+    return filter_rules.filter_rows(df, profile)
 
 
 def sort_and_save(df, sort_by, filename):
     """Sort DataFrame and save to CSV."""
-    sorted_df = df.sort_values(by=sort_by)
+    sorted_df = df.sort_values(by=sort_by, kind="stable")
     sorted_df.to_csv(filename, index=False)
     logging.info(f"Data sorted by {sort_by} and saved to {filename}")
 
 
+@metrics.timed("process_redirects.find_and_save_duplicates")
 def find_and_save_duplicates(df):
     """Find duplicates based on 'From URL' or 'To URL' columns and save them."""
-    # Concatenate duplicates from both columns
-    from_duplicates = df[df.duplicated(subset="From URL", keep=False)]
-    to_duplicates = df[df.duplicated(subset="To URL", keep=False)]
-    sort_types = ["To URL", "From URL"]
-    for sort_type in sort_types:
-        combined_duplicates = pd.concat([from_duplicates, to_duplicates]).drop_duplicates().sort_values(
-            by=sort_type)
-        combined_duplicates.to_csv(f"data/redirects/duplicate_redirects_{sort_type.replace(' ', '_')}.csv", index=False)
-
+    duplicates_df = duplicates.save_duplicates(
+        df,
+        ["From URL", "To URL"],
+        "data/redirects/duplicate_redirects_{key}.csv",
+        sort_keys=["To URL", "From URL"],
+        summary_path="data/redirects/duplicate_redirects_summary.csv",
+        url_columns=["From URL", "To URL"],
+    )
     logging.info("Duplicates found and saved.")
 
-    return combined_duplicates
+    return duplicates_df
 
 
-def main():
-    csv_path = "data/redirects/redirects.csv"
-    headers = ["From URL", "To URL", "Redirect Status", "Redirect Language"]
-    redirects_df = load_csv_with_headers(csv_path, headers)
+def export_redirects(redirects_df, profile="redirects"):
+    """Save the headed, sorted, filtered and duplicate redirect CSVs.
 
-    save_csv_with_headers(redirects_df, "data/redirects/redirects_headers.csv", sort_by="To URL")
+    Returns the redirects sorted by 'To URL', as combine.py reads them back from
+    redirects_headers.csv (or its Parquet/Feather equivalent).
+    """
+    sorted_redirects = redirects_df.sort_values(by="To URL", kind="stable").reset_index(drop=True)
+    path = storage.save_intermediate(sorted_redirects, "data/redirects/redirects_headers.csv")
+    logging.info(f"Redirects saved with headers at {path} sorted by To URL")
 
-    filtered_redirects = filter_data(redirects_df)
+    filtered_redirects = filter_data(redirects_df, profile)
 
     sort_types = ["From URL", "To URL"]
     for sort_by in sort_types:
@@ -100,6 +86,94 @@ def main():
 
     find_and_save_duplicates(filtered_redirects)  # Use filtered_redirects here
 
+    return sorted_redirects
+
+
+@metrics.timed("process_redirects.export_redirects_chunked")
+def export_redirects_chunked(csv_path, headers, profile="redirects", memory_budget_mb=None):
+    """export_redirects for exports too big for memory, writing the same files as CSV.
+
+    The export is read in chunks that fit in `memory_budget_mb` and filtered per chunk;
+    every sorted output and duplicate report comes from an external merge sort over runs
+    spilled to a temporary directory.
+    """
+    memory_budget_mb = memory_budget_mb or external_sort.DEFAULT_MEMORY_BUDGET_MB
+    run_rows = external_sort.rows_per_chunk(csv_path, headers, memory_budget_mb)
+    rules = filter_rules.load_profile(profile)
+    to_url = headers.index("To URL") + 1
+    hits = Counter()
+    total = 0
+
+    with tempfile.TemporaryDirectory(dir="data/redirects") as directory:
+        def all_rows():
+            for chunk in external_sort.read_chunks(csv_path, headers, run_rows):
+                yield from external_sort.chunk_rows(chunk)
+
+        rows = external_sort.external_sort(all_rows(), external_sort.row_key([to_url]), run_rows, directory)
+        external_sort.write_rows(rows, "data/redirects/redirects_headers.csv", headers)
+        logging.info("Redirects saved with headers at data/redirects/redirects_headers.csv sorted by To URL")
+
+        table_path = os.path.join(directory, "filtered.csv")
+        with open(table_path, "w", newline="") as table:
+            table_writer = csv.writer(table, lineterminator="\n")
+            for chunk in external_sort.read_chunks(csv_path, headers, run_rows):
+                filtered, chunk_hits = filter_rules.apply_rules(chunk, rules)
+                hits.update(chunk_hits)
+                total += len(chunk)
+                table_writer.writerows(external_sort.chunk_rows(filtered))
+        filter_rules.log_rule_hits(dict(hits), total, profile)
+
+        for sort_by in ["From URL", "To URL"]:
+            key = external_sort.row_key([headers.index(sort_by) + 1])
+            rows = external_sort.external_sort(external_sort.read_run(table_path), key, run_rows, directory)
+            filename = f"data/redirects/redirects_sorted_by_{sort_by}.csv"
+            external_sort.write_rows(rows, filename, headers)
+            logging.info(f"Data sorted by {sort_by} and saved to {filename}")
+
+        duplicates.save_duplicates_external(
+            table_path,
+            headers,
+            ["From URL", "To URL"],
+            "data/redirects/duplicate_redirects_{key}.csv",
+            run_rows,
+            directory,
+            sort_keys=["To URL", "From URL"],
+            summary_path="data/redirects/duplicate_redirects_summary.csv",
+            url_columns=["From URL", "To URL"],
+        )
+        logging.info("Duplicates found and saved.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add headers to, sort and filter the exported redirects.")
+    parser.add_argument(
+        "--profile",
+        choices=list(filter_rules.PROFILES),
+        default="redirects",
+        help="Filter rule profile (see filter_rules.py).",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        metavar="MB",
+        help="Process the export in chunks that fit in about this much memory, sorting on disk.",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+
+    csv_path = "data/redirects/redirects.csv"
+    headers = ["From URL", "To URL", "Redirect Status", "Redirect Language"]
+    if args.memory_budget:
+        export_redirects_chunked(csv_path, headers, args.profile, args.memory_budget)
+        storage.log_peak_memory()
+        return
+
+    redirects_df = load_csv_with_headers(csv_path, headers)
+
+    export_redirects(redirects_df, args.profile)
+    storage.log_peak_memory()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,143 @@
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import storage
+import url_keys
+
+# Setup basic configuration for logging
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+MAX_HOPS = 3
+
+
+def url_ids(from_urls, to_urls):
+    """Number every URL by its canonical key (see url_keys.py), as combine.py and duplicates.py match them.
+
+    Returns (from ids, to ids, URL for each id). Missing URLs share the last id, whose
+    URL is None. Each id's URL is its first spelling in the table, To URLs first.
+    """
+    (from_ids, to_ids), keys = url_keys.url_key_codes(from_urls, to_urls)
+    missing = len(keys)
+    from_ids = np.where(from_ids < 0, missing, from_ids)
+    to_ids = np.where(to_ids < 0, missing, to_ids)
+
+    ids = np.concatenate([to_ids, from_ids])
+    values = np.concatenate([np.asarray(to_urls, dtype=object), np.asarray(from_urls, dtype=object)])
+    first = pd.Series(ids).drop_duplicates().index.to_numpy()
+    urls = np.full(missing + 1, None, dtype=object)
+    urls[ids[first]] = values[first]
+    urls[missing] = None
+    return from_ids, to_ids, urls
+
+
+def successor_graph(from_ids, to_ids, size):
+    """Point every URL id at the id it redirects to (or itself if it does not).
+
+    Returns (next id for each id, whether each id redirects to itself). Where a URL has
+    several redirects the first one wins, as a request would only follow one; rows
+    without a From URL (the last id) redirect nothing.
+    """
+    successor = np.arange(size)
+    first = pd.Series(from_ids).drop_duplicates().index.to_numpy()
+    first = first[from_ids[first] != size - 1]
+    successor[from_ids[first]] = to_ids[first]
+    self_loop = np.zeros(size, dtype=bool)
+    self_loop[from_ids[first][from_ids[first] == to_ids[first]]] = True
+    conflicting = int((from_ids != size - 1).sum()) - len(first)
+    if conflicting:
+        logging.warning(f"{conflicting} redirects have a From URL that already redirects; using the first.")
+    return successor, self_loop
+
+
+def resolve(successor):
+    """Follow every URL to the end of its chain by pointer jumping.
+
+    Each round doubles how far every pointer reaches, so chains of length d are resolved
+    in log2(d) vectorized rounds. Returns (final id, hops, looping) per id; URLs that run
+    into a cycle never reach a URL without a redirect and are flagged as looping.
+    """
+    target = successor.copy()
+    hops = (successor != np.arange(len(successor))).astype(np.int64)
+    terminal = hops == 0
+    # After this many rounds every pointer has moved 2**rounds >= len steps, so anything
+    # not yet at a terminal URL is going round a cycle
+    max_rounds = max(1, int(np.ceil(np.log2(len(successor) + 1))))
+    for _ in range(max_rounds):
+        if terminal[target].all():
+            break
+        hops = hops + hops[target]
+        target = target[target]
+    looping = ~terminal[target]
+    return target, hops, looping
+
+
+@metrics.timed("redirect_chains.flatten_redirects")
+def flatten_redirects(redirects_df, max_hops=MAX_HOPS):
+    """Flatten every redirect to the URL at the end of its chain.
+
+    Returns a table with the original From and To URLs, the final URL, the number of
+    hops a request takes and a status: "ok", "long" (more than `max_hops` hops) or
+    "loop" (the chain never ends). A redirect's target continues the chain of the
+    redirect whose From URL has the same canonical key.
+    """
+    from_ids, to_ids, urls = url_ids(redirects_df["From URL"], redirects_df["To URL"])
+    successor, self_loop = successor_graph(from_ids, to_ids, len(urls))
+    target, hops, looping = resolve(successor)
+    # A URL redirecting to itself looks like the end of a chain, but never resolves
+    looping |= self_loop[target]
+
+    # A redirect's chain continues from its own target, so it takes one hop more than that
+    row_hops = hops[to_ids] + 1
+    row_looping = looping[to_ids]
+    status = np.where(row_looping, "loop", np.where(row_hops > max_hops, "long", "ok"))
+    final_urls = urls[target[to_ids]]
+
+    flattened = pd.DataFrame({
+        "From URL": redirects_df["From URL"].to_numpy(),
+        "To URL": redirects_df["To URL"].to_numpy(),
+        "Final URL": np.where(row_looping, None, final_urls),
+        "Hops": np.where(row_looping, -1, row_hops),
+        "Status": status,
+    })
+    counts = flattened["Status"].value_counts()
+    logging.info(
+        f"Flattened {len(flattened)} redirects: {counts.get('ok', 0)} ok, "
+        f"{counts.get('long', 0)} longer than {max_hops} hops, {counts.get('loop', 0)} in loops; "
+        f"longest chain {int(flattened['Hops'].max()) if len(flattened) else 0} hops."
+    )
+    return flattened
+
+
+def export_flattened(redirects_df, max_hops=MAX_HOPS):
+    """Save the flattened redirects and the chains that need attention; return the flattened table."""
+    flattened = flatten_redirects(redirects_df, max_hops)
+    flattened.to_csv("data/redirects/redirects_flattened.csv", index=False)
+    problems = flattened[flattened["Status"] != "ok"].sort_values(by=["Status", "From URL"], kind="stable")
+    problems.to_csv("data/redirects/redirect_chain_problems.csv", index=False)
+    logging.info(f"{len(problems)} redirect loops and long chains saved.")
+    return flattened
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flatten redirect chains and find redirect loops.")
+    parser.add_argument(
+        "--max-hops",
+        type=int,
+        default=MAX_HOPS,
+        help=f"Flag chains taking more redirects than this (default {MAX_HOPS}).",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+
+    redirects_df = storage.load_intermediate("data/redirects/redirects_headers.csv")
+    export_flattened(redirects_df, args.max_hops)
+    storage.log_peak_memory()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import storage
+import url_keys
+
+SNAPSHOT_DIR = os.path.join("data", "snapshots")
+CHANGES = ["added", "removed", "retargeted"]
+
+
+def row_hashes(df, columns):
+    """A stable 64-bit hash of each row's values, as 16 hex digits.
+
+    Values are hashed as strings, so the same row hashes the same whether a column was
+    loaded as objects, Arrow strings or a categorical.
+    """
+    values = pd.DataFrame({column: df[column].to_numpy(dtype=object) for column in columns})
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    return pd.Series(hashes, index=df.index).map("{:016x}".format)
+
+
+def canonical_keys(column):
+    (codes,), keys = url_keys.url_key_codes(column)
+    # Rows without a key are all keyed as the empty string
+    return pd.Series(pd.Categorical.from_codes(codes, categories=keys)).astype(object).fillna("").to_numpy()
+
+
+def make_snapshot(df, key, columns):
+    """The rows of `df`, in order, keyed by the canonical URL in `key` and hashed over `columns`."""
+    snapshot = pd.DataFrame({"Key": canonical_keys(df[key]), "Row hash": row_hashes(df, columns).to_numpy()})
+    for column in columns:
+        snapshot[column] = df[column].to_numpy(dtype=object)
+    return snapshot
+
+
+def with_occurrence(df, by):
+    """Number repeated `by` values 0, 1, 2... so repeated rows pair up one to one in a join."""
+    return df.assign(Occurrence=df.groupby(by, sort=False).cumcount())
+
+
+def diff_snapshots(old, new, columns):
+    """Added, removed and retargeted rows between two snapshots, as one table.
+
+    A hash join on (key, row hash) drops the rows present in both; what is left of a
+    key on both sides was retargeted, the rest was added or removed. Neither side is
+    sorted, so the cost grows linearly with the snapshots; only the delta is sorted.
+    Rows repeated under a key are matched one to one. Retargeted rows carry their old
+    values in "Previous <column>" columns.
+    """
+    hashed = pd.merge(
+        with_occurrence(old[["Key", "Row hash"]], ["Key", "Row hash"]).reset_index(names="Old row"),
+        with_occurrence(new[["Key", "Row hash"]], ["Key", "Row hash"]).reset_index(names="New row"),
+        on=["Key", "Row hash", "Occurrence"],
+        how="outer",
+    )
+    old_rows = hashed.loc[hashed["New row"].isna(), ["Key", "Old row"]]
+    new_rows = hashed.loc[hashed["Old row"].isna(), ["Key", "New row"]]
+
+    changed = pd.merge(
+        with_occurrence(old_rows.sort_values("Old row"), ["Key"]),
+        with_occurrence(new_rows.sort_values("New row"), ["Key"]),
+        on=["Key", "Occurrence"],
+        how="outer",
+    )
+    has_old = changed["Old row"].notna().to_numpy()
+    has_new = changed["New row"].notna().to_numpy()
+    change = pd.Series("retargeted", index=changed.index)
+    change[~has_old] = "added"
+    change[~has_new] = "removed"
+
+    delta = pd.DataFrame({"Change": change, "Key": changed["Key"]})
+    old_positions = changed["Old row"].fillna(-1).astype("int64").to_numpy()
+    new_positions = changed["New row"].fillna(-1).astype("int64").to_numpy()
+    for column in columns:
+        # Position -1 (no row on that side) picks the None appended at the end
+        old_values = np.append(old[column].to_numpy(dtype=object), None)[old_positions]
+        new_values = np.append(new[column].to_numpy(dtype=object), None)[new_positions]
+        delta[column] = pd.Series(new_values).where(has_new, old_values).to_numpy()
+        delta[f"Previous {column}"] = pd.Series(old_values).where(has_old & has_new, None).to_numpy()
+
+    order = pd.Categorical(delta["Change"], categories=CHANGES, ordered=True)
+    return (
+        delta.assign(Order=order)
+        .sort_values(["Key", "Order"] + columns, kind="stable", na_position="last")
+        .drop(columns="Order")
+        .reset_index(drop=True)
+    )
+
+
+def snapshot_path(name, directory=SNAPSHOT_DIR):
+    return os.path.join(directory, name, "snapshot.csv")
+
+
+def delta_path(name, directory=SNAPSHOT_DIR):
+    return os.path.join(directory, name, "delta.csv")
+
+
+def load_snapshot(name, directory=SNAPSHOT_DIR):
+    """The snapshot saved by the previous run, or None if there is none."""
+    path = snapshot_path(name, directory)
+    if storage.intermediate_source(path) is None:
+        return None
+    return storage.load_intermediate(path, dtype=str, keep_default_na=False)
+
+
+@metrics.timed("snapshots.record")
+def record(name, df, key, columns=None, directory=SNAPSHOT_DIR):
+    """Save a snapshot of `df` and the delta against the previous run's; return the delta.
+
+    Rows are identified by the canonical URL in `key`, so a row whose other `columns`
+    changed is reported as retargeted. The delta is written to <directory>/<name>/delta.csv
+    and replaces the previous one, so downstream jobs only need to read that file.
+    """
+    columns = list(columns or df.columns)
+    new = make_snapshot(df, key, columns)
+    old = load_snapshot(name, directory)
+    if old is None:
+        logging.info(f"No previous {name} snapshot, every row counts as added.")
+        old = new.iloc[:0]
+    # Compare values as the strings they are saved as
+    new_values = new.astype({column: object for column in columns}).fillna("")
+    delta = diff_snapshots(old.astype(object).fillna(""), new_values, columns)
+
+    os.makedirs(os.path.dirname(snapshot_path(name, directory)), exist_ok=True)
+    delta.to_csv(delta_path(name, directory), index=False)
+    storage.save_intermediate(new, snapshot_path(name, directory))
+
+    counts = delta["Change"].value_counts()
+    changes = metrics.gauge("snapshot_changes", "Rows added, removed and retargeted since the previous run.")
+    for change in CHANGES:
+        changes.set(int(counts.get(change, 0)), dataset=name, change=change)
+    metrics.event(
+        "snapshot",
+        f"{name} since the previous run: "
+        + ", ".join(f"{int(counts.get(change, 0))} {change}" for change in CHANGES)
+        + f" of {len(new)} rows; delta saved to {delta_path(name, directory)}",
+        dataset=name,
+        rows=len(new),
+        **{change: int(counts.get(change, 0)) for change in CHANGES},
+    )
+    return delta
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    parser = argparse.ArgumentParser(description="Show the rows added, removed and retargeted between two CSVs.")
+    parser.add_argument("old", help="CSV of the earlier run.")
+    parser.add_argument("new", help="CSV of the later run.")
+    parser.add_argument("-k", "--key", default="From URL", help="Column identifying a row (default %(default)s).")
+    parser.add_argument("-o", "--output", help="Where to save the delta (default: print it).")
+    args = parser.parse_args()
+
+    old_df = pd.read_csv(args.old, dtype=str, keep_default_na=False)
+    new_df = pd.read_csv(args.new, dtype=str, keep_default_na=False)
+    columns = list(new_df.columns)
+    delta = diff_snapshots(make_snapshot(old_df, args.key, columns), make_snapshot(new_df, args.key, columns), columns)
+    logging.info(", ".join(f"{int((delta['Change'] == change).sum())} {change}" for change in CHANGES))
+    if args.output:
+        delta.to_csv(args.output, index=False)
+    else:
+        print(delta.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import logging
+import os
+
+import pandas as pd
+
+import metrics
+
+# Format for intermediate tables passed between scripts: "csv", "parquet" or "feather".
+# CSV stays the format for the final, human-facing exports.
+FORMAT = os.getenv("CRAWLER_INTERMEDIATE_FORMAT", "csv")
+SUFFIXES = {"parquet": ".parquet", "feather": ".feather"}
+# Load string columns as categoricals / Arrow strings instead of Python objects
+LEAN_STRINGS = os.getenv("CRAWLER_LEAN_STRINGS", "1") != "0"
+
+
+def columnar_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def intermediate_format():
+    if FORMAT in SUFFIXES and not columnar_available():
+        logging.warning(f"pyarrow is not installed, writing CSV instead of {FORMAT}.")
+        return "csv"
+    return FORMAT
+
+
+def columnar_path(csv_path, fmt):
+    return os.path.splitext(str(csv_path))[0] + SUFFIXES[fmt]
+
+
+def dictionary_encode(df):
+    """Store repeated strings once: string columns where most values repeat become
+    categoricals (dictionary-encoded on disk). Mostly-unique columns are left as they are.
+    """
+    df = df.copy()
+    for column in df.columns:
+        if pd.api.types.is_string_dtype(df[column].dtype) and df[column].nunique() < len(df) / 2:
+            df[column] = df[column].astype("category")
+    return df
+
+
+def lean_strings(df):
+    """Intern the string columns of a freshly loaded table to save memory.
+
+    Columns where most values repeat (redirect targets, languages) become categoricals
+    with lexically ordered categories, so they filter, join and sort like strings. The
+    rest become Arrow-backed strings when pyarrow is available. Works in place and
+    returns `df`.
+    """
+    if not LEAN_STRINGS:
+        return df
+    arrow = columnar_available()
+    for column in df.columns:
+        if not pd.api.types.is_string_dtype(df[column].dtype) or isinstance(df[column].dtype, pd.CategoricalDtype):
+            continue
+        if df[column].nunique() < len(df) / 2:
+            df[column] = df[column].astype("category")
+        elif arrow and df[column].dtype == object:
+            df[column] = df[column].astype("string[pyarrow]")
+    return df
+
+
+def log_peak_memory(label="Peak memory"):
+    """Log the process's peak resident set size so far, as measured for stage metrics."""
+    peak_mb = metrics.process_peak_rss() / (1 << 20)
+    logging.info(f"{label}: {peak_mb:.0f} MB")
+    return peak_mb
+
+
+def sorted_categories(df):
+    """Put categories in lexical order, so sorting a categorical column sorts it like strings."""
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            categories = df[column].cat.categories
+            if not categories.is_monotonic_increasing:
+                df[column] = df[column].cat.reorder_categories(categories.sort_values())
+    return df
+
+
+def intermediate_path(csv_path):
+    """Where save_intermediate writes the table: `csv_path` itself, or a Parquet/Feather file next to it."""
+    fmt = intermediate_format()
+    return str(csv_path) if fmt == "csv" else columnar_path(csv_path, fmt)
+
+
+def save_intermediate(df, csv_path, **csv_kwargs):
+    """Save a table another stage will read back; return the path written."""
+    path = intermediate_path(csv_path)
+    if path == str(csv_path):
+        df.to_csv(csv_path, index=False, **csv_kwargs)
+        return path
+
+    encoded = dictionary_encode(df.reset_index(drop=True))
+    if path.endswith(SUFFIXES["parquet"]):
+        encoded.to_parquet(path, index=False)
+    else:
+        encoded.to_feather(path)
+    return path
+
+
+def intermediate_source(csv_path):
+    """The most recently written of a table's CSV and columnar files, or None if there are none."""
+    candidates = [str(csv_path)] + [columnar_path(csv_path, fmt) for fmt in SUFFIXES]
+    existing = [path for path in candidates if os.path.exists(path)]
+    return max(existing, key=os.path.getmtime) if existing else None
+
+
+def load_intermediate(csv_path, **read_csv_kwargs):
+    """Load a table written by save_intermediate (or by hand as CSV).
+
+    Columnar files are memory-mapped and their string columns come back as categoricals;
+    CSV string columns go through lean_strings. `read_csv_kwargs` only apply when the
+    CSV is the file read.
+    """
+    path = intermediate_source(csv_path)
+    if path is None:
+        raise FileNotFoundError(csv_path)
+    if path.endswith(SUFFIXES["parquet"]):
+        return sorted_categories(pd.read_parquet(path, memory_map=True))
+    if path.endswith(SUFFIXES["feather"]):
+        import pyarrow.feather as feather
+
+        return sorted_categories(feather.read_table(path, memory_map=True).to_pandas())
+    return lean_strings(pd.read_csv(path, **read_csv_kwargs))
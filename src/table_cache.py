@@ -0,0 +1,75 @@
+import hashlib
+import logging
+import os
+import pickle
+
+CACHE_VERSION = 1
+
+
+def file_state(path):
+    """Size and modification time of a file, the cheap part of its cache key."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_cache(path):
+    """Load the per-file row cache, or return an empty one if it is missing or unreadable."""
+    empty = {"version": CACHE_VERSION, "files": {}, "output": None}
+    if not os.path.exists(path):
+        return empty
+    try:
+        with open(path, "rb") as file:
+            cache = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError) as e:
+        logging.warning(f"Ignoring unreadable cache {path}: {str(e)}")
+        return empty
+    return cache if cache.get("version") == CACHE_VERSION else empty
+
+
+def save_cache(cache, path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        pickle.dump(cache, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def refresh(cache, directory, file_names, parse_files):
+    """Bring the cache up to date with the files in `directory`.
+
+    A file whose size and mtime match its entry is trusted without reading it. Otherwise
+    it is hashed, and only re-parsed (with `parse_files(paths)`, which returns one list of
+    rows per path) if the hash changed. Entries for files that no longer exist are dropped.
+    Returns the names of files that were added, changed or removed.
+    """
+    files = cache["files"]
+    to_parse = []
+    for name in file_names:
+        path = os.path.join(directory, name)
+        size, mtime_ns = file_state(path)
+        entry = files.get(name)
+        if entry and entry["size"] == size and entry["mtime_ns"] == mtime_ns:
+            continue
+        digest = file_hash(path)
+        if entry and entry["sha256"] == digest:
+            entry.update(size=size, mtime_ns=mtime_ns)  # Touched but not changed
+            continue
+        files[name] = {"size": size, "mtime_ns": mtime_ns, "sha256": digest, "rows": None}
+        to_parse.append(name)
+
+    if to_parse:
+        parsed = parse_files([os.path.join(directory, name) for name in to_parse])
+        for name, rows in zip(to_parse, parsed):
+            files[name]["rows"] = rows
+
+    removed = sorted(set(files) - set(file_names))
+    for name in removed:
+        del files[name]
+    return to_parse + removed
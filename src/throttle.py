@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delay in seconds or an HTTP date)."""
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """AIMD limit on in-flight requests, with a hard ceiling and an optional requests/sec cap.
+
+    Every response under the target latency grows the limit by 1/limit (about one extra
+    request per round trip). A slow response, a 429/503 or a connection failure halves it,
+    at most once per round trip so one burst of errors counts as one signal. A Retry-After
+    from the server pauses all new requests. Every change of limit is logged.
+    """
+
+    def __init__(self, ceiling, initial=None, max_rps=None, target_latency=2.0, backoff=0.5):
+        self.ceiling = ceiling
+        self.limit = float(min(initial or 2, ceiling))
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.min_interval = 1.0 / max_rps if max_rps else 0.0
+        self.in_flight = 0
+        self.next_start = 0.0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.requests = 0
+        self.overloads = 0
+        self.total_latency = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        """Block until a request may start, respecting both the limit and the rate cap."""
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+            now = time.monotonic()
+            start = max(now, self.next_start, self.paused_until)
+            self.next_start = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, latency, overloaded=False, retry_after=None):
+        """Report how a request went and adjust the limit."""
+        with self.cond:
+            self.in_flight -= 1
+            self.requests += 1
+            self.total_latency += latency
+            now = time.monotonic()
+            old = int(self.limit)
+
+            if overloaded or latency > self.target_latency:
+                self.overloads += overloaded
+                reason = "server overloaded" if overloaded else f"latency {latency:.2f}s"
+                if now - self.last_decrease > latency:
+                    self.limit = max(1.0, self.limit * self.backoff)
+                    self.last_decrease = now
+                    logging.info(f"Concurrency {old} -> {int(self.limit)} ({reason})")
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+                    logging.info(f"Server asked to retry after {retry_after:.1f}s, pausing requests.")
+            else:
+                self.limit = min(float(self.ceiling), self.limit + 1.0 / self.limit)
+                if int(self.limit) != old:
+                    logging.info(f"Concurrency {old} -> {int(self.limit)} (latency {latency:.2f}s)")
+
+            self.cond.notify_all()
+
+    def summary(self):
+        average = self.total_latency / self.requests if self.requests else 0.0
+        return (
+            f"{self.requests} requests, {self.overloads} overload responses, "
+            f"average latency {average:.2f}s, final concurrency {int(self.limit)}/{self.ceiling}"
+        )
@@ -0,0 +1,42 @@
+import re
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+SCHEME = re.compile(r"^(?:internal:|entity:|base:|[a-z][a-z0-9+.-]*://[^/?#]*)", re.IGNORECASE)
+
+
+def canonical_url(url):
+    """One spelling for every way Drupal and the exports write a path.
+
+    `/node/12`, `node/12/`, `internal:/node/12`, `https://host/Node/12` and
+    `node/12#top` all become `node/12`. Query strings are kept, as they change the page.
+    """
+    url = SCHEME.sub("", url.strip())
+    url = url.split("#", 1)[0]
+    path, question, query = url.partition("?")
+    return unquote(path).strip("/").lower() + question + query
+
+
+def url_key_codes(*columns):
+    """Canonical key codes for the values of several columns, in one shared code space.
+
+    Every distinct string is canonicalised once, however often it appears; categorical
+    columns are only looked at through their categories. Returns one int64 array per
+    column (-1 for missing values) and the canonical key of each code.
+    """
+    factorized = [pd.factorize(column) for column in columns]
+    distinct_codes, distinct = pd.factorize(
+        pd.concat([pd.Series(np.asarray(uniques, dtype=object)) for _, uniques in factorized], ignore_index=True)
+    )
+    key_codes, keys = pd.factorize(pd.Series([canonical_url(str(url)) for url in distinct], dtype=object))
+
+    codes = []
+    offset = 0
+    for raw_codes, uniques in factorized:
+        column_keys = key_codes[distinct_codes[offset:offset + len(uniques)]]
+        offset += len(uniques)
+        # Missing values (code -1) pick up the -1 appended at the end
+        codes.append(np.append(column_keys, -1)[raw_codes].astype(np.int64))
+    return codes, np.asarray(keys, dtype=object)
@@ -0,0 +1,56 @@
+import csv
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "src"), str(ROOT / "benchmarks")]
+
+
+@pytest.fixture
+def stub_server():
+    """Start benchmarks/stub_server.py on a free port; yields a function taking its options."""
+    import stub_server as stub
+
+    servers = []
+
+    def start(**options):
+        server = stub.make_server(**options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def crawler(tmp_path, monkeypatch):
+    """crawler.py, writing its tables, journal, manifest and combined CSV under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    import crawler
+
+    tables = tmp_path / "data" / "tables"
+    tables.mkdir(parents=True, exist_ok=True)
+    monkeypatch.setattr(crawler, "new_directory_path", tables)
+    monkeypatch.setattr(crawler, "combined_csv_path", tmp_path / "data" / "aliases" / "combined.csv")
+    return crawler
+
+
+@pytest.fixture
+def crawl(crawler):
+    """Run an HTTP crawl of a base URL with extra options; return the rows of the combined CSV."""
+
+    def run(base_url, *options):
+        args = ["--http", "--max-rps", "0", "-c", "test", "--base-url", base_url, *options]
+        crawler.run(crawler.build_parser().parse_args(args))
+        if not crawler.combined_csv_path.exists():
+            return None
+        with open(crawler.combined_csv_path, newline="") as file:
+            return list(csv.reader(file))
+
+    return run
@@ -0,0 +1,57 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from alias_tables import TABLE_CLASS, parse_alias_rows, regex_rows, table_rows
+
+HEADER = "<tr><th>Alias</th><th>System</th><th>Operations</th></tr>"
+
+
+def page(body):
+    return f'<html><body><table class="sticky-enabled {TABLE_CLASS}">{body}</table></body></html>'
+
+
+def soup_rows(content):
+    return table_rows(BeautifulSoup(content, "html.parser").find("table", class_=TABLE_CLASS))
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        # Well-formed, as crawler.py saves it
+        f"<thead>{HEADER}</thead><tbody>"
+        '<tr class="odd"><td><a href="/about">about</a></td><td>node/1</td><td>edit</td></tr>'
+        '<tr class="even"><td>news &amp; events</td><td> node/2 </td><td>edit</td></tr></tbody>',
+        # Omitted </tr> end tags
+        f"{HEADER}<tr><td>about</td><td>node/1</td><tr><td>news</td><td>node/2</td></tr>",
+        # ">" inside attribute values
+        f"<thead>{HEADER}</thead><tbody>"
+        '<tr><td title="a > b"><a href="/about" title=\'x > y\'>about</a></td><td>node/1</td></tr>'
+        "<tr><td>news</td><td>node/2</td></tr></tbody>",
+    ],
+    ids=["well-formed", "omitted-row-end", "gt-in-attribute"],
+)
+def test_rows_match_beautifulsoup(body):
+    content = page(body)
+    assert parse_alias_rows(content) == soup_rows(content)
+    assert len(soup_rows(content)) == 2
+
+
+def test_irregular_tables_skip_the_regex_path():
+    assert regex_rows("<tr><td>about<td>node/1</tr>") is None
+    assert regex_rows("<tr><td>about</td><td>node/1</td>") is None
+    assert regex_rows('<tr><td title="a > b">about</td><td>node/1</td></tr>') is None
+    assert regex_rows(f"{HEADER}<tr><td>about</td><td>node/1</td></tr>") == [["about", "node/1"]]
+
+
+def test_omitted_cell_end_tags():
+    # html.parser nests such cells inside each other, so compare with the rows a browser shows
+    content = page(
+        f"<thead>{HEADER}</thead><tbody>"
+        "<tr><td>about<td>node/1<td>edit"
+        "<tr><td>news<td>node/2<td>edit</tbody>"
+    )
+    assert parse_alias_rows(content) == [["about", "node/1"], ["news", "node/2"]]
+
+
+def test_no_table():
+    assert parse_alias_rows("<html><body><p>Nothing here</p></body></html>") is None
@@ -0,0 +1,37 @@
+import re
+
+import pytest
+
+import browser
+
+
+def blocked(url):
+    """Whether Chrome's Network.setBlockedURLs would block `url` ("*" matches anything)."""
+    return any(
+        re.fullmatch(".*".join(re.escape(part) for part in pattern.split("*")), url) for pattern in browser.BLOCKED_URLS
+    )
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.rcot.co.uk/sites/default/files/css/css_abc.css",
+        "https://www.rcot.co.uk/themes/rcot/styles.css?t=abc123",
+        "https://www.rcot.co.uk/themes/rcot/fonts/inter.woff2?v=4",
+        "https://www.rcot.co.uk/misc/logo.png?itok=x1",
+    ],
+)
+def test_assets_are_blocked_with_or_without_a_query(url):
+    assert blocked(url)
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.rcot.co.uk/admin/config/search/path?page=2",
+        "https://www.rcot.co.uk/admin/config/search/redirect/export",
+        "https://www.rcot.co.uk/misc/drupal.js?v=7",
+    ],
+)
+def test_pages_and_scripts_are_not_blocked(url):
+    assert not blocked(url)
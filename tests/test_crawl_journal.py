@@ -0,0 +1,54 @@
+import socket
+
+import http_fetch
+from crawl_journal import CrawlJournal
+
+
+def closed_port_url():
+    """A local URL nothing listens on, so every request to it is refused."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def test_resume_reads_outcomes_and_skips_a_cut_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = CrawlJournal(path)
+    journal.done(0)
+    journal.fail(1, "timeout")
+    journal.fail(2, "503")
+    journal.done(2)
+    journal.file.write('{"page": 3, "sta')
+    journal.close()
+
+    resumed = CrawlJournal(path, resume=True)
+    assert resumed.completed == {0, 2}
+    assert resumed.failed == {1: "timeout"}
+    assert resumed.pending(range(5)) == [1, 3, 4]
+    resumed.close()
+
+    assert CrawlJournal(path).pending(range(3)) == [0, 1, 2]
+
+
+def test_crawl_resumes_after_failed_pages(crawler, crawl, stub_server, monkeypatch):
+    # No backoff sleeps between retries of refused connections
+    monkeypatch.setattr(http_fetch.random, "uniform", lambda low, high: 0.0)
+    base_url = stub_server(pages=6, rows=3)
+    journal_path = crawler.new_directory_path / crawler.JOURNAL_NAME
+
+    assert len(crawl(base_url, "--stream", "--pages", "3")) == 1 + 3 * 3
+
+    # The site goes away: the remaining pages fail and are journaled as such
+    rows = crawl(closed_port_url(), "--stream", "--resume", "--pages", "6")
+    journal = CrawlJournal(journal_path, resume=True)
+    assert journal.completed == {0, 1, 2}
+    assert set(journal.failed) == {3, 4, 5}
+    journal.close()
+    assert len(rows) == 1 + 3 * 3
+
+    rows = crawl(base_url, "--stream", "--resume", "--pages", "6")
+    journal = CrawlJournal(journal_path, resume=True)
+    assert journal.completed == set(range(6)) and not journal.failed
+    journal.close()
+    assert len(rows) == 1 + 6 * 3
+    assert len({tuple(row) for row in rows}) == len(rows)
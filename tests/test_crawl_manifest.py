@@ -0,0 +1,42 @@
+import json
+
+from crawl_manifest import CrawlManifest
+
+
+def load(crawler):
+    return json.loads((crawler.new_directory_path / crawler.MANIFEST_NAME).read_text())
+
+
+def test_record_detects_changed_content(tmp_path):
+    path = tmp_path / "manifest.json"
+    manifest = CrawlManifest(path)
+    assert manifest.record(0, "/page0", "<table>a</table>", 1, etag='"v1"', last_modified="Mon, 01 Jan 2024")
+    manifest.save()
+
+    again = CrawlManifest(path)
+    assert again.conditional_headers(0) == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024"}
+    assert again.conditional_headers(1) == {}
+    assert not again.record(0, "/page0", "<table>a</table>", 1)
+    assert again.record(1, "/page1", "<table>b</table>", 1)
+    assert again.changed == {1}
+    assert again.pages["0"]["changed"] == again.previous["0"]["changed"]
+
+
+def test_incremental_crawl_rewrites_only_changed_tables(crawler, crawl, stub_server):
+    crawl(stub_server(pages=4, rows=3), "--incremental")
+    assert load(crawler)["changed"] == [0, 1, 2, 3]
+    table = crawler.new_directory_path / "table1.html"
+    mtime = table.stat().st_mtime_ns
+
+    crawl(stub_server(pages=4, rows=3), "--incremental")
+    assert load(crawler)["changed"] == []
+    assert table.stat().st_mtime_ns == mtime
+
+    # One more alias on every page, and a shorter pager
+    crawl(stub_server(pages=2, rows=4), "--incremental")
+    manifest = load(crawler)
+    assert manifest["changed"] == [0, 1]
+    assert sorted(manifest["pages"]) == ["0", "1"]
+    assert sorted(manifest["removed"]) == ["2", "3"]
+    assert not (crawler.new_directory_path / "table2.html").exists()
+    assert table.stat().st_mtime_ns != mtime
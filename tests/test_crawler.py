@@ -0,0 +1,46 @@
+import csv
+
+
+def test_resume_of_finished_stream_adds_no_rows(crawl, stub_server):
+    base_url = stub_server(pages=6, rows=3)
+    rows = crawl(base_url, "--stream")
+    assert len(rows) == 1 + 6 * 3
+
+    resumed = crawl(base_url, "--stream", "--resume")
+    assert resumed == rows
+    assert len({tuple(row) for row in resumed}) == len(resumed)
+
+
+def test_resume_fetches_only_missing_pages(crawler, crawl, stub_server):
+    base_url = stub_server(pages=6, rows=3)
+    rows = crawl(base_url, "--stream")
+    # Forget pages 4 and 5 (the stub numbers their nodes 4000 and 5000 on), as if the
+    # crawl had been interrupted before them
+    journal = crawler.new_directory_path / crawler.JOURNAL_NAME
+    lines = journal.read_text().splitlines()
+    journal.write_text("".join(line + "\n" for line in lines if '"page": 4,' not in line and '"page": 5,' not in line))
+    with open(crawler.combined_csv_path, "w", newline="") as file:
+        kept = [row for row in rows if not row[1].startswith(("node/4", "node/5"))]
+        csv.writer(file, lineterminator="\n").writerows(kept)
+
+    resumed = crawl(base_url, "--stream", "--resume")
+    assert resumed[0] == rows[0]
+    assert sorted(resumed[1:]) == sorted(rows[1:])
+
+
+def test_stream_writes_the_combined_csv_asked_for(crawler, crawl, stub_server, tmp_path):
+    output = tmp_path / "elsewhere" / "aliases.csv"
+    crawl(stub_server(pages=2, rows=3), "--stream", "--combined-csv", str(output))
+    assert not crawler.combined_csv_path.exists()
+    with open(output, newline="") as file:
+        assert len(list(csv.reader(file))) == 1 + 2 * 3
+
+
+def test_pipeline_crawl_passes_its_combined_csv_on(crawler, monkeypatch, tmp_path):
+    import pipeline
+
+    calls = []
+    monkeypatch.setattr(crawler, "run", calls.append)
+    pipeline.crawl_aliases("cookie", str(tmp_path / "aliases.csv"))
+    assert calls[0].combined_csv == tmp_path / "aliases.csv"
+    assert calls[0].stream
@@ -0,0 +1,24 @@
+import pytest
+
+
+class FakeDriver:
+    quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_browser_is_closed_when_login_fails(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import crawler_redirects
+
+    driver = FakeDriver()
+
+    def open_site(driver, base_url, cookies):
+        raise RuntimeError("login failed")
+
+    monkeypatch.setattr(crawler_redirects.browser, "setup_driver", lambda *args, **kwargs: driver)
+    monkeypatch.setattr(crawler_redirects.browser, "open_site", open_site)
+    with pytest.raises(RuntimeError):
+        crawler_redirects.export_browser(None, output=tmp_path / "redirects.csv")
+    assert driver.quit_called
@@ -0,0 +1,32 @@
+import threading
+import time
+
+import pytest
+
+import downloads
+
+
+def test_empty_finished_download_is_accepted(tmp_path):
+    (tmp_path / "redirects.csv").write_bytes(b"")
+    started = time.monotonic()
+    assert downloads.wait_for_download(tmp_path, timeout=5, settle=0.2, poll=0.05) == tmp_path / "redirects.csv"
+    assert time.monotonic() - started < 2
+
+
+def test_waits_for_partial_files_to_go(tmp_path):
+    partial = tmp_path / "redirects.csv.crdownload"
+    partial.write_bytes(b"From URL")
+
+    def finish():
+        time.sleep(0.3)
+        partial.rename(tmp_path / "redirects.csv")
+
+    threading.Thread(target=finish).start()
+    assert downloads.wait_for_download(tmp_path, timeout=5, settle=0.2, poll=0.05) == tmp_path / "redirects.csv"
+
+
+def test_times_out_while_a_partial_file_is_left(tmp_path):
+    (tmp_path / "redirects.csv").write_bytes(b"")
+    (tmp_path / "other.csv.part").write_bytes(b"")
+    with pytest.raises(TimeoutError):
+        downloads.wait_for_download(tmp_path, timeout=0.5, settle=0.1, poll=0.05)
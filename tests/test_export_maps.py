@@ -0,0 +1,57 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import export_maps
+
+
+def redirects(*rows):
+    return pd.DataFrame(rows, columns=export_maps.COLUMNS)
+
+
+def test_missing_alias_falls_back_to_the_target():
+    entries, _ = export_maps.build_entries(redirects(("a", "internal:/node/1", np.nan), ("b", "/node/2", "x/y")))
+    assert entries == [("/a", "/node/1"), ("/b", "/x/y")]
+
+
+def test_conflicting_keys_stop_the_export(tmp_path):
+    df = redirects(("Old", "/node/1", ""), ("old/", "/node/2", ""))
+    with pytest.raises(ValueError):
+        export_maps.export_maps(df, str(tmp_path))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["conflicts.csv"]
+
+
+def test_reads_the_latest_run_not_the_accumulated_sorted_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    # all_sorted.csv still holds the old target of a retargeted redirect; the latest table does not
+    (tmp_path / "data" / "all_sorted.csv").write_text("From URL,To URL,Alias\nold,/node/1,\nold,/node/2,\n")
+    (tmp_path / "data" / "filtered_exclusions_applied.csv").write_text("old,/node/2,\n")
+
+    entries = export_maps.export_maps(export_maps.load_redirects(), str(tmp_path / "maps"))
+    assert entries == [("/old", "/node/2")]
+
+
+def test_cdb_finds_every_key(tmp_path):
+    entries = [(f"/page-{number}", f"/node/{number}") for number in range(2000)]
+    export_maps.write_cdb(entries, str(tmp_path / "redirects.cdb"))
+    for key, target in entries:
+        assert export_maps.cdb_get(str(tmp_path / "redirects.cdb"), key) == target
+    assert export_maps.cdb_get(str(tmp_path / "redirects.cdb"), "/missing") is None
+
+
+def test_apache_rules_look_up_mixed_case_sources(tmp_path):
+    export_maps.export_maps(redirects(("About-Us/", "/node/1", "about/us")), str(tmp_path), ["apache"])
+    lines = (tmp_path / "redirects.txt").read_text().splitlines()
+    rewrite_map = dict(line.split(" ", 1) for line in lines if not line.startswith("#"))
+    assert rewrite_map == {"/about-us": "/about/us"}
+
+    # Replay the lookup of redirects.conf for a request that keeps the source's case
+    rules = (tmp_path / "redirects.conf").read_text()
+    assert f'RewriteMap redirects "txt:{tmp_path / "redirects.txt"}"' in rules
+    assert "RewriteCond %{REQUEST_URI} ^(/.*?)/*$" in rules
+    assert "RewriteCond ${redirects:${lc:%1}} (.+)" in rules
+    stripped = re.match(r"^(/.*?)/*$", "/About-Us/").group(1)
+    assert rewrite_map[stripped.lower()] == "/about/us"
@@ -0,0 +1,101 @@
+import random
+
+import pandas as pd
+import pytest
+
+import filter_rules
+import storage
+
+FROM_PREFIXES = [
+    "files/", "events", "news", "occupational-therapy-jobs/", "sites/default/",
+    "publication", "system/files/", "suppliers/", "practice-resources/", "about-us/specialistsections/",
+    "about-us/specialist-sections/", "consultation"
+]
+TO_PREFIXES = ["<front>", "events", "news", "user", "jobs", "taxonomy"]
+
+
+# The filters the processing scripts had before the rules moved to filter_rules.py
+def old_process_redirects(df):
+    from_conditions = ~df["From URL"].str.startswith(tuple(FROM_PREFIXES)) & ~df["From URL"].str.contains(r"\?")
+    return df[from_conditions & ~df["To URL"].str.startswith(tuple(TO_PREFIXES))]
+
+
+def old_process_all(df):
+    url = df["From URL"]
+    from_conditions = (
+        ~url.str.startswith(tuple(FROM_PREFIXES + ["jobs", "node"]))
+        & ~url.str.contains(r"\?")
+        & ~url.str.contains(r"\@")
+        & ~url.str.contains(r"-0")
+        & ~url.str.contains(r"-(?!.)")
+        & ~url.str.contains(r"\.")
+        & ~url.str.contains(r"\;")
+        & ((url.str.len() <= 20) | ((url.str.len() > 20) & (url.str.count("/") <= 2) & (url.str.len() < 30)))
+    )
+    to_conditions = ~df["To URL"].str.startswith(tuple(TO_PREFIXES))
+    alias_conditions = ~df["Alias"].str.startswith(("events/",))
+    return df[from_conditions & to_conditions & alias_conditions]
+
+
+def old_process_all_r(df):
+    from_prefixes = [prefix for prefix in FROM_PREFIXES if prefix != "about-us/specialist-sections/"] + ["jobs"]
+    from_condition = ~df["From URL"].str.startswith(tuple(from_prefixes)) & ~df["From URL"].str.contains(r"\?")
+    return df[from_condition & ~df["To URL"].str.startswith(tuple(TO_PREFIXES))]
+
+
+def url(rng, prefixes):
+    parts = [rng.choice(prefixes + ["about", "a", "learning-and-development", "x" * 12])]
+    parts += [rng.choice(["page", "old-0", "2019", "our-work", "ot-week"]) for _ in range(rng.randrange(4))]
+    value = "/".join(parts)
+    value += rng.choice(["", "", "", "-", "?page=2", "@home", ".html", ";x", "-0", "/"])
+    return value
+
+
+@pytest.fixture(scope="module")
+def table():
+    rng = random.Random(0)
+    rows = [
+        (
+            url(rng, FROM_PREFIXES + ["jobs", "node", "about-us/specialist-sections/x"]),
+            url(rng, TO_PREFIXES),
+            url(rng, ["events/", "eventsx", "news/"]),
+        )
+        for _ in range(5000)
+    ]
+    return pd.DataFrame(rows, columns=["From URL", "To URL", "Alias"])
+
+
+def dtypes():
+    yield object
+    yield "category"
+    if storage.columnar_available():
+        yield "string[pyarrow]"
+
+
+@pytest.mark.parametrize("dtype", list(dtypes()))
+@pytest.mark.parametrize(
+    "profile, old_filter",
+    [("redirects", old_process_redirects), ("all", old_process_all), ("all_r", old_process_all_r)],
+)
+def test_profiles_keep_the_rows_the_old_filters_kept(table, profile, old_filter, dtype):
+    expected = old_filter(table)
+    kept = filter_rules.filter_rows(table.astype(dtype), profile)
+    assert 0 < len(expected) < len(table)
+    assert kept.index.tolist() == expected.index.tolist()
+
+
+def test_each_row_is_counted_against_its_first_rule():
+    df = pd.DataFrame({
+        "From URL": ["news/a?b", "about?x", "about-0", "about-", "ok", None],
+        "To URL": ["/x", "/x", "/x", "/x", "user/1", "/x"],
+        "Alias": ["a", "a", "a", "a", "a", "a"],
+    })
+    kept, hits = filter_rules.apply_rules(df, filter_rules.load_profile("all"))
+    assert hits == {
+        ("From URL", "prefix"): 1,
+        ("From URL", "characters"): 1,
+        ("From URL", "dash_zero"): 1,
+        ("From URL", "trailing_dash"): 1,
+        ("To URL", "prefix"): 1,
+    }
+    assert kept.index.tolist() == [5]
@@ -0,0 +1,72 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+import health_check
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    """/node/1 redirects to /alias; every request's path and Cookie header is recorded."""
+
+    def do_HEAD(self):
+        self.server.requests.append((self.path, self.headers.get("Cookie")))
+        if self.path == "/node/1":
+            self.send_response(301)
+            self.send_header("Location", "/alias")
+        else:
+            self.send_response(200 if self.path == "/alias" else 404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RecordingHandler)
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_cookie_follows_redirects_on_the_site(site):
+    base_url = f"http://127.0.0.1:{site.server_port}"
+    cookies = health_check.session_cookies("secret")
+    results = health_check.check_urls([f"{base_url}/node/1"], cookies, base_url, max_rps=0)
+
+    result = results[f"{base_url}/node/1"]
+    assert result["status"] == 200
+    assert result["final_url"] == f"{base_url}/alias"
+    cookie = f"{health_check.COOKIE_NAME}=secret"
+    assert site.requests == [("/node/1", cookie), ("/alias", cookie)]
+
+
+def test_cookie_is_not_sent_to_other_hosts(site):
+    # "localhost" and "127.0.0.1" reach the same server but are different hosts
+    base_url = f"http://127.0.0.1:{site.server_port}"
+    other = f"http://localhost:{site.server_port}/node/1"
+    health_check.check_urls([other], health_check.session_cookies("secret"), base_url, max_rps=0)
+
+    assert site.requests == [("/node/1", None), ("/alias", None)]
+
+
+def test_targets_are_joined_next_to_their_column(site, tmp_path):
+    base_url = f"http://127.0.0.1:{site.server_port}"
+    df = pd.DataFrame(
+        {"From URL": ["old", "older"], "To URL": ["internal:/node/1", "/missing"], "Alias": ["alias", None]}
+    )
+    checked = health_check.check_targets(df, base_url=base_url, cache_path=str(tmp_path / "cache.json"), max_rps=0)
+
+    assert list(checked.columns[:5]) == ["From URL", "To URL", "To URL status", "To URL final URL", "To URL latency"]
+    assert checked["To URL status"].tolist() == [200, 404]
+    assert checked["Alias status"].isna().tolist() == [False, True]
+
+    # A second run takes every result from the cache
+    site.requests.clear()
+    health_check.check_targets(df, base_url=base_url, cache_path=str(tmp_path / "cache.json"), max_rps=0)
+    assert site.requests == []
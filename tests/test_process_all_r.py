@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+import storage
+from bench_memory import SRC, write_data
+
+SCRIPTS = ["process_redirects.py", "combine.py", "process_all_r.py"]
+
+
+def load_rows(path):
+    """A table's rows as strings, without the header line that combine.py's CSV carries into the data."""
+    df = storage.load_intermediate(path).astype(object).fillna("").astype(str)
+    return df[df["From URL"] != "From URL"].reset_index(drop=True)
+
+
+def run_scripts(directory, fmt):
+    env = dict(os.environ, CRAWLER_INTERMEDIATE_FORMAT=fmt)
+    for script in SCRIPTS:
+        completed = subprocess.run(
+            [sys.executable, str(SRC / script)], cwd=directory, env=env, capture_output=True, text=True
+        )
+        assert completed.returncode == 0, completed.stderr
+
+
+@pytest.mark.skipif(not storage.columnar_available(), reason="pyarrow is not installed")
+@pytest.mark.parametrize("fmt", ["parquet", "feather"])
+def test_reads_the_columnar_merged_table(tmp_path, fmt):
+    csv_dir, columnar_dir = tmp_path / "csv", tmp_path / fmt
+    for directory, directory_format in ((csv_dir, "csv"), (columnar_dir, fmt)):
+        write_data(directory, 2000)
+        run_scripts(directory, directory_format)
+
+    data = columnar_dir / "data"
+    assert not (data / "merged_data_all.csv").exists()
+    assert (data / f"merged_data_all.{fmt}").exists()
+    assert (data / f"filtered_exclusions_applied.{fmt}").exists()
+
+    for output in ["filtered_exclusions_applied.csv", "all_sorted.csv"]:
+        pd.testing.assert_frame_equal(load_rows(data / output), load_rows(csv_dir / "data" / output))
@@ -0,0 +1,43 @@
+import pandas as pd
+
+import redirect_chains
+
+
+def flatten(rows, max_hops=redirect_chains.MAX_HOPS):
+    df = pd.DataFrame(rows, columns=["From URL", "To URL"])
+    flattened = redirect_chains.flatten_redirects(df, max_hops)
+    return {row["From URL"]: (row["Final URL"], row["Hops"], row["Status"]) for _, row in flattened.iterrows()}
+
+
+def test_chains_follow_canonical_keys():
+    # Case, leading and trailing slashes and internal: do not break a chain, as in combine.py
+    result = flatten([("/Old", "internal:/Middle/"), ("middle", "/node/1"), ("node/1/", "/About-Us")])
+    assert result == {
+        "/Old": ("/About-Us", 3, "ok"),
+        "middle": ("/About-Us", 2, "ok"),
+        "node/1/": ("/About-Us", 1, "ok"),
+    }
+
+
+def test_cycles_are_loops():
+    result = flatten([("a", "/b"), ("b", "/c"), ("c", "/A"), ("d", "/a")])
+    assert {source: status for source, (_, _, status) in result.items()} == dict.fromkeys("abcd", "loop")
+    assert result["d"] == (None, -1, "loop")
+
+
+def test_self_redirects_are_loops():
+    result = flatten([("page", "/Page/"), ("old", "/page")])
+    assert result == {"page": (None, -1, "loop"), "old": (None, -1, "loop")}
+
+
+def test_long_chains_are_flagged():
+    rows = [(f"p{number}", f"/p{number + 1}") for number in range(5)]
+    result = flatten(rows, max_hops=3)
+    assert result["p0"] == ("/p5", 5, "long")
+    assert result["p1"] == ("/p5", 4, "long")
+    assert result["p2"] == ("/p5", 3, "ok")
+
+
+def test_first_redirect_of_a_source_wins():
+    result = flatten([("a", "/b"), ("A/", "/c"), ("x", "/a")])
+    assert result["x"] == ("/b", 2, "ok")
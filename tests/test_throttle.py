@@ -0,0 +1,79 @@
+import logging
+
+import pytest
+
+import http_fetch
+from throttle import AdaptiveLimiter, parse_retry_after
+
+
+def test_fast_responses_grow_the_limit_by_one_per_round_trip():
+    limiter = AdaptiveLimiter(4, initial=1, target_latency=1.0)
+    limits = [limiter.limit]
+    for _ in range(8):
+        limiter.acquire()
+        limiter.release(0.01)
+        limits.append(limiter.limit)
+    # Each response adds 1/limit, so the limit grows by about one per `limit` responses
+    expected = [1.0]
+    for _ in range(8):
+        expected.append(min(4.0, expected[-1] + 1 / expected[-1]))
+    assert limits == pytest.approx(expected)
+    assert limits[1] == 2 and limits[-1] == 4
+
+
+def test_overload_halves_the_limit_once_per_round_trip():
+    limiter = AdaptiveLimiter(8, initial=8)
+    for _ in range(3):
+        limiter.acquire()
+    limiter.release(1.0, overloaded=True)
+    limiter.release(1.0, overloaded=True)
+    assert limiter.limit == 4
+    limiter.last_decrease -= 2.0
+    limiter.release(1.0, overloaded=True)
+    assert limiter.limit == 2
+    assert limiter.overloads == 3
+
+
+def test_retry_after_pauses_new_requests():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after("not a date") is None
+    limiter = AdaptiveLimiter(4)
+    limiter.acquire()
+    limiter.release(0.1, overloaded=True, retry_after=30)
+    assert limiter.paused_until > limiter.last_decrease + 29
+
+
+def fetch_all(base_url, limiter, pages=20):
+    session = http_fetch.make_session({"name": "SSESS1", "value": "test"}, pool_size=limiter.ceiling)
+    fetched = {}
+    urls = {page: f"{base_url}/admin/config/search/path?page={page}" for page in range(pages)}
+    try:
+        failed = http_fetch.fetch_pages(session, urls, lambda page, response: fetched.update({page: response}), limiter)
+    finally:
+        session.close()
+    return fetched, failed
+
+
+def test_limit_rises_to_the_ceiling_on_a_fast_server(stub_server):
+    limiter = AdaptiveLimiter(4, initial=1, target_latency=5.0)
+    fetched, failed = fetch_all(stub_server(pages=20, rows=1), limiter)
+    assert len(fetched) == 20 and not failed
+    assert limiter.limit == 4
+
+
+def test_limit_backs_off_on_a_slow_server(stub_server):
+    limiter = AdaptiveLimiter(4, initial=4, target_latency=0.01)
+    fetched, failed = fetch_all(stub_server(pages=20, rows=1, latency=0.05), limiter)
+    assert len(fetched) == 20 and not failed
+    assert limiter.limit < 2
+
+
+def test_429s_are_retried_and_halve_the_limit(stub_server, monkeypatch, caplog):
+    monkeypatch.setattr(http_fetch.random, "uniform", lambda low, high: 0.0)
+    limiter = AdaptiveLimiter(4, initial=4, target_latency=5.0)
+    with caplog.at_level(logging.INFO):
+        fetched, failed = fetch_all(stub_server(pages=10, rows=1, error_rate=0.3, seed=1), limiter, pages=10)
+    assert len(fetched) == 10 and not failed
+    assert limiter.overloads > 0
+    assert "Concurrency 4 -> 2 (server overloaded)" in caplog.text
+    assert "Server asked to retry after 1.0s" in caplog.text